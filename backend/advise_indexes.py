@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Script para executar o advisor de índices nas tabelas de datasheets
+(use --dry-run para só listar os índices que seriam criados)
+"""
+import sys
+import os
+
+# Adiciona o diretório app ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.indexing import run_index_advisor
+
+def advise_indexes(apply=True):
+    """Cria os índices sugeridos pelo advisor dentro do orçamento"""
+    try:
+        result = run_index_advisor(apply=apply)
+        if result is None:
+            print("  Advisor já em execução")
+            return
+        
+        if not result["created"]:
+            print("✓ Nenhum índice novo sugerido")
+        for index in result["created"]:
+            action = "criado" if apply else "sugerido"
+            size_mb = index["estimated_bytes"] / (1024 * 1024)
+            print(f"✓ {index['table']}.{index['column']}: {action} (~{size_mb:.1f} MB, score {index['score']})")
+        for index in result["skipped"]:
+            print(f"  {index['table']}.{index['column']}: fora do orçamento")
+        print(f"\nOrçamento: {result['used_bytes'] / (1024 * 1024):.1f} de {result['budget_bytes'] / (1024 * 1024):.1f} MB")
+        
+    except Exception as e:
+        print(f"✗ Erro ao executar o advisor: {e}")
+
+if __name__ == "__main__":
+    advise_indexes(apply="--dry-run" not in sys.argv)
@@ -1,12 +1,14 @@
 # App package
 
-from .database import get_db_connection, get_db_cursor, close_db_connection
+from .database import get_db_connection, get_db_cursor, close_db_connection, get_pool_stats, run_db
 from .utils import sanitize_sql_name, get_sql_type
 
 __all__ = [
     "get_db_connection",
     "get_db_cursor", 
     "close_db_connection",
+    "get_pool_stats",
+    "run_db",
     "sanitize_sql_name",
     "get_sql_type",
 ]
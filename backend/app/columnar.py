@@ -0,0 +1,201 @@
+import codecs
+import os
+import pandas as pd
+
+# Leitura de arquivos CSV/TSV/Parquet em lotes colunares. Alimenta o mesmo
+# pipeline do import de planilhas (inferência de tipos + INSERT por chunk).
+
+# Linhas por lote: o parser em C do pandas e o pyarrow rendem mais com lotes grandes
+IMPORT_COLUMNAR_BATCH_SIZE = int(os.getenv("IMPORT_COLUMNAR_BATCH_SIZE", "50000"))
+
+# Bytes lidos do início do arquivo para detectar separador e tamanho médio de linha
+SNIFF_BYTES = 64 * 1024
+# Encodings tentados, em ordem, em CSV sem BOM (Latin-1: export do Excel)
+CSV_ENCODINGS = ("utf-8", "latin-1")
+# Bytes por leitura ao conferir o encoding do arquivo inteiro
+ENCODING_CHECK_BLOCK = 1024 * 1024
+CSV_DELIMITERS = (",", ";", "\t", "|")
+
+# Formato por extensão de arquivo
+FILE_FORMATS = {
+    ".xlsx": "excel",
+    ".xls": "excel",
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".parquet": "parquet",
+}
+
+
+def detect_file_format(filename: str):
+    """Formato do arquivo pela extensão (excel, csv, tsv ou parquet), ou None se não suportado."""
+    return FILE_FORMATS.get(os.path.splitext(filename or "")[1].lower())
+
+
+def _read_sample(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(SNIFF_BYTES)
+
+
+def _decodes(path: str, encoding: str) -> bool:
+    """True se o arquivo inteiro decodifica no encoding, sem substituir nenhum byte."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(ENCODING_CHECK_BLOCK), b""):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def detect_csv_encoding(path: str) -> str:
+    """
+    Primeiro encoding que decodifica o arquivo inteiro: UTF-8 com BOM, ou
+    UTF-8 e depois Latin-1 (ver CSV_ENCODINGS).
+
+    O arquivo todo é conferido, e não só o início: um acento em Latin-1 depois
+    da amostra inicial faria o parse falhar (ou trocar o caractere por "�").
+
+    Raises:
+        ValueError: Nenhum dos encodings decodifica o arquivo
+    """
+    candidates = ("utf-8-sig",) if _read_sample(path).startswith(codecs.BOM_UTF8) else CSV_ENCODINGS
+    for encoding in candidates:
+        if _decodes(path, encoding):
+            return encoding
+    raise ValueError(f"Encoding do CSV não reconhecido (tentados: {', '.join(candidates)})")
+
+
+def detect_csv_delimiter(header_line: str) -> str:
+    """Separador mais frequente no cabeçalho (Excel em pt-BR exporta CSV com ";")."""
+    counts = {delimiter: header_line.count(delimiter) for delimiter in CSV_DELIMITERS}
+    delimiter = max(counts, key=counts.get)
+    return delimiter if counts[delimiter] else ","
+
+
+def read_csv_in_chunks(path: str, batch_size: int = IMPORT_COLUMNAR_BATCH_SIZE, delimiter: str = None):
+    """
+    Lê um CSV/TSV em lotes de DataFrames com o parser em C do pandas.
+
+    Todas as colunas são lidas como texto: os tipos são decididos depois
+    pela inferência sobre o arquivo inteiro (ex.: "007" não vira 7 só em
+    alguns lotes). A decodificação é estrita, no encoding que serve para o
+    arquivo inteiro (ver detect_csv_encoding).
+
+    Args:
+        path: Caminho do arquivo
+        batch_size: Linhas por lote
+        delimiter: Separador (padrão: detectado pelo cabeçalho)
+    """
+    encoding = detect_csv_encoding(path)
+    if delimiter is None:
+        sample = _read_sample(path)
+        header_line = sample.decode(encoding, errors="replace").splitlines()[0] if sample else ""
+        delimiter = detect_csv_delimiter(header_line)
+
+    with pd.read_csv(
+        path,
+        sep=delimiter,
+        dtype=str,
+        encoding=encoding,
+        chunksize=batch_size,
+        engine="c",
+        skipinitialspace=True
+    ) as reader:
+        for chunk_df in reader:
+            yield chunk_df
+
+
+def _nullable_integer_types(pa) -> dict:
+    """Inteiros do Arrow -> inteiros com nulos do pandas (sem isso, uma coluna com nulo vira float64)."""
+    return {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+        pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+        pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(),
+        pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(),
+    }
+
+
+def _decode_binary(value, column: str):
+    if value is None:
+        return None
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError(
+            f"Coluna '{column}' do Parquet é binária e não contém texto UTF-8; converta-a para texto antes do import"
+        )
+
+
+def read_parquet_in_chunks(path: str, batch_size: int = IMPORT_COLUMNAR_BATCH_SIZE):
+    """
+    Lê um Parquet em lotes (record batches do pyarrow), preservando os tipos gravados.
+
+    Colunas inteiras com nulos no lote ficam em Int64 (e afins), sem passar
+    por float64, que perderia dígitos acima de 2**53. Colunas binárias são
+    lidas como texto UTF-8; se não forem texto, o import falha com o nome
+    da coluna.
+    """
+    parquet_file = _open_parquet(path)
+    import pyarrow as pa
+    integer_types = _nullable_integer_types(pa)
+    try:
+        binary_columns = [
+            field.name for field in parquet_file.schema_arrow
+            if pa.types.is_binary(field.type) or pa.types.is_large_binary(field.type)
+            or pa.types.is_fixed_size_binary(field.type)
+        ]
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            df = batch.to_pandas()
+            for field, column in zip(batch.schema, batch.columns):
+                if field.type in integer_types and column.null_count:
+                    df[field.name] = column.to_pandas(types_mapper=integer_types.get).array
+            for name in binary_columns:
+                df[name] = pd.Series(
+                    [_decode_binary(value, name) for value in df[name].tolist()], index=df.index, dtype=object
+                )
+            yield df
+    finally:
+        parquet_file.close()
+
+
+def _open_parquet(path: str):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Suporte a Parquet requer o pacote pyarrow (pip install pyarrow)")
+    return pq.ParquetFile(path)
+
+
+def estimate_columnar_rows(path: str, file_format: str):
+    """
+    Estima as linhas de dados sem ler o arquivo inteiro.
+
+    Parquet traz o total exato nos metadados; em CSV/TSV a estimativa vem do
+    tamanho do arquivo dividido pelo tamanho médio das linhas da amostra.
+    """
+    if file_format == "parquet":
+        parquet_file = _open_parquet(path)
+        try:
+            return parquet_file.metadata.num_rows
+        finally:
+            parquet_file.close()
+
+    sample = _read_sample(path)
+    lines = sample.count(b"\n")
+    if not lines:
+        return 0  # Vazio ou só o cabeçalho
+    if len(sample) < SNIFF_BYTES:
+        # Arquivo inteiro na amostra: contagem exata (sem o cabeçalho)
+        return max(0, lines - 1 + (0 if sample.endswith(b"\n") else 1))
+    return max(0, int(os.path.getsize(path) / (len(sample) / lines)) - 1)
+
+
+def read_columnar_in_chunks(path: str, file_format: str, batch_size: int = IMPORT_COLUMNAR_BATCH_SIZE):
+    """Leitor de lotes para o formato informado (csv, tsv ou parquet)."""
+    if file_format == "parquet":
+        return read_parquet_in_chunks(path, batch_size)
+    if file_format == "tsv":
+        return read_csv_in_chunks(path, batch_size, delimiter="\t")
+    return read_csv_in_chunks(path, batch_size)
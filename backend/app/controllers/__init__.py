@@ -1,13 +1,14 @@
 # Controllers package
 
 from .datasheets import import_excel_to_database, get_tables, get_table_data_paginated
-from .openai import generate_sql_query, humanize_query_results, generate_answer
+from .openai import generate_sql_query, explain_sql_query, humanize_query_results, generate_answer
 from .auth import register_user, login_user, get_current_user
 
 __all__ = [
     "import_excel_to_database",
     "get_tables",
     "generate_sql_query",
+    "explain_sql_query",
     "humanize_query_results",
     "generate_answer",
     "get_table_data_paginated",
@@ -1,158 +1,1425 @@
-from openpyxl import load_workbook
 from fastapi import UploadFile
-from ..utils import sanitize_sql_name, get_sql_type
-from ..database import get_db_connection, get_db_cursor, close_db_connection
+from ..utils import (
+    sanitize_sql_name, get_sql_type, ROW_ID_COLUMN, ROW_HASH_COLUMN, INTERNAL_COLUMNS, INDEX_PREFIX_CHARS
+)
+from ..database import get_db_connection, get_db_cursor, close_db_connection, run_db
+from mysql.connector import Error
+from ..schema import (
+    bump_schema_version, set_table_row_count, add_table_row_count, delete_table_row_count, get_schema_version,
+    fetch_row_count, find_registered_uploads, register_upload
+)
+from ..cache import LRUCache
+from ..inference import infer_column_types, chunk_to_rows, widen_sql_type
+from ..upsert import IMPORT_MODES, row_hashes, plan_upsert, canonical_value
+from ..dedup import hash_file, ContentHasher
+from ..indexing import schedule_index_advisor
+from ..workbook import (
+    IMPORT_BATCH_SIZE, IMPORT_PARSE_WORKERS, read_excel_in_chunks, estimate_excel_rows, list_excel_sheets,
+    parse_sheet_worker, get_parse_executor, discard_parse_executor, get_insert_executor, create_pipeline_queue
+)
+from ..columnar import (
+    IMPORT_COLUMNAR_BATCH_SIZE, detect_file_format, read_columnar_in_chunks, estimate_columnar_rows
+)
+from concurrent.futures.process import BrokenProcessPool
 
 import pandas as pd
 import numpy as np
-import io
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+# Diretório e tamanho do bloco usados para gravar uploads em disco
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MiB
+
+# Cache de contagens da paginação por (tabela, busca), validado pela versão da tabela
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", "1024"))
+# Limite da contagem aproximada com busca: acima disso responde "10.000+"
+COUNT_APPROX_CAP = int(os.getenv("COUNT_APPROX_CAP", "10000"))
+
+_count_cache = LRUCache(max_entries=COUNT_CACHE_SIZE)
+
+# Carga em massa com LOAD DATA LOCAL INFILE para imports grandes
+BULK_LOAD_ENABLED = os.getenv("BULK_LOAD_ENABLED", "true").lower() in ("1", "true", "yes")
+BULK_LOAD_ROW_THRESHOLD = int(os.getenv("BULK_LOAD_ROW_THRESHOLD", "50000"))  # A partir de quantas linhas usar
+BULK_LOAD_BATCH_ROWS = int(os.getenv("BULK_LOAD_BATCH_ROWS", "100000"))      # Linhas por LOAD DATA
+BULK_LOAD_MAX_WARNINGS = 5  # Avisos do servidor citados no erro de uma carga incompleta
+
+# Busca indexada: índice FULLTEXT criado no import sobre as colunas de texto
+SEARCH_FULLTEXT_ENABLED = os.getenv("SEARCH_FULLTEXT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Termos menores que isso não entram no índice (innodb_ft_min_token_size) e caem no LIKE
+SEARCH_MIN_TOKEN_SIZE = int(os.getenv("SEARCH_MIN_TOKEN_SIZE", "3"))
+FULLTEXT_INDEX_NAME = "ft_search"
+FULLTEXT_MAX_COLUMNS = 16  # Limite de colunas por índice do InnoDB
+TEXT_COLUMN_TYPES = ("char", "varchar", "tinytext", "text", "mediumtext", "longtext")
+
+# Import incremental (mode=upsert): valores por SELECT ... IN na busca das linhas já gravadas
+UPSERT_LOOKUP_BATCH = int(os.getenv("UPSERT_LOOKUP_BATCH", "5000"))
+
+# mode=replace carrega em uma tabela temporária e só troca pela original no
+# fim: sem o prefixo datasheet_, ela não aparece nas listagens nem no contexto
+REPLACE_STAGING_PREFIX = "_replace_"
+REPLACE_BACKUP_PREFIX = "_replaced_"
+MAX_TABLE_NAME_LENGTH = 64  # Limite do MariaDB para nomes de tabela
 
 def get_tables():
     connection = get_db_connection()
-    cursor = connection.cursor()
-    
-    cursor.execute("SHOW TABLES")
-    all_tables = [table[0] for table in cursor.fetchall()]
-    
-    # Filtra apenas tabelas com prefixo datasheet_
-    datasheet_tables = [t for t in all_tables if t.startswith('datasheet_')]
-    
-    cursor.close()
-    connection.close()
-    return datasheet_tables
-
-def read_excel_in_chunks(file, batch_size=1000):
-    """Lê um arquivo Excel em chunks de DataFrames."""
-    wb = load_workbook(file, read_only=True)
-    ws = wb.active
-    rows = []
-    headers = [cell.value for cell in next(ws.rows)]  # primeira linha
-    for i, row in enumerate(ws.iter_rows(values_only=True)):
-        if i == 0:
-            continue  # já lemos o cabeçalho
-        rows.append(row)
-        if len(rows) == batch_size:
-            yield pd.DataFrame(rows, columns=headers)
-            rows = []
-    if rows:
-        yield pd.DataFrame(rows, columns=headers)
-
-
-def create_table_from_dataframe(cursor, table_name, df):
-    """ Cria uma tabela no banco de dados com base no DataFrame fornecido."""
+    cursor = None
+    
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SHOW TABLES")
+        all_tables = [table[0] for table in cursor.fetchall()]
+        
+        # Filtra apenas tabelas com prefixo datasheet_
+        datasheet_tables = [t for t in all_tables if t.startswith('datasheet_')]
+        
+        return datasheet_tables
+    finally:
+        close_db_connection(connection, cursor)
+
+async def spool_upload_to_disk(upload_file: UploadFile, directory: str = UPLOAD_DIR) -> tuple:
+    """
+    Grava o upload em um arquivo temporário, em blocos de UPLOAD_CHUNK_SIZE.
+    
+    Evita manter o arquivo inteiro em memória. O hash do conteúdo é
+    calculado durante a cópia (usado para não reimportar arquivos idênticos).
+    
+    Returns:
+        tuple: (caminho do arquivo temporário, tamanho em bytes, SHA-256 em hex)
+    """
+    os.makedirs(directory, exist_ok=True)
+    suffix = os.path.splitext(upload_file.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+    size = 0
+    digest = hashlib.sha256()
+    
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    except Exception:
+        remove_file_quietly(path)
+        raise
+    
+    return path, size, digest.hexdigest()
+
+
+def remove_file_quietly(path: str):
+    """Remove um arquivo temporário ignorando erros."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def format_load_data_value(value) -> str:
+    """Formata um valor para o arquivo do LOAD DATA (campos separados por TAB)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (bool, np.bool_)):
+        return "1" if value else "0"
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+_LOAD_DATA_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\"}
+
+
+def parse_load_data_line(line: str) -> tuple:
+    """Inverso de format_load_data_value para uma linha inteira."""
+    values = []
+    for field in line.rstrip("\n").split("\t"):
+        if field == "\\N":
+            values.append(None)
+        else:
+            values.append(re.sub(r"\\(.)", lambda m: _LOAD_DATA_ESCAPES.get(m.group(1), m.group(1)), field))
+    return tuple(values)
+
+
+def check_load_data_result(cursor, table_name: str, expected_rows: int):
+    """
+    Confere o resultado de um LOAD DATA LOCAL INFILE.
+    
+    Com LOCAL, o servidor não interrompe a carga por valores inválidos ou
+    chaves duplicadas: o valor é truncado ou a linha é pulada, com um aviso.
+    Sem esta conferência o import terminaria "com sucesso" e a contagem
+    gravada incluiria linhas que não existem.
+    
+    Raises:
+        ValueError: Linhas puladas ou avisos de conversão (o lote é desfeito)
+    """
+    affected = cursor.rowcount
+    if affected == expected_rows and getattr(cursor, "warning_count", None) == 0:
+        return
+    cursor.execute(f"SHOW WARNINGS LIMIT {BULK_LOAD_MAX_WARNINGS}")
+    warnings = [w for w in cursor.fetchall() if w["Level"] != "Note"]
+    if affected == expected_rows and not warnings:
+        return
+    details = "; ".join(f"{w['Level']} {w['Code']}: {w['Message']}" for w in warnings)
+    raise ValueError(
+        f"LOAD DATA em `{table_name}` gravou {affected} de {expected_rows} linhas"
+        + (f" ({details})" if details else "")
+    )
+
+
+class LoadDataBuffer:
+    """
+    Acumula linhas em um arquivo temporário e as carrega com LOAD DATA LOCAL INFILE.
+    
+    Se o servidor recusar o LOAD DATA (local_infile desabilitado), as linhas
+    já gravadas são inseridas com executemany e o buffer se desativa para o
+    restante do import. Uma carga com linhas puladas ou valores truncados
+    falha o import (ver check_load_data_result).
+    """
+    
+    def __init__(self, table_name: str, columns: list, directory: str = UPLOAD_DIR):
+        self.table_name = table_name
+        self.columns = columns
+        self.enabled = True
+        self.pending_rows = 0
+        # Caminho absoluto: o driver só libera arquivos dentro de DB_LOCAL_INFILE_DIR
+        directory = os.path.abspath(directory)
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="load_", suffix=".tsv", dir=directory)
+        self._file = os.fdopen(fd, "w", encoding="utf-8", newline="\n")
+    
+    def append(self, rows):
+        write = self._file.write
+        for row in rows:
+            write("\t".join(format_load_data_value(v) for v in row) + "\n")
+        self.pending_rows += len(rows)
+    
+    def flush(self, connection, cursor, insert_query: str, insert_stats: dict):
+        """Carrega as linhas pendentes e registra o tempo no modo usado."""
+        if not self.pending_rows:
+            return
+        self._file.flush()
+        rows = self.pending_rows
+        start = time.perf_counter()
+        mode = "load_data"
+        
+        try:
+            columns_str = ", ".join([f"`{col}`" for col in self.columns])
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE `{self.table_name}` CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns_str})",
+                (self.path,)
+            )
+        except Error as e:
+            connection.rollback()
+            print(f"Aviso: LOAD DATA indisponível ({e}); usando executemany")
+            self.enabled = False
+            mode = "executemany"
+            with open(self.path, encoding="utf-8", newline="\n") as f:
+                batch = []
+                for line in f:
+                    batch.append(parse_load_data_line(line))
+                    if len(batch) == IMPORT_BATCH_SIZE:
+                        cursor.executemany(insert_query, batch)
+                        batch = []
+                if batch:
+                    cursor.executemany(insert_query, batch)
+        else:
+            # Fora do try: uma carga incompleta falha, sem cair no executemany
+            check_load_data_result(cursor, self.table_name, rows)
+        
+        add_table_row_count(cursor, self.table_name, rows)
+        connection.commit()
+        record_insert_stats(insert_stats, mode, rows, time.perf_counter() - start)
+        
+        self._file.seek(0)
+        self._file.truncate()
+        self.pending_rows = 0
+    
+    def close(self):
+        self._file.close()
+        remove_file_quietly(self.path)
+
+
+def record_insert_stats(insert_stats: dict, mode: str, rows: int, seconds: float):
+    """Acumula linhas e tempo de insert por modo (executemany ou load_data)."""
+    stats = insert_stats.setdefault(mode, {"rows": 0, "seconds": 0.0})
+    stats["rows"] += rows
+    stats["seconds"] += seconds
+    stats["rows_per_second"] = round(stats["rows"] / stats["seconds"]) if stats["seconds"] > 0 else None
+
+
+def table_exists(cursor, table_name: str) -> bool:
+    """Verifica se a tabela existe no banco atual."""
+    cursor.execute("""
+        SELECT COUNT(*) as count 
+        FROM information_schema.tables 
+        WHERE table_schema = DATABASE() 
+        AND table_name = %s
+    """, (table_name,))
+    return cursor.fetchone()["count"] > 0
+
+
+def create_table_from_dataframe(cursor, table_name, df, column_profiles=None):
+    """
+    Cria uma tabela no banco de dados com base no DataFrame fornecido.
+    
+    Com column_profiles (ver infer_column_types) usa os tipos inferidos do
+    arquivo inteiro; sem eles, mapeia os dtypes do pandas do DataFrame.
+    
+    Returns:
+        dict: {coluna sanitizada: tipo SQL}
+    """
     columns = df.columns
-    types = df.dtypes
     sanitized_columns = [sanitize_sql_name(col) for col in columns]
-    col_defs = ", ".join([f"`{col}` {get_sql_type(dtype)}" for col, dtype in zip(sanitized_columns, types)])
-    create_table_query = f"CREATE TABLE IF NOT EXISTS `datasheet_{table_name}` ({col_defs});"
+    if column_profiles:
+        sql_types = [profile.sql_type() for profile in column_profiles]
+    else:
+        sql_types = [get_sql_type(dtype) for dtype in df.dtypes]
+    col_defs = ", ".join([f"`{col}` {sql_type}" for col, sql_type in zip(sanitized_columns, sql_types)])
+    # Chave substituta auto-incremento: ordem estável para a paginação por cursor
+    row_id_def = f"`{ROW_ID_COLUMN}` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY"
+    prefixed_table_name = (
+        table_name if table_name.startswith(('datasheet_', REPLACE_STAGING_PREFIX)) else f"datasheet_{table_name}"
+    )
+    create_table_query = f"CREATE TABLE IF NOT EXISTS `{prefixed_table_name}` ({row_id_def}, {col_defs});"
     cursor.execute(create_table_query)
+    return dict(zip(sanitized_columns, sql_types))
 
 
-async def import_excel_to_database(upload_file: UploadFile, table_name: str = None):
+def is_text_column_type(column_type: str) -> bool:
+    """Indica se o tipo (como retornado pelo DESCRIBE) é de texto."""
+    return column_type.lower().split("(")[0].strip() in TEXT_COLUMN_TYPES
+
+
+def fetch_fulltext_columns(cursor, table_name: str) -> list:
+    """Colunas cobertas pelo índice FULLTEXT de busca, na ordem do índice (vazio se não existe)."""
+    cursor.execute(f"SHOW INDEX FROM `{table_name}`")
+    rows = [
+        row for row in cursor.fetchall()
+        if row["Key_name"] == FULLTEXT_INDEX_NAME and row["Index_type"] == "FULLTEXT"
+    ]
+    return [row["Column_name"] for row in sorted(rows, key=lambda row: row["Seq_in_index"])]
+
+
+def ensure_fulltext_index(cursor, table_name: str) -> dict:
     """
-    Importa um arquivo Excel (UploadFile do FastAPI) para o banco de dados MariaDB.
+    Cria o índice FULLTEXT de busca sobre as colunas de texto da tabela.
     
-    Args:
-        upload_file: Objeto UploadFile do FastAPI contendo o arquivo Excel
-        table_name: Nome da tabela a ser criada (opcional, usa nome do arquivo se None)
+    Chamado ao fim do import: construir o índice de uma vez depois da carga
+    é bem mais barato que mantê-lo linha a linha durante os INSERTs.
     
     Returns:
-        dict: Informações sobre a importação
+        dict: {"columns": colunas indexadas, "created": bool, "seconds": tempo gasto}
     """
-    connection = None
-    cursor = None
+    existing = fetch_fulltext_columns(cursor, table_name)
+    if existing:
+        return {"columns": existing, "created": False, "seconds": 0.0}
+    
+    cursor.execute(f"DESCRIBE `{table_name}`")
+    text_columns = [
+        col["Field"] for col in cursor.fetchall()
+        if col["Field"] not in INTERNAL_COLUMNS and is_text_column_type(col["Type"])
+    ][:FULLTEXT_MAX_COLUMNS]
+    if not text_columns:
+        return {"columns": [], "created": False, "seconds": 0.0}
+    
+    start = time.perf_counter()
+    columns_str = ", ".join(f"`{col}`" for col in text_columns)
+    cursor.execute(f"ALTER TABLE `{table_name}` ADD FULLTEXT INDEX `{FULLTEXT_INDEX_NAME}` ({columns_str})")
+    return {"columns": text_columns, "created": True, "seconds": round(time.perf_counter() - start, 3)}
+
+
+def add_missing_columns(cursor, table_name: str, column_types: dict) -> list:
+    """
+    Adiciona à tabela existente as colunas do arquivo que ela ainda não tem.
+    
+    Returns:
+        list: Colunas adicionadas (vazia se o esquema já cobria o arquivo)
+    """
+    cursor.execute(f"DESCRIBE `{table_name}`")
+    existing = {col["Field"] for col in cursor.fetchall()}
+    missing = [col for col in column_types if col not in existing]
+    if missing:
+        additions = ", ".join(f"ADD COLUMN `{col}` {column_types[col]}" for col in missing)
+        cursor.execute(f"ALTER TABLE `{table_name}` {additions}")
+    return missing
+
+
+def widen_existing_columns(cursor, table_name: str, column_types: dict) -> dict:
+    """
+    Alarga as colunas existentes cujo tipo não comporta os valores do novo arquivo.
+    
+    A inferência escolhe o tipo mais estreito (VARCHAR(n), TINYINT,
+    DECIMAL(p,s)): um append/upsert com textos mais longos ou números maiores
+    falharia no modo estrito (ou truncaria). O tipo passa a ser o mais largo
+    entre o gravado e o inferido para o arquivo.
     
+    Returns:
+        dict: {coluna: novo tipo} das colunas alteradas
+    """
+    cursor.execute(f"DESCRIBE `{table_name}`")
+    existing = {col["Field"]: col["Type"] for col in cursor.fetchall()}
+    widened = {}
+    for column, sql_type in column_types.items():
+        if column in existing:
+            wider = widen_sql_type(existing[column], sql_type)
+            if wider is not None:
+                widened[column] = wider
+    if widened:
+        changes = ", ".join(f"MODIFY COLUMN `{col}` {sql_type}" for col, sql_type in widened.items())
+        cursor.execute(f"ALTER TABLE `{table_name}` {changes}")
+    return widened
+
+
+def replace_table_name(prefix: str, table_name: str) -> str:
+    """Nome único para a tabela temporária (ou a cópia antiga) de um import com mode=replace."""
+    return f"{prefix}{uuid.uuid4().hex[:8]}_{table_name}"[:MAX_TABLE_NAME_LENGTH]
+
+
+def swap_replaced_table(cursor, staging_table: str, table_name: str, rows: int):
+    """
+    Coloca a tabela carregada no lugar da original (RENAME TABLE atômico) e descarta a antiga.
+    
+    Até aqui a tabela original ficou intacta: um import com mode=replace que
+    falha no meio não apaga os dados do usuário.
+    """
+    backup_table = replace_table_name(REPLACE_BACKUP_PREFIX, table_name)
+    cursor.execute(
+        f"RENAME TABLE `{table_name}` TO `{backup_table}`, `{staging_table}` TO `{table_name}`"
+    )
+    cursor.execute(f"DROP TABLE `{backup_table}`")
+    set_table_row_count(cursor, table_name, rows)
+    delete_table_row_count(cursor, staging_table)
+
+
+def drop_staging_table(cursor, staging_table: str):
+    """Descarta a tabela temporária de um replace que falhou (sem mascarar o erro original)."""
     try:
-        # Lê o conteúdo do arquivo em memória
-        contents = await upload_file.read()
-        file_like = io.BytesIO(contents)
+        cursor.execute(f"DROP TABLE IF EXISTS `{staging_table}`")
+        delete_table_row_count(cursor, staging_table)
+    except Error as e:
+        print(f"Aviso: Erro ao remover a tabela temporária {staging_table}: {e}")
+
+
+def index_exists(cursor, table_name: str, index_name: str) -> bool:
+    """Verifica se a tabela tem um índice com esse nome."""
+    cursor.execute(f"SHOW INDEX FROM `{table_name}` WHERE Key_name = %s", (index_name,))
+    return bool(cursor.fetchall())
+
+
+class UpsertWriter:
+    """
+    Grava os chunks de um import incremental (mode=upsert).
+    
+    Cada linha leva o hash do seu conteúdo em _row_hash. Por chunk, uma
+    consulta indexada traz as chaves (ou hashes) já gravadas e só as linhas
+    novas (INSERT) ou alteradas (UPDATE) vão para o banco; as idênticas são
+    descartadas. Sem coluna chave, a linha é identificada pelo hash: uma
+    linha alterada entra como nova e a versão anterior permanece.
+    """
+    
+    def __init__(self, table_name: str, columns: list, key_column: str = None):
+        if key_column is not None and key_column not in columns:
+            raise ValueError(f"Coluna chave '{key_column}' não existe no arquivo")
+        self.table_name = table_name
+        self.columns = columns
+        self.key_column = key_column
+        self.key_position = columns.index(key_column) if key_column is not None else None
+        self.stats = {
+            "key_column": key_column,
+            "inserted": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "hashes_backfilled": 0,
+            "lookup_seconds": 0.0
+        }
         
-        # Se table_name não fornecido, usa o nome do arquivo
-        if not table_name:
-            table_name = upload_file.filename.rsplit('.', 1)[0]  # Remove extensão
+        columns_str = ", ".join(f"`{col}`" for col in columns + [ROW_HASH_COLUMN])
+        placeholders = ", ".join(["%s"] * (len(columns) + 1))
+        self.insert_query = f"INSERT INTO `{table_name}` ({columns_str}) VALUES ({placeholders})"
+        if key_column is not None:
+            assignments = ", ".join(f"`{col}` = %s" for col in columns + [ROW_HASH_COLUMN])
+            self.update_query = f"UPDATE `{table_name}` SET {assignments} WHERE `{key_column}` = %s"
+    
+    def prepare(self, connection, cursor):
+        """
+        Garante a coluna _row_hash e os índices de busca, e calcula o hash das
+        linhas que ainda não têm (gravadas por append ou antes do upsert).
+        """
+        cursor.execute(f"DESCRIBE `{self.table_name}`")
+        column_types = {col["Field"]: col["Type"].lower() for col in cursor.fetchall()}
+        if ROW_ID_COLUMN not in column_types:
+            raise ValueError(f"Tabela '{self.table_name}' não tem {ROW_ID_COLUMN}; reimporte com mode=replace")
+        if ROW_HASH_COLUMN not in column_types:
+            cursor.execute(f"ALTER TABLE `{self.table_name}` ADD COLUMN `{ROW_HASH_COLUMN}` CHAR(32) NULL")
+        if not index_exists(cursor, self.table_name, f"ix{ROW_HASH_COLUMN}"):
+            cursor.execute(f"CREATE INDEX `ix{ROW_HASH_COLUMN}` ON `{self.table_name}` (`{ROW_HASH_COLUMN}`)")
+        if self.key_column is not None:
+            key_index = f"ix_key_{self.key_column}"
+            if not index_exists(cursor, self.table_name, key_index):
+                key_type = column_types.get(self.key_column, "")
+                # Colunas TEXT/BLOB só podem ser indexadas por um prefixo
+                prefix = f"({INDEX_PREFIX_CHARS})" if "text" in key_type or "blob" in key_type else ""
+                cursor.execute(f"CREATE INDEX `{key_index}` ON `{self.table_name}` (`{self.key_column}`{prefix})")
         
-        # Sanitiza o nome da tabela
-        table_name = sanitize_sql_name(table_name)
+        columns_str = ", ".join(f"`{col}`" for col in self.columns)
+        while True:
+            cursor.execute(
+                f"SELECT `{ROW_ID_COLUMN}`, {columns_str} FROM `{self.table_name}` "
+                f"WHERE `{ROW_HASH_COLUMN}` IS NULL LIMIT %s",
+                (IMPORT_BATCH_SIZE,)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            hashes = row_hashes([tuple(row[col] for col in self.columns) for row in rows], self.columns)
+            cursor.executemany(
+                f"UPDATE `{self.table_name}` SET `{ROW_HASH_COLUMN}` = %s WHERE `{ROW_ID_COLUMN}` = %s",
+                [(row_hash, row[ROW_ID_COLUMN]) for row_hash, row in zip(hashes, rows)]
+            )
+            connection.commit()
+            self.stats["hashes_backfilled"] += len(rows)
+    
+    def lookup(self, cursor, rows: list, hashes: list) -> dict:
+        """Chaves (com o hash gravado) ou hashes do chunk que já existem na tabela."""
+        if self.key_position is None:
+            column, values = ROW_HASH_COLUMN, list(dict.fromkeys(hashes))
+        else:
+            column = self.key_column
+            values = list({canonical_value(row[self.key_position]): row[self.key_position]
+                           for row in rows if row[self.key_position] is not None}.values())
         
+        existing = {}
+        for start in range(0, len(values), UPSERT_LOOKUP_BATCH):
+            batch = values[start:start + UPSERT_LOOKUP_BATCH]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"SELECT `{column}` AS k, `{ROW_HASH_COLUMN}` AS h FROM `{self.table_name}` "
+                f"WHERE `{column}` IN ({placeholders})",
+                batch
+            )
+            for row in cursor.fetchall():
+                if self.key_position is None:
+                    existing[row["h"]] = True
+                else:
+                    existing[canonical_value(row["k"])] = row["h"]
+        return existing
+    
+    def write(self, connection, cursor, rows: list, insert_stats: dict):
+        """Grava as linhas novas e alteradas do chunk em uma transação."""
+        hashes = row_hashes(rows, self.columns)
+        start = time.perf_counter()
+        existing = self.lookup(cursor, rows, hashes)
+        self.stats["lookup_seconds"] += time.perf_counter() - start
+        inserts, updates, unchanged = plan_upsert(rows, hashes, existing, self.key_position)
+        
+        start = time.perf_counter()
+        if inserts:
+            cursor.executemany(self.insert_query, [row + (row_hash,) for row, row_hash in inserts])
+            add_table_row_count(cursor, self.table_name, len(inserts))
+        if updates:
+            cursor.executemany(
+                self.update_query,
+                [row + (row_hash, row[self.key_position]) for row, row_hash in updates]
+            )
+        connection.commit()
+        if inserts or updates:
+            record_insert_stats(insert_stats, "upsert", len(inserts) + len(updates), time.perf_counter() - start)
+        
+        self.stats["inserted"] += len(inserts)
+        self.stats["updated"] += len(updates)
+        self.stats["unchanged"] += unchanged
+    
+    def summary(self) -> dict:
+        return dict(self.stats, lookup_seconds=round(self.stats["lookup_seconds"], 3))
+
+
+def count_chunk_rows(chunks, progress, field: str):
+    """Repassa os chunks informando o total de linhas lidas via progress(**{field: n})."""
+    rows = 0
+    for chunk_df in chunks:
+        rows += len(chunk_df)
+        yield chunk_df
+        progress(**{field: rows})
+
+
+def import_chunks_to_database(chunks, table_name: str, estimated_rows: int = None, column_profiles: list = None,
+                              progress=None, mode: str = "append", key_column: str = None):
+    """
+    Cria a tabela e insere os chunks de DataFrame no banco (bloqueante).
+    
+    Deve ser executada fora do event loop (ver run_db). Usa executemany
+    por chunk e muda para LOAD DATA LOCAL INFILE quando a estimativa de
+    linhas (ou o total já lido) passa de BULK_LOAD_ROW_THRESHOLD.
+    
+    Em uma tabela existente, colunas novas do arquivo são adicionadas com
+    ALTER TABLE. Com mode="replace" o arquivo é carregado em uma tabela
+    temporária, que só substitui a original depois da carga completa (ver
+    swap_replaced_table); com mode="upsert" só as linhas novas ou alteradas
+    são gravadas (ver UpsertWriter).
+    
+    Args:
+        chunks: Iterável de DataFrames com os dados
+        table_name: Nome da tabela já sanitizado (sem prefixo obrigatório)
+        estimated_rows: Estimativa do total de linhas (opcional)
+        column_profiles: Tipos inferidos do arquivo inteiro (opcional, ver infer_column_types)
+        progress: Callback opcional progress(**campos) chamado a cada chunk com
+            rows_parsed/rows_inserted (ex.: ImportJob.update; roda na thread do import)
+        mode: "append" (padrão), "upsert" ou "replace" (ver IMPORT_MODES)
+        key_column: Coluna que identifica a linha no upsert (None = hash do conteúdo)
+    
+    Returns:
+        dict: {
+            "table_name": nome da tabela com prefixo,
+            "rows_imported": total de linhas inseridas,
+            "peak_chunk_bytes": maior uso de memória de um chunk,
+            "insert_modes": {modo: {"rows", "seconds", "rows_per_second"}},
+            "search_index": {"columns", "created", "seconds"} ou None,
+            "column_types": {coluna: tipo SQL} das colunas inseridas,
+            "mode": modo do import,
+            "table_created": True se a tabela foi criada (ou recriada) por este import,
+            "added_columns": colunas criadas por ALTER TABLE em tabela existente,
+            "widened_columns": {coluna: novo tipo} das colunas existentes alargadas,
+            "upsert": {"inserted", "updated", "unchanged", ...} ou None
+        }
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Modo de import inválido: {mode} (use {', '.join(IMPORT_MODES)})")
+    if key_column is not None and mode != "upsert":
+        raise ValueError("Coluna chave só é usada com mode=upsert")
+    
+    connection = None
+    cursor = None
+    bulk = None
+    upsert = None
+    staging_table = None
+    
+    try:
         # Conecta ao banco
         connection = get_db_connection()
         cursor = get_db_cursor(connection)
         
         total_rows = 0
+        peak_chunk_bytes = 0
+        insert_stats = {}
         first_chunk = True
+        column_types = {}
+        added_columns = []
+        widened_columns = {}
+        table_created = False
+        prefixed_table_name = table_name if table_name.startswith('datasheet_') else f"datasheet_{table_name}"
         
         # Processa o arquivo em chunks
-        for chunk_df in read_excel_in_chunks(file_like):
-            # Substitui colunas com nomes vazios ou NaN por nomes genéricos
-            new_columns = []
-            for i, col in enumerate(chunk_df.columns):
-                # Verifica se é NaN ou vazio
-                if pd.isna(col) or str(col).strip() == '' or str(col).lower() == 'nan':
-                    new_columns.append(f'column_{i}')
-                else:
-                    new_columns.append(str(col))
-            chunk_df.columns = new_columns
+        for chunk_df in chunks:
+            peak_chunk_bytes = max(peak_chunk_bytes, int(chunk_df.memory_usage(deep=True).sum()))
             
-            # Cria a tabela apenas no primeiro chunk
+            # Cria a tabela e monta o INSERT apenas no primeiro chunk
             if first_chunk:
-                create_table_from_dataframe(cursor, table_name, chunk_df)
+                # Substitui colunas com nomes vazios ou NaN por nomes genéricos
+                column_names = []
+                for i, col in enumerate(chunk_df.columns):
+                    if pd.isna(col) or str(col).strip() == '' or str(col).lower() == 'nan':
+                        column_names.append(f'column_{i}')
+                    else:
+                        column_names.append(str(col))
+                chunk_df.columns = column_names
+
+                table_existed = table_exists(cursor, prefixed_table_name)
+                # Tabela que recebe as linhas (a temporária, em um replace de tabela existente)
+                load_table = prefixed_table_name
+                if table_existed and mode == "replace":
+                    staging_table = replace_table_name(REPLACE_STAGING_PREFIX, prefixed_table_name)
+                    load_table = staging_table
+                    table_existed = False
+                column_types = create_table_from_dataframe(cursor, load_table, chunk_df, column_profiles)
+                if table_existed:
+                    # Arquivo atualizado pode trazer colunas novas
+                    added_columns = add_missing_columns(cursor, prefixed_table_name, column_types)
+                    # ... e valores que não cabem no tipo das colunas já existentes
+                    widened_columns = widen_existing_columns(cursor, prefixed_table_name, column_types)
+                else:
+                    # Tabela nova: zera a contagem gravada (pode haver sobra de uma tabela removida)
+                    set_table_row_count(cursor, load_table, 0)
+                    table_created = True
+                
+                sanitized_columns = [sanitize_sql_name(col) for col in column_names]
+                placeholders = ", ".join(["%s"] * len(sanitized_columns))
+                columns_str = ", ".join([f"`{col}`" for col in sanitized_columns])
+                insert_query = f"INSERT INTO `{load_table}` ({columns_str}) VALUES ({placeholders})"
+                
+                if mode == "upsert":
+                    upsert = UpsertWriter(
+                        prefixed_table_name, sanitized_columns,
+                        sanitize_sql_name(key_column) if key_column else None
+                    )
+                    upsert.prepare(connection, cursor)
+                
+                if staging_table is None:
+                    # No replace a tabela original (e o registro de upload) só muda na troca
+                    bump_schema_version(cursor, [prefixed_table_name])
                 connection.commit()
                 first_chunk = False
             
-            # Substitui todos os tipos de NaN/None por NULL antes de inserir
-            # Inclui float('nan') e a string 'nan' também
-            chunk_df = chunk_df.replace({pd.NA: None, pd.NaT: None, np.nan: None, 'nan': None, 'NaN': None, 'NAN': None})
-            chunk_df = chunk_df.where(pd.notnull(chunk_df), None)
+            # Converte para os tipos inferidos (números/datas em texto, vazios -> NULL)
+            # direto na lista de tuplas do INSERT, coluna a coluna
+            data = chunk_to_rows(chunk_df, column_profiles)
             
-            # Insere os dados
-            sanitized_columns = [sanitize_sql_name(col) for col in chunk_df.columns]
-            placeholders = ", ".join(["%s"] * len(sanitized_columns))
-            columns_str = ", ".join([f"`{col}`" for col in sanitized_columns])
-            prefixed_table_name = table_name if table_name.startswith('datasheet_') else f"datasheet_{table_name}"
+            # Imports grandes passam a usar LOAD DATA (decidido uma única vez)
+            if (bulk is None and upsert is None and BULK_LOAD_ENABLED
+                    and max(estimated_rows or 0, total_rows) >= BULK_LOAD_ROW_THRESHOLD):
+                bulk = LoadDataBuffer(load_table, sanitized_columns)
             
-            insert_query = f"INSERT INTO `{prefixed_table_name}` ({columns_str}) VALUES ({placeholders})"
+            if upsert is not None:
+                # Só as linhas novas ou alteradas vão para o banco
+                upsert.write(connection, cursor, data, insert_stats)
+            elif bulk is not None and bulk.enabled:
+                bulk.append(data)
+                if bulk.pending_rows >= BULK_LOAD_BATCH_ROWS:
+                    bulk.flush(connection, cursor, insert_query, insert_stats)
+            else:
+                start = time.perf_counter()
+                cursor.executemany(insert_query, data)
+                # Mantém a contagem de linhas na mesma transação do chunk
+                add_table_row_count(cursor, load_table, len(data))
+                connection.commit()
+                record_insert_stats(insert_stats, "executemany", len(data), time.perf_counter() - start)
             
-            # Converte DataFrame para lista de tuplas
-            data = [tuple(row) for row in chunk_df.values]
-            cursor.executemany(insert_query, data)
+            total_rows += len(data)
+            if progress:
+                pending = bulk.pending_rows if bulk is not None and bulk.enabled else 0
+                progress(rows_parsed=total_rows, rows_inserted=total_rows - pending)
+        
+        if bulk is not None:
+            bulk.flush(connection, cursor, insert_query, insert_stats)
+            if progress:
+                progress(rows_inserted=total_rows)
+        
+        # Índice de busca criado depois da carga (uma única vez por tabela)
+        search_index = None
+        if SEARCH_FULLTEXT_ENABLED and not first_chunk:
+            if progress:
+                progress(phase="indexing")
+            search_index = ensure_fulltext_index(cursor, load_table)
+        
+        if staging_table is not None:
+            swap_replaced_table(cursor, staging_table, prefixed_table_name, total_rows)
+            staging_table = None
+        
+        # Contagem e preview mudaram: invalida o contexto em cache
+        if not first_chunk:
+            bump_schema_version(cursor, [prefixed_table_name])
             connection.commit()
-            
-            total_rows += len(chunk_df)
-
+        
         return {
-            "success": True,
             "table_name": prefixed_table_name,
             "rows_imported": total_rows,
-            "filename": upload_file.filename
+            "peak_chunk_bytes": peak_chunk_bytes,
+            "insert_modes": insert_stats,
+            "search_index": search_index,
+            "column_types": column_types,
+            "mode": mode,
+            "table_created": table_created,
+            "added_columns": added_columns,
+            "widened_columns": widened_columns,
+            "upsert": upsert.summary() if upsert is not None else None
         }
         
-    except Exception as e:
+    except Exception:
         if connection:
             connection.rollback()
-        raise Exception(f"Erro ao importar Excel para banco: {str(e)}")
+            if staging_table is not None:
+                drop_staging_table(cursor, staging_table)
+                connection.commit()
+        raise
         
     finally:
+        if bulk is not None:
+            bulk.close()
         close_db_connection(connection, cursor)
 
 
+def get_chunk_reader(file_format: str) -> tuple:
+    """
+    Leitor de chunks, estimador de linhas e linhas por chunk para o formato do arquivo.
+    
+    Excel é lido linha a linha pelo openpyxl; CSV/TSV/Parquet em lotes
+    colunares maiores (ver app.columnar).
+    """
+    if file_format == "excel":
+        return read_excel_in_chunks, estimate_excel_rows, IMPORT_BATCH_SIZE
+    return (
+        functools.partial(read_columnar_in_chunks, file_format=file_format),
+        functools.partial(estimate_columnar_rows, file_format=file_format),
+        IMPORT_COLUMNAR_BATCH_SIZE
+    )
+
+
+def find_duplicate_upload(file_hash: str, table_name: str, mode: str = "append", sheet_name: str = None):
+    """
+    Procura um import anterior do mesmo arquivo que torne este desnecessário (bloqueante).
+    
+    - O arquivo já foi importado na tabela de destino e ela não mudou desde
+      então: não há o que fazer (com mode=replace, só se a tabela tem
+      exatamente o conteúdo do arquivo).
+    - A tabela de destino não existe e o arquivo está inteiro em outra
+      tabela: o import aponta para ela (alias) em vez de duplicar os dados.
+    
+    Returns:
+        tuple: (registro, alias) ou (None, False) se o arquivo precisa ser importado
+    """
+    connection = None
+    cursor = None
+    
+    try:
+        connection = get_db_connection()
+        cursor = get_db_cursor(connection)
+        entries = [
+            entry for entry in find_registered_uploads(cursor, file_hash=file_hash)
+            if entry["sheet_name"] == sheet_name
+        ]
+        for entry in entries:
+            if entry["table_name"] == table_name and (mode != "replace" or entry["exact"]):
+                return entry, False
+        exact_entries = [entry for entry in entries if entry["exact"]]
+        if exact_entries and not table_exists(cursor, table_name):
+            return exact_entries[0], True
+        return None, False
+    finally:
+        close_db_connection(connection, cursor)
+
+
+def find_previous_uploads(table_names: list, mode: str = "append") -> dict:
+    """
+    Último upload ainda válido de cada tabela, para comparar o hash dos dados (bloqueante).
+    
+    Com mode=replace só contam tabelas com exatamente o conteúdo do upload.
+    
+    Returns:
+        dict: {tabela: registro} (ver find_registered_uploads)
+    """
+    connection = None
+    cursor = None
+    
+    try:
+        connection = get_db_connection()
+        cursor = get_db_cursor(connection)
+        previous = {}
+        for table_name in table_names:
+            for entry in find_registered_uploads(cursor, table_name=table_name):
+                if mode != "replace" or entry["exact"]:
+                    previous[table_name] = entry
+        return previous
+    finally:
+        close_db_connection(connection, cursor)
+
+
+def record_upload(table_name: str, file_hash: str, data_hash: str, exact: bool, filename: str,
+                  sheet_name: str = None, result: dict = None):
+    """
+    Registra o upload importado na tabela (bloqueante).
+    
+    O registro só evita reimports futuros: uma falha aqui é apenas avisada.
+    """
+    connection = None
+    cursor = None
+    
+    try:
+        connection = get_db_connection()
+        cursor = get_db_cursor(connection)
+        register_upload(cursor, table_name, file_hash, data_hash, exact, filename, sheet_name, result)
+        connection.commit()
+    except Exception as e:
+        print(f"Aviso: não foi possível registrar o upload de {table_name}: {str(e)}")
+    finally:
+        close_db_connection(connection, cursor)
+
+
+def build_deduplicated_result(entry: dict, reason: str, alias: bool = False, **fields) -> dict:
+    """
+    Resultado de um import dispensado por já existir o mesmo conteúdo no banco.
+    
+    Args:
+        entry: Registro do upload anterior (ver find_registered_uploads)
+        reason: "file" (arquivo idêntico) ou "data" (arquivo diferente, mesmos dados)
+        alias: True se a tabela do resultado é a de outro upload (destino não criado)
+        fields: Campos extras do resultado (filename, file_format, ...)
+    """
+    previous = entry["result"]
+    return {
+        "success": True,
+        "table_name": entry["table_name"],
+        "rows_imported": 0,
+        **fields,
+        "column_types": previous.get("column_types", {}),
+        "deduplicated": {
+            "reason": reason,
+            "alias": alias,
+            "previous_filename": entry["filename"],
+            "previous_rows_imported": previous.get("rows_imported"),
+            "imported_at": str(entry["updated_at"])
+        }
+    }
+
+
+async def import_file(spool_path: str, filename: str, table_name: str = None,
+                      file_size: int = None, job=None, mode: str = "append", key_column: str = None,
+                      file_hash: str = None):
+    """
+    Importa um arquivo já gravado em disco (Excel, CSV, TSV ou Parquet) e remove o arquivo ao final.
+    
+    O arquivo é lido em chunks (openpyxl em modo read-only para Excel,
+    parser colunar para os demais), então a memória de pico depende do
+    tamanho do chunk e não do tamanho do arquivo. A leitura e os inserts
+    rodam no executor de banco, sem bloquear o event loop.
+    
+    Uploads repetidos não são reimportados: um arquivo idêntico a um import
+    anterior (mesmo hash) retorna sem ser lido, e um arquivo diferente com
+    os mesmos dados (hash calculado na passada de inferência) pula os INSERTs.
+    
+    Args:
+        spool_path: Caminho do arquivo temporário (ver spool_upload_to_disk)
+        filename: Nome original do arquivo (a extensão define o formato)
+        table_name: Nome da tabela a ser criada (opcional, usa nome do arquivo se None)
+        file_size: Tamanho do arquivo em bytes (opcional)
+        job: ImportJob que recebe o progresso (opcional, ver app.jobs)
+        mode: "append", "upsert" ou "replace" em tabela existente (ver import_chunks_to_database)
+        key_column: Coluna chave do upsert (opcional, padrão: hash do conteúdo da linha)
+        file_hash: SHA-256 do arquivo (opcional, ver spool_upload_to_disk; calculado se None)
+    
+    Returns:
+        dict: Informações sobre a importação ("deduplicated" quando o import foi dispensado)
+    """
+    progress = job.update if job is not None else None
+    
+    try:
+        file_format = detect_file_format(filename)
+        if file_format is None:
+            raise ValueError(f"Formato de arquivo não suportado: {filename}")
+        read_chunks, estimate_rows, batch_size = get_chunk_reader(file_format)
+        
+        # Se table_name não fornecido, usa o nome do arquivo
+        if not table_name:
+            table_name = filename.rsplit('.', 1)[0]  # Remove extensão
+        
+        # Sanitiza o nome da tabela
+        table_name = sanitize_sql_name(table_name)
+        prefixed_table_name = table_name if table_name.startswith('datasheet_') else f"datasheet_{table_name}"
+        file_fields = {"filename": filename, "file_format": file_format, "file_size_bytes": file_size}
+        
+        # Arquivo idêntico a um import anterior: retorna sem ler o arquivo
+        if file_hash is None:
+            file_hash = await run_db(hash_file, spool_path)
+        duplicate, alias = await run_db(find_duplicate_upload, file_hash, prefixed_table_name, mode)
+        if duplicate is not None:
+            return build_deduplicated_result(duplicate, "file", alias, **file_fields)
+        
+        estimated_rows = await run_db(estimate_rows, spool_path)
+        if progress:
+            progress(table_name=table_name, estimated_rows=estimated_rows, phase="inferring")
+        
+        # Primeira passada: tipos inferidos sobre o arquivo inteiro, não só o primeiro chunk
+        start = time.perf_counter()
+        hasher = ContentHasher()
+        chunks = hasher.wrap(read_chunks(spool_path))
+        if progress:
+            chunks = count_chunk_rows(chunks, progress, "rows_profiled")
+        column_profiles = await run_db(infer_column_types, chunks)
+        inference_seconds = round(time.perf_counter() - start, 3)
+        data_hash = hasher.hexdigest()
+        
+        # Arquivo diferente com os mesmos dados da tabela (ex.: outra aba alterada): pula os INSERTs
+        previous = (await run_db(find_previous_uploads, [prefixed_table_name], mode)).get(prefixed_table_name)
+        if previous is not None and previous["data_hash"] == data_hash:
+            await run_db(
+                record_upload, prefixed_table_name, file_hash, data_hash, previous["exact"], filename,
+                None, previous["result"]
+            )
+            return build_deduplicated_result(previous, "data", **file_fields)
+        
+        if progress:
+            progress(phase="inserting")
+        result = await run_db(
+            import_chunks_to_database, read_chunks(spool_path), table_name, estimated_rows,
+            column_profiles, progress, mode=mode, key_column=key_column
+        )
+
+        summary = {
+            "success": True,
+            "table_name": result["table_name"],
+            "rows_imported": result["rows_imported"],
+            **file_fields,
+            "memory": {
+                "upload_buffer_bytes": UPLOAD_CHUNK_SIZE,
+                "batch_size": batch_size,
+                "peak_chunk_bytes": result["peak_chunk_bytes"]
+            },
+            "insert_modes": result["insert_modes"],
+            "search_index": result["search_index"],
+            "column_types": result["column_types"],
+            "mode": result["mode"],
+            "added_columns": result["added_columns"],
+            "widened_columns": result["widened_columns"],
+            "upsert": result["upsert"],
+            "type_inference_seconds": inference_seconds,
+            # A passada de inferência lê o arquivo inteiro: mede a vazão do parser
+            "parse_rows_per_second": (
+                int(result["rows_imported"] / inference_seconds) if inference_seconds else None
+            )
+        }
+        await run_db(
+            record_upload, result["table_name"], file_hash, data_hash, result["table_created"], filename,
+            None, summary
+        )
+        # Novas colunas/tabelas podem pedir índices de JOIN: o advisor roda em segundo plano
+        schedule_index_advisor("import")
+        return summary
+        
+    except Exception as e:
+        raise Exception(f"Erro ao importar arquivo para banco: {str(e)}")
+    
+    finally:
+        remove_file_quietly(spool_path)
+
+
+def iter_pipeline_chunks(queue):
+    """Consome os chunks enviados por parse_sheet_worker até a mensagem final."""
+    while True:
+        kind, payload = queue.get()
+        if kind == "chunk":
+            yield payload
+        elif kind == "done":
+            return
+        else:
+            raise Exception(payload)
+
+
+def drain_pipeline_queue(queue):
+    """Descarta as mensagens restantes para que o processo de parse não fique bloqueado."""
+    while True:
+        kind, _ = queue.get()
+        if kind in ("done", "error"):
+            return
+
+
+def import_sheet_from_queue(queue, table_name: str, progress=None, mode: str = "append", key_column: str = None):
+    """
+    Insere no banco os chunks de uma aba à medida que o processo de parse os envia (bloqueante).
+    
+    Roda nas threads de INSERT (ver get_insert_executor), e não no executor
+    de banco, em paralelo com o parse das próximas chunks/abas, de modo que
+    leitura e INSERTs se sobrepõem. A espera pela inferência da aba não
+    segura conexão: ela só é emprestada do pool quando os chunks começam a chegar.
+    
+    Returns:
+        dict: Resultado de import_chunks_to_database com o "data_hash" da aba,
+        ou None se a aba não mudou desde o último import (nada foi gravado)
+    """
+    kind, payload = queue.get()
+    if kind == "error":
+        raise Exception(payload)
+    if kind == "unchanged":
+        if progress:
+            progress(phase="unchanged")
+        return None
+    estimated_rows, column_profiles, data_hash = payload
+    if progress:
+        progress(estimated_rows=estimated_rows, phase="inserting")
+    
+    try:
+        result = import_chunks_to_database(
+            iter_pipeline_chunks(queue), table_name, estimated_rows, column_profiles, progress,
+            mode=mode, key_column=key_column
+        )
+    except Exception:
+        drain_pipeline_queue(queue)
+        raise
+    
+    if progress:
+        progress(phase="completed")
+    result["data_hash"] = data_hash
+    return result
+
+
+def build_sheet_table_names(base_name: str, sheets: list) -> dict:
+    """Nome de tabela por aba ("<base>_<aba>"), sem colisões entre abas de nomes parecidos."""
+    names = {}
+    used = set()
+    for sheet in sheets:
+        # Nomes de aba costumam ter espaços ("Custos Fixos")
+        name = sanitize_sql_name(re.sub(r"\s+", "_", f"{base_name}_{sheet}")) or base_name
+        candidate, suffix = name, 2
+        while candidate in used:
+            candidate = f"{name}_{suffix}"
+            suffix += 1
+        used.add(candidate)
+        names[sheet] = candidate
+    return names
+
+
+async def import_workbook_sheets(spool_path: str, filename: str, sheets: list = None, table_name: str = None,
+                                 file_size: int = None, job=None, mode: str = "append", key_column: str = None,
+                                 file_hash: str = None):
+    """
+    Importa várias abas de uma planilha, cada uma em sua tabela datasheet_<base>_<aba>.
+    
+    Cada aba é lida em um processo do pool (o parse do openpyxl é CPU-bound)
+    e os chunks seguem por uma fila limitada para uma thread de INSERT, que
+    grava enquanto o parse continua. Até IMPORT_PARSE_WORKERS abas são
+    processadas ao mesmo tempo, então o tempo total tende ao da maior aba.
+    
+    Se a planilha inteira já foi importada nessas tabelas, retorna sem ler o
+    arquivo; senão, abas cujos dados não mudaram desde o último import são
+    puladas logo após a passada de inferência.
+    
+    Args:
+        spool_path: Caminho do arquivo temporário (removido ao final)
+        filename: Nome original do arquivo
+        sheets: Abas a importar (None = todas)
+        table_name: Prefixo das tabelas (opcional, usa o nome do arquivo se None)
+        file_size: Tamanho do arquivo em bytes (opcional)
+        job: ImportJob que recebe o progresso por aba (opcional, ver app.jobs)
+        mode: Modo do import em cada tabela (ver import_chunks_to_database)
+        key_column: Coluna chave do upsert, que deve existir em todas as abas (opcional)
+        file_hash: SHA-256 do arquivo (opcional, ver spool_upload_to_disk; calculado se None)
+    
+    Returns:
+        dict: Informações sobre a importação, com o resultado de cada aba em "sheets"
+    """
+    try:
+        available = await run_db(list_excel_sheets, spool_path)
+        if sheets:
+            missing = [sheet for sheet in sheets if sheet not in available]
+            if missing:
+                raise ValueError(f"Abas não encontradas: {', '.join(missing)}")
+        else:
+            sheets = available
+        
+        base_name = sanitize_sql_name(table_name or filename.rsplit('.', 1)[0])
+        table_names = build_sheet_table_names(base_name, sheets)
+        prefixed_names = {sheet: f"datasheet_{table_names[sheet]}" for sheet in sheets}
+        
+        # Mesma planilha já importada em todas as tabelas: nada a ler
+        if file_hash is None:
+            file_hash = await run_db(hash_file, spool_path)
+        previous = await run_db(find_previous_uploads, list(prefixed_names.values()), mode)
+        previous_by_sheet = {sheet: previous.get(prefixed_names[sheet]) for sheet in sheets}
+        if all(
+            entry is not None and entry["file_hash"] == file_hash and entry["sheet_name"] == sheet
+            for sheet, entry in previous_by_sheet.items()
+        ):
+            results = [
+                dict(build_deduplicated_result(entry, "file"), sheet_name=sheet)
+                for sheet, entry in previous_by_sheet.items()
+            ]
+            return {
+                "success": True,
+                "filename": filename,
+                "file_size_bytes": file_size,
+                "tables": [result["table_name"] for result in results],
+                "rows_imported": 0,
+                "seconds": 0.0,
+                "parse_workers": 0,
+                "sheets": results,
+                "deduplicated": {"reason": "file", "sheets_skipped": len(results)}
+            }
+        
+        if job is not None:
+            for sheet in sheets:
+                job.update_sheet(sheet, table_name=prefixed_names[sheet], phase="queued")
+            job.update(phase="inserting")
+        
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max(1, min(IMPORT_PARSE_WORKERS, len(sheets))))
+        
+        async def import_sheet(sheet):
+            async with semaphore:
+                progress = functools.partial(job.update_sheet, sheet) if job is not None else None
+                if progress:
+                    progress(phase="parsing")
+                queue = await loop.run_in_executor(None, create_pipeline_queue)
+                start = time.perf_counter()
+                entry = previous_by_sheet[sheet]
+                
+                async def parse():
+                    try:
+                        return await loop.run_in_executor(
+                            get_parse_executor(), parse_sheet_worker, spool_path, sheet, IMPORT_BATCH_SIZE, queue,
+                            entry["data_hash"] if entry is not None else None
+                        )
+                    except BrokenProcessPool as e:
+                        # O processo morreu sem avisar pela fila: libera a thread de INSERT
+                        discard_parse_executor()
+                        await loop.run_in_executor(None, queue.put, ("error", f"Processo de parse encerrado: {e}"))
+                        raise
+                
+                # Consumidor da fila fora do executor de banco: bloqueado na fila,
+                # não ocupa os workers usados por run_db
+                insert = loop.run_in_executor(
+                    get_insert_executor(), functools.partial(
+                        import_sheet_from_queue, queue, table_names[sheet], progress,
+                        mode=mode, key_column=key_column
+                    )
+                )
+                results = await asyncio.gather(parse(), insert, return_exceptions=True)
+                errors = [r for r in results if isinstance(r, BaseException)]
+                if errors:
+                    if progress:
+                        progress(phase="failed", error=str(errors[-1]))
+                    raise errors[-1]
+                result = results[1]
+                if result is None:
+                    # Aba sem mudanças: registra o arquivo novo para o próximo upload idêntico
+                    await run_db(
+                        record_upload, entry["table_name"], file_hash, entry["data_hash"], entry["exact"],
+                        filename, sheet, entry["result"]
+                    )
+                    result = build_deduplicated_result(entry, "data")
+                else:
+                    await run_db(
+                        record_upload, result["table_name"], file_hash, result.pop("data_hash"),
+                        result["table_created"], filename, sheet, result
+                    )
+                result["sheet_name"] = sheet
+                result["seconds"] = round(time.perf_counter() - start, 3)
+                return result
+        
+        start = time.perf_counter()
+        results = await asyncio.gather(*(import_sheet(sheet) for sheet in sheets), return_exceptions=True)
+        failed = {sheet: str(r) for sheet, r in zip(sheets, results) if isinstance(r, BaseException)}
+        if failed:
+            raise Exception("; ".join(f"{sheet}: {error}" for sheet, error in failed.items()))
+        
+        if any("deduplicated" not in result for result in results):
+            schedule_index_advisor("import")
+        return {
+            "success": True,
+            "filename": filename,
+            "file_size_bytes": file_size,
+            "tables": [result["table_name"] for result in results],
+            "rows_imported": sum(result["rows_imported"] for result in results),
+            "seconds": round(time.perf_counter() - start, 3),
+            "parse_workers": min(IMPORT_PARSE_WORKERS, len(sheets)),
+            "sheets": results,
+            "deduplicated": {
+                "reason": "data",
+                "sheets_skipped": sum(1 for result in results if "deduplicated" in result)
+            } if any("deduplicated" in result for result in results) else None
+        }
+    
+    except Exception as e:
+        raise Exception(f"Erro ao importar Excel para banco: {str(e)}")
+    
+    finally:
+        remove_file_quietly(spool_path)
+
+
+async def import_excel_to_database(upload_file: UploadFile, table_name: str = None):
+    """
+    Importa um arquivo Excel (UploadFile do FastAPI) para o banco de dados MariaDB.
+    
+    O upload é gravado em disco em blocos e então importado por
+    import_file, aguardando o fim do import.
+    
+    Args:
+        upload_file: Objeto UploadFile do FastAPI contendo o arquivo Excel
+        table_name: Nome da tabela a ser criada (opcional, usa nome do arquivo se None)
+    
+    Returns:
+        dict: Informações sobre a importação
+    """
+    # Grava o upload em disco em blocos (sem carregar o arquivo inteiro)
+    spool_path, file_size, file_hash = await spool_upload_to_disk(upload_file)
+    return await import_file(spool_path, upload_file.filename, table_name, file_size, file_hash=file_hash)
+
+
+def encode_page_cursor(sort_by, sort_order: str, value, row_id, direction: str) -> str:
+    """
+    Gera um cursor opaco de paginação com a chave de ordenação e o row id.
+    
+    Args:
+        sort_by: Coluna de ordenação (None para a ordem padrão)
+        sort_order: "asc" ou "desc"
+        value: Valor da coluna de ordenação na linha de referência
+        row_id: Valor de _row_id na linha de referência
+        direction: "next" (linhas depois da referência) ou "prev" (antes)
+    """
+    payload = {"s": sort_by, "o": sort_order, "v": value, "id": row_id, "d": direction}
+    raw = json.dumps(payload, default=str, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_page_cursor(token: str):
+    """Decodifica um cursor de paginação. Retorna None se for inválido."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, dict) or payload.get("d") not in ("next", "prev") or not isinstance(payload.get("id"), int):
+        return None
+    return payload
+
+
+def build_keyset_condition(sort_column, value, row_id, ascending: bool) -> tuple:
+    """
+    Monta a condição "linhas depois de (value, row_id)" na ordem informada.
+    
+    Segue a ordenação do MariaDB: NULL vem primeiro em ASC e por último em DESC.
+    
+    Returns:
+        tuple: (sql, params)
+    """
+    rid = f"`{ROW_ID_COLUMN}`"
+    op = ">" if ascending else "<"
+    if sort_column is None:
+        return f"{rid} {op} %s", [row_id]
+    
+    col = f"`{sort_column}`"
+    if value is None:
+        if ascending:
+            return f"(({col} IS NULL AND {rid} > %s) OR {col} IS NOT NULL)", [row_id]
+        return f"({col} IS NULL AND {rid} < %s)", [row_id]
+    if ascending:
+        return f"({col} > %s OR ({col} = %s AND {rid} > %s))", [value, value, row_id]
+    return f"({col} < %s OR ({col} = %s AND {rid} < %s) OR {col} IS NULL)", [value, value, row_id]
+
+
+SEARCH_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+NUMERIC_SEARCH_RE = re.compile(r"^[\d\s.,:/+-]+$")
+
+
+def build_fulltext_query(search: str):
+    """
+    Converte o termo de busca em uma expressão do MATCH ... AGAINST em BOOLEAN MODE.
+    
+    Cada palavra vira "+palavra*" (todas obrigatórias, casando por prefixo).
+    Retorna None quando algum termo é curto demais para o índice, caso em
+    que a busca precisa cair no LIKE.
+    """
+    tokens = SEARCH_TOKEN_RE.findall(search)
+    if not tokens or any(len(token) < SEARCH_MIN_TOKEN_SIZE for token in tokens):
+        return None
+    return " ".join(f"+{token}*" for token in tokens)
+
+
+def build_search_condition(columns: list, fulltext_columns: list, search: str) -> tuple:
+    """
+    Monta a condição de busca sobre as colunas da tabela.
+    
+    Usa o índice FULLTEXT para as colunas de texto cobertas por ele; LIKE
+    fica restrito às colunas fora do índice e, para colunas não textuais,
+    só entra quando o termo parece um número ou data (senão nunca casaria).
+    Sem índice ou com termos curtos, volta ao LIKE em todas as colunas.
+    
+    Args:
+        columns: Linhas do DESCRIBE (dicts com "Field" e "Type"), sem o _row_id
+        fulltext_columns: Colunas do índice FULLTEXT de busca
+        search: Termo de busca
+    
+    Returns:
+        tuple: (condição SQL, parâmetros, modo "fulltext" ou "like")
+    """
+    like_param = f"%{search}%"
+    against = build_fulltext_query(search) if fulltext_columns else None
+    
+    if against is None:
+        conditions = [f"`{sanitize_sql_name(col['Field'])}` LIKE %s" for col in columns]
+        return f"({' OR '.join(conditions)})", [like_param] * len(columns), "like"
+    
+    indexed = set(fulltext_columns)
+    match_columns = ", ".join(f"`{col}`" for col in fulltext_columns)
+    conditions = [f"MATCH({match_columns}) AGAINST (%s IN BOOLEAN MODE)"]
+    params = [against]
+    looks_numeric = bool(NUMERIC_SEARCH_RE.match(search))
+    for col in columns:
+        if col["Field"] in indexed:
+            continue
+        if is_text_column_type(col["Type"]) or looks_numeric:
+            conditions.append(f"`{sanitize_sql_name(col['Field'])}` LIKE %s")
+            params.append(like_param)
+    return f"({' OR '.join(conditions)})", params, "fulltext"
+
+
+def count_table_records(cursor, table_name: str, where_clause: str, params: list,
+                        search: str = None, approximate: bool = False) -> dict:
+    """
+    Conta os registros de uma tabela (com filtro opcional) usando cache.
+    
+    O cache é indexado por (tabela, busca) e validado pela versão da tabela em
+    schema_versions, que o import incrementa. No modo aproximado:
+    - sem busca, usa a contagem gravada pelo import ou a estimativa do InnoDB;
+    - com busca, conta no máximo COUNT_APPROX_CAP + 1 linhas.
+    
+    Returns:
+        dict: {"total": int, "exact": bool, "capped": bool, "cached": bool}
+    """
+    version = get_schema_version(cursor, table_name)
+    search_key = search or ""
+    
+    # Uma contagem exata em cache também atende pedidos aproximados
+    modes = ["exact", "approximate"] if approximate else ["exact"]
+    for mode in modes:
+        cached = _count_cache.get((table_name, search_key, mode))
+        if cached and cached["version"] == version:
+            return {**cached["result"], "cached": True}
+    
+    if approximate and not search:
+        stored = fetch_row_count(cursor, table_name) or {"total_rows": 0, "source": "estimate"}
+        result = {"total": stored["total_rows"], "exact": stored["source"] == "metadata", "capped": False}
+    elif approximate:
+        cursor.execute(
+            f"SELECT COUNT(*) as total FROM (SELECT 1 FROM `{table_name}` {where_clause} LIMIT %s) AS limited",
+            params + [COUNT_APPROX_CAP + 1]
+        )
+        total = cursor.fetchone()["total"]
+        capped = total > COUNT_APPROX_CAP
+        result = {"total": min(total, COUNT_APPROX_CAP), "exact": not capped, "capped": capped}
+    else:
+        cursor.execute(f"SELECT COUNT(*) as total FROM `{table_name}` {where_clause}", params)
+        result = {"total": cursor.fetchone()["total"], "exact": True, "capped": False}
+    
+    mode = "exact" if result["exact"] else "approximate"
+    _count_cache.set((table_name, search_key, mode), {"version": version, "result": result})
+    return {**result, "cached": False}
+
+
 def get_table_data_paginated(
     table_name: str,
     page: int = 1,
     page_size: int = 50,
     search: str = None,
     sort_by: str = None,
-    sort_order: str = "asc"
+    sort_order: str = "asc",
+    cursor: str = None,
+    approximate: bool = False
 ):
     """
     Retorna os dados de uma tabela com paginação e filtros
     
+    Tabelas com _row_id usam paginação por cursor (keyset): a página é
+    buscada com WHERE (chave, _row_id) > (última linha) em vez de OFFSET,
+    então páginas profundas custam o mesmo que a primeira. Sem cursor, a
+    página 1 também usa keyset; saltos diretos para outras páginas usam
+    OFFSET e já devolvem cursores para continuar a navegação.
+    
     Args:
         table_name: Nome da tabela (deve começar com datasheet_)
         page: Número da página (inicia em 1)
         page_size: Quantidade de registros por página (máximo 100)
-        search: Termo de busca (busca em todas as colunas de texto)
+        search: Termo de busca (índice FULLTEXT nas colunas de texto; LIKE como fallback)
         sort_by: Nome da coluna para ordenação
         sort_order: Ordem de classificação (asc ou desc)
+        cursor: Cursor opaco (next_cursor/prev_cursor de uma resposta anterior)
+        approximate: Se True, o total pode vir de estatísticas ou de uma contagem limitada
     
     Returns:
         Tupla (success: bool, result: dict)
@@ -165,15 +1432,22 @@ def get_table_data_paginated(
                 "page": 1,
                 "page_size": 50,
                 "total_records": 1000,
-                "total_pages": 20
+                "total_pages": 20,
+                "total_is_exact": true,
+                "total_records_label": "1000" | "~1000" | "10000+",
+                "mode": "keyset|offset",
+                "has_more": true,
+                "next_cursor": "..." | None,
+                "prev_cursor": "..." | None
             },
-            "columns": ["id", "nome", "valor"]
+            "columns": ["id", "nome", "valor"],
+            "search_mode": "fulltext" | "like" | None
         }
         
         Em caso de erro:
         {
             "error": "mensagem de erro",
-            "error_type": "validation|not_found|database"
+            "error_type": "validation|invalid_cursor|not_found|database"
         }
     """
     
@@ -196,72 +1470,138 @@ def get_table_data_paginated(
         page_size = 100
     
     # Validação de sort_order
-    if sort_order.lower() not in ["asc", "desc"]:
+    sort_order = sort_order.lower()
+    if sort_order not in ["asc", "desc"]:
         sort_order = "asc"
     
+    page_cursor = None
+    if cursor:
+        page_cursor = decode_page_cursor(cursor)
+        if page_cursor is None:
+            return False, {
+                "error": "Cursor de paginação inválido",
+                "error_type": "invalid_cursor"
+            }
+    
+    connection = None
+    db_cursor = None
+    
     try:
         connection = get_db_connection()
-        cursor = get_db_cursor(connection)
+        db_cursor = get_db_cursor(connection)
         
         # Verifica se a tabela existe
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.tables 
-            WHERE table_schema = DATABASE() 
-            AND table_name = %s
-        """, (table_name,))
-        
-        if cursor.fetchone()["count"] == 0:
-            cursor.close()
-            connection.close()
+        if not table_exists(db_cursor, table_name):
             return False, {
                 "error": f"Tabela '{table_name}' não encontrada",
                 "error_type": "not_found"
             }
         
-        # Obtém as colunas da tabela
-        cursor.execute(f"DESCRIBE `{safe_table_name}`")
-        columns = [col["Field"] for col in cursor.fetchall()]
+        # Obtém as colunas da tabela (as colunas de controle não são exibidas)
+        db_cursor.execute(f"DESCRIBE `{safe_table_name}`")
+        column_info = db_cursor.fetchall()
+        has_row_id = any(col["Field"] == ROW_ID_COLUMN for col in column_info)
+        column_info = [col for col in column_info if col["Field"] not in INTERNAL_COLUMNS]
+        columns = [col["Field"] for col in column_info]
         
         # Monta a query base
         base_query = f"FROM `{safe_table_name}`"
-        where_clause = ""
+        conditions = []
         params = []
         
-        # Adiciona filtro de busca se fornecido
+        # Adiciona filtro de busca se fornecido (índice FULLTEXT quando existir)
+        search_mode = None
         if search:
-            # Busca em todas as colunas de texto
-            search_conditions = []
-            for col in columns:
-                search_conditions.append(f"`{sanitize_sql_name(col)}` LIKE %s")
-            
-            where_clause = f" WHERE ({' OR '.join(search_conditions)})"
-            params = [f"%{search}%"] * len(columns)
+            fulltext_columns = fetch_fulltext_columns(db_cursor, safe_table_name) if SEARCH_FULLTEXT_ENABLED else []
+            search_sql, params, search_mode = build_search_condition(column_info, fulltext_columns, search)
+            conditions.append(search_sql)
         
-        # Conta total de registros
-        count_query = f"SELECT COUNT(*) as total {base_query} {where_clause}"
-        cursor.execute(count_query, params)
-        total_records = cursor.fetchone()["total"]
+        where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        # Conta total de registros (em cache até a tabela ser reimportada)
+        count = count_table_records(db_cursor, safe_table_name, where_clause, params, search, approximate)
+        total_records = count["total"]
         
         # Calcula total de páginas
         total_pages = (total_records + page_size - 1) // page_size
         
-        # Monta query de dados com paginação
-        offset = (page - 1) * page_size
-        
-        order_clause = ""
+        safe_sort_by = None
         if sort_by and sort_by in columns:
             safe_sort_by = sanitize_sql_name(sort_by)
-            order_clause = f" ORDER BY `{safe_sort_by}` {sort_order.upper()}"
         
-        data_query = f"SELECT * {base_query} {where_clause} {order_clause} LIMIT %s OFFSET %s"
-        cursor.execute(data_query, params + [page_size, offset])
+        if page_cursor is not None and (
+            not has_row_id or page_cursor.get("s") != safe_sort_by or page_cursor.get("o") != sort_order
+        ):
+            return False, {
+                "error": "Cursor de paginação não corresponde à ordenação atual",
+                "error_type": "invalid_cursor"
+            }
         
-        data = cursor.fetchall()
+        use_keyset = has_row_id and (page_cursor is not None or page == 1)
+        backwards = page_cursor is not None and page_cursor["d"] == "prev"
+        # Voltando uma página, percorre na ordem inversa e inverte o resultado
+        ascending = (sort_order == "asc") != backwards
+        direction = "ASC" if ascending else "DESC"
         
-        # Fecha conexão e cursor
-        cursor.close()
-        connection.close()
+        order_parts = []
+        if safe_sort_by:
+            order_parts.append(f"`{safe_sort_by}` {direction}")
+        if has_row_id:
+            # Desempate pelo row id: ordem total e estável
+            order_parts.append(f"`{ROW_ID_COLUMN}` {direction}")
+        order_clause = f" ORDER BY {', '.join(order_parts)}" if order_parts else ""
+        
+        if use_keyset:
+            data_conditions = list(conditions)
+            data_params = list(params)
+            if page_cursor is not None:
+                keyset_sql, keyset_params = build_keyset_condition(
+                    safe_sort_by, page_cursor.get("v"), page_cursor["id"], ascending
+                )
+                data_conditions.append(keyset_sql)
+                data_params += keyset_params
+            data_where = f" WHERE {' AND '.join(data_conditions)}" if data_conditions else ""
+            
+            # Busca uma linha a mais para saber se há outra página nessa direção
+            data_query = f"SELECT * {base_query} {data_where} {order_clause} LIMIT %s"
+            db_cursor.execute(data_query, data_params + [page_size + 1])
+            data = db_cursor.fetchall()
+            has_more = len(data) > page_size
+            data = data[:page_size]
+            if backwards:
+                data.reverse()
+            
+            has_next = (has_more and not backwards) or (backwards and bool(data))
+            has_prev = (has_more and backwards) or (not backwards and page_cursor is not None)
+        else:
+            # Monta query de dados com paginação por OFFSET (saltos diretos e tabelas sem _row_id)
+            offset = (page - 1) * page_size
+            data_query = f"SELECT * {base_query} {where_clause} {order_clause} LIMIT %s OFFSET %s"
+            db_cursor.execute(data_query, params + [page_size + 1, offset])
+            data = db_cursor.fetchall()
+            # Linha extra indica a próxima página (o total pode ser estimado)
+            has_next = len(data) > page_size
+            data = data[:page_size]
+            has_prev = page > 1
+        
+        next_cursor = None
+        prev_cursor = None
+        if has_row_id and data:
+            first, last = data[0], data[-1]
+            if has_next:
+                next_cursor = encode_page_cursor(
+                    safe_sort_by, sort_order, last.get(safe_sort_by) if safe_sort_by else None,
+                    last[ROW_ID_COLUMN], "next"
+                )
+            if has_prev:
+                prev_cursor = encode_page_cursor(
+                    safe_sort_by, sort_order, first.get(safe_sort_by) if safe_sort_by else None,
+                    first[ROW_ID_COLUMN], "prev"
+                )
+        
+        for row in data:
+            row.pop(ROW_ID_COLUMN, None)
+            row.pop(ROW_HASH_COLUMN, None)
         
         return True, {
             "table_name": table_name,
@@ -270,9 +1610,19 @@ def get_table_data_paginated(
                 "page": page,
                 "page_size": page_size,
                 "total_records": total_records,
-                "total_pages": total_pages
+                "total_pages": total_pages,
+                "total_is_exact": count["exact"],
+                "total_records_label": (
+                    f"{total_records}+" if count["capped"]
+                    else str(total_records) if count["exact"] else f"~{total_records}"
+                ),
+                "mode": "keyset" if use_keyset else "offset",
+                "has_more": has_next,
+                "next_cursor": next_cursor,
+                "prev_cursor": prev_cursor
             },
-            "columns": columns
+            "columns": columns,
+            "search_mode": search_mode
         }
         
     except Exception as e:
@@ -280,3 +1630,7 @@ def get_table_data_paginated(
             "error": f"Erro ao buscar dados da tabela: {str(e)}",
             "error_type": "database"
         }
+    
+    finally:
+        # Devolve a conexão ao pool
+        close_db_connection(connection, db_cursor)
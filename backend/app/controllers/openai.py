@@ -1,13 +1,19 @@
-from openai import OpenAI
 from dotenv import load_dotenv
-from ..database import get_db_connection
-import os 
+from ..database import get_db_connection, close_db_connection, run_db
+from ..llm import get_llm_client, OPENAI_TIMEOUT, OPENAI_EXPLAIN_TIMEOUT
+from ..schema import get_database_context
+from ..indexing import schedule_query_usage
+from ..sql_cache import get_cached_sql, store_cached_sql
+from ..result_cache import lookup_result, store_result, referenced_tables
+from ..retrieval import select_tables, widen_tables, unknown_tables, subset_context
+from ..query_limits import run_limited_query, QUERY_MAX_ROWS
+from ..prompt_budget import describe_tables, summarize_results, start_prompt_report, record_prompt, prompt_report_summary
+import asyncio
 import re
+import time
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 
 def validate_sql_query(query: str) -> tuple[bool, str]:
     """
@@ -65,6 +71,8 @@ async def generate_sql_query(user_question: str, database_context: dict) -> dict
     Gera uma query SQL SELECT baseada na pergunta do usuário
     Suporta múltiplas tabelas e JOINs
     
+    A explicação da query é gerada à parte (explain_sql_query), junto com a execução
+    
     Args:
         user_question: Pergunta do usuário
         database_context: Contexto do banco (todas as tabelas, colunas, previews)
@@ -72,27 +80,14 @@ async def generate_sql_query(user_question: str, database_context: dict) -> dict
     Returns:
         dict: {
             "query": "SELECT ...",
-            "explanation": "Explicação da query",
             "tables_used": ["table1", "table2"],
             "error": None ou mensagem de erro
         }
     """
     tables_info = database_context.get('tables', {})
     
-    # Prepara contexto de todas as tabelas
-    tables_description = ""
-    for table_name, info in tables_info.items():
-        columns = info.get('columns', [])
-        total_rows = info.get('total_rows', 0)
-        preview = info.get('preview', [])
-        
-        tables_description += f"""
-Tabela: `{table_name}`
-- Colunas: {', '.join([f'`{col}`' for col in columns])}
-- Total de linhas: {total_rows}
-- Preview: {preview[:2]}
-
-"""
+    # Prepara contexto das tabelas, dentro do orçamento de tokens do prompt
+    tables_description, _ = describe_tables(tables_info)
     
     # Prompt para gerar SQL
     system_prompt = f"""Você é um especialista em SQL que gera queries SELECT seguras para MySQL/MariaDB.
@@ -116,7 +111,7 @@ INSTRUÇÕES:
 - Use aliases de tabela (t1, t2, etc) para melhor legibilidade
 - Use funções de agregação quando apropriado (COUNT, SUM, AVG, MAX, MIN)
 - Use GROUP BY, ORDER BY, HAVING quando necessário
-- Use LIMIT para prevenir retornos muito grandes (máximo 1000 linhas)
+- Use LIMIT para prevenir retornos muito grandes (máximo {QUERY_MAX_ROWS} linhas)
 - Retorne APENAS a query SQL, sem explicações adicionais no corpo da query
 - Use backticks (`) para nomes de tabelas e colunas
 - Para visualizar dados de múltiplas tabelas independentes, use UNION ALL com uma coluna indicando a tabela
@@ -135,15 +130,19 @@ IMPORTANTE:
 - Se não souber qual coluna usar para JOIN, tente identificar colunas com nomes semelhantes ou use CROSS JOIN se apropriado
 """
 
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    record_prompt("sql", messages)
+    
     try:
-        response = client.chat.completions.create(
+        response = await get_llm_client().chat.completions.create(
             model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=messages,
             temperature=0.3,  # Baixa temperatura para respostas mais determinísticas
-            max_tokens=800
+            max_tokens=800,
+            timeout=OPENAI_TIMEOUT
         )
         
         sql_query = response.choices[0].message.content.strip()
@@ -160,33 +159,15 @@ IMPORTANTE:
         if not is_valid:
             return {
                 "sql_query": sql_query,
-                "explanation": None,
                 "tables_used": [],
                 "error": f"Query inválida ou insegura: {error_msg}"
             }
         
-        # Identifica tabelas usadas na query
-        tables_used = []
-        for table_name in tables_info.keys():
-            if f"`{table_name}`" in sql_query or f" {table_name} " in sql_query.upper():
-                tables_used.append(table_name)
-        
-        # Gera explicação da query
-        explanation_response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você explica queries SQL de forma simples e clara, mencionando as tabelas envolvidas e o que está sendo calculado."},
-                {"role": "user", "content": f"Explique em 1-2 frases o que esta query faz:\n{sql_query}"}
-            ],
-            temperature=0.5,
-            max_tokens=200
-        )
-        
-        explanation = explanation_response.choices[0].message.content.strip()
+        # Identifica tabelas usadas na query (com ou sem crases)
+        tables_used = referenced_tables(sql_query, list(tables_info.keys()))
         
         return {
             "query": sql_query,
-            "explanation": explanation,
             "tables_used": tables_used,
             "error": None
         }
@@ -194,13 +175,72 @@ IMPORTANTE:
     except Exception as e:
         return {
             "query": None,
-            "explanation": None,
             "tables_used": [],
             "error": f"Erro ao gerar query: {str(e)}"
         }
 
 
-async def humanize_query_results(user_question: str, sql_query: str, results: list, database_context: dict = None) -> str:
+async def generate_sql_with_retrieval(user_question: str, database_context: dict) -> tuple:
+    """
+    Gera o SQL enviando ao modelo só as tabelas relevantes à pergunta (ver app.retrieval)
+    
+    Se o SQL gerado citar tabelas que ficaram de fora, gera de novo (uma vez)
+    com o conjunto ampliado
+    
+    Returns:
+        tuple: (resultado de generate_sql_query, {"candidates": int, "selected": int, "widened": bool})
+    """
+    candidates = len(database_context.get('tables', {}))
+    selected = select_tables(user_question, database_context)
+    sql_result = await generate_sql_query(user_question, subset_context(database_context, selected))
+    widened = False
+    
+    if not sql_result['error'] and len(selected) < candidates:
+        missing = unknown_tables(sql_result['query'], selected)
+        if missing:
+            selected = widen_tables(user_question, database_context, selected, missing)
+            sql_result = await generate_sql_query(user_question, subset_context(database_context, selected))
+            widened = True
+    
+    return sql_result, {"candidates": candidates, "selected": len(selected), "widened": widened}
+
+
+async def explain_sql_query(sql_query: str):
+    """
+    Explica em 1-2 frases o que a query faz
+    
+    Só depende do SQL, então roda enquanto a query é executada
+    
+    Args:
+        sql_query: Query SQL já validada
+    
+    Returns:
+        str | None: Explicação (None se a chamada ao modelo falhar)
+    """
+    messages = [
+        {"role": "system", "content": "Você explica queries SQL de forma simples e clara, mencionando as tabelas envolvidas e o que está sendo calculado."},
+        {"role": "user", "content": f"Explique em 1-2 frases o que esta query faz:\n{sql_query}"}
+    ]
+    record_prompt("explain", messages)
+    
+    try:
+        response = await get_llm_client().chat.completions.create(
+            model="gpt-4",
+            messages=messages,
+            temperature=0.5,
+            max_tokens=200,
+            timeout=OPENAI_EXPLAIN_TIMEOUT
+        )
+        
+        return response.choices[0].message.content.strip()
+        
+    except Exception as e:
+        print(f"Aviso: Erro ao gerar explicação da query: {str(e)}")
+        return None
+
+
+async def humanize_query_results(user_question: str, sql_query: str, results: list, database_context: dict = None,
+                                 on_token=None, truncated: bool = False) -> str:
     """
     Transforma os resultados da query SQL em uma resposta humanizada
     
@@ -209,17 +249,21 @@ async def humanize_query_results(user_question: str, sql_query: str, results: li
         sql_query: Query SQL executada
         results: Resultados da query (lista de dicts)
         database_context: Contexto do banco (opcional)
+        on_token: Função async opcional; com ela a resposta é pedida em streaming
+                  e cada trecho de texto é repassado assim que chega do modelo
+        truncated: Se True, a query retornou mais linhas que o teto e o resto foi descartado
     
     Returns:
         str: Resposta humanizada
     """
-    # Prepara contexto dos resultados
+    # Prepara contexto dos resultados, dentro do orçamento de tokens do prompt
+    results_text, results_budget = summarize_results(results)
     result_summary = f"""
 Query executada: {sql_query}
-Número de resultados: {len(results)}
+Número de resultados: {len(results)}{" (teto de linhas atingido: a query retornou mais linhas, que foram descartadas)" if truncated else ""}
 
-Resultados (máximo 100 primeiras linhas):
-{results[:100]}
+Resultados ({results_budget['rows_included']} primeiras linhas, colunas separadas por |):
+{results_text}
 """
 
     system_prompt = """Você é um assistente especializado em análise de dados que transforma resultados de queries SQL em respostas claras e humanizadas.
@@ -242,24 +286,76 @@ Por favor, transforme esses resultados em uma resposta clara e humanizada para o
 Se os resultados formarem uma tabela pequena (até 20 linhas), mostre em formato de tabela markdown.
 Se forem estatísticas ou agregações, apresente de forma narrativa com destaques."""
 
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    record_prompt("humanize", messages)
+    
     try:
-        response = client.chat.completions.create(
+        response = await get_llm_client().chat.completions.create(
             model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=messages,
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=1000,
+            timeout=OPENAI_TIMEOUT,
+            stream=on_token is not None
         )
         
-        return response.choices[0].message.content.strip()
+        if on_token is None:
+            return response.choices[0].message.content.strip()
+        
+        # Streaming: repassa cada trecho e monta o texto completo
+        parts = []
+        async for chunk in response:
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                parts.append(token)
+                await on_token(token)
+        return "".join(parts).strip()
         
     except Exception as e:
         # Fallback: retorna resultados formatados de forma básica
         return f"Encontrei {len(results)} resultado(s):\n\n{results[:10]}"
 
 
+def execute_sql_query(sql_query: str, tables: list = None) -> tuple:
+    """
+    Executa uma query SELECT já validada.
+    
+    Com `tables` (datasheets de que a query depende), o resultado passa pelo
+    cache de resultados (ver app.result_cache), invalidado quando alguma
+    dessas tabelas muda.
+    
+    A execução tem limite de tempo e de linhas (ver app.query_limits): no
+    máximo QUERY_MAX_ROWS linhas voltam, e `truncated` indica que havia mais.
+    
+    Função bloqueante: use com run_db.
+    
+    Returns:
+        tuple: (linhas como lista de dicts, True se vieram do cache, True se o resultado foi cortado)
+    """
+    connection = None
+    cursor = None
+    
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        cached_rows, versions = lookup_result(cursor, sql_query, tables)
+        cached = cached_rows is not None
+        if cached:
+            rows = cached_rows
+        else:
+            # Até QUERY_MAX_ROWS + 1 linhas: a linha a mais só indica o corte
+            rows = run_limited_query(cursor, sql_query)
+            if versions is not None:
+                store_result(sql_query, rows, versions)
+        return rows[:QUERY_MAX_ROWS], cached, len(rows) > QUERY_MAX_ROWS
+    
+    finally:
+        close_db_connection(connection, cursor)
+
+
 async def generate_answer(question: str, progress_callback=None) -> dict:
     """
     Processa uma pergunta do usuário e gera resposta com base nos dados
@@ -280,31 +376,33 @@ async def generate_answer(question: str, progress_callback=None) -> dict:
             "sql_explanation": str | None,
             "tables_used": list,
             "results_count": int,
+            "truncated": bool,  # só com success: a query tinha mais linhas que QUERY_MAX_ROWS
             "humanized_response": str | None,
             "raw_results": list,
-            "available_tables": list
+            "available_tables": list,
+            "sql_cache": {"hit": bool, "llm_seconds": float, "llm_seconds_saved": float},  # só com success
+            "prompt_tokens": {"sql": int, "explain": int, "humanize": int, "total": int, "estimated": bool}  # só com success
         }
     """
-    connection = None
-    cursor = None
+    # A explicação emite seu evento em paralelo com a execução: um envio por vez
+    emit_lock = asyncio.Lock()
     
     async def emit_progress(event_type: str, data: dict):
         """Helper para emitir eventos de progresso se callback fornecido"""
         if progress_callback:
-            await progress_callback(event_type, data)
+            async with emit_lock:
+                await progress_callback(event_type, data)
+    
+    explain_task = None
+    # Tokens dos prompts enviados ao modelo nesta pergunta, por etapa
+    prompt_tokens = start_prompt_report()
     
     try:
         await emit_progress("loading_tables", {"message": "Carregando tabelas disponíveis..."})
         
-        connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
-        
-        # Busca TODAS as tabelas disponíveis
-        cursor.execute("SHOW TABLES")
-        all_tables = [table[list(table.keys())[0]] for table in cursor.fetchall()]
-            
-        # FILTRO DE SEGURANÇA: Apenas tabelas com prefixo datasheet_
-        datasheet_tables = [t for t in all_tables if t.startswith('datasheet_')]
+        # Busca TODAS as tabelas disponíveis e o contexto (em cache enquanto o schema não mudar)
+        # FILTRO DE SEGURANÇA: apenas tabelas com prefixo datasheet_
+        datasheet_tables, database_context, context_cached = await run_db(get_database_context)
         
         if not datasheet_tables:
             return {
@@ -327,32 +425,10 @@ async def generate_answer(question: str, progress_callback=None) -> dict:
         })
         
         # Prepara contexto de TODAS as tabelas de datasheet
-        await emit_progress("building_context", {"message": "Analisando estrutura das tabelas..."})
-        database_context = {"tables": {}}
-
-        for table_name in datasheet_tables:
-            try:
-                # Busca estrutura da tabela
-                cursor.execute(f"DESCRIBE `{table_name}`")
-                columns = [col['Field'] for col in cursor.fetchall()]
-                
-                # Conta linhas
-                cursor.execute(f"SELECT COUNT(*) as count FROM `{table_name}`")
-                total_rows = cursor.fetchone()['count']
-                
-                # Preview dos dados
-                cursor.execute(f"SELECT * FROM `{table_name}` LIMIT 3")
-                preview_data = cursor.fetchall()
-                
-                database_context["tables"][table_name] = {
-                    "columns": columns,
-                    "total_rows": total_rows,
-                    "preview": preview_data
-                }
-            except Exception as e:
-                # Se falhar em uma tabela específica, continua com as outras
-                print(f"Aviso: Erro ao carregar tabela {table_name}: {str(e)}")
-                continue
+        await emit_progress("building_context", {
+            "message": "Analisando estrutura das tabelas...",
+            "cached": context_cached
+        })
         
         # Verifica se conseguiu carregar pelo menos uma tabela
         if not database_context["tables"]:
@@ -370,9 +446,17 @@ async def generate_answer(question: str, progress_callback=None) -> dict:
                 "available_tables": datasheet_tables
             }
         
-        # Gera a query SQL usando IA
+        # Gera a query SQL usando IA (ou reaproveita a gerada para a mesma pergunta)
         await emit_progress("generating_sql", {"message": "Gerando query SQL com IA..."})
-        sql_result = await generate_sql_query(question, database_context)
+        cached_sql = await run_db(get_cached_sql, question)
+        if cached_sql is not None:
+            sql_result = {**cached_sql, "error": None}
+            sql_cache = {"hit": True, "llm_seconds": 0.0, "llm_seconds_saved": cached_sql["llm_seconds"]}
+            retrieval = None
+        else:
+            start = time.perf_counter()
+            sql_result, retrieval = await generate_sql_with_retrieval(question, database_context)
+            sql_cache = {"hit": False, "llm_seconds": round(time.perf_counter() - start, 3), "llm_seconds_saved": 0.0}
         
         if sql_result['error']:
             return {
@@ -390,24 +474,44 @@ async def generate_answer(question: str, progress_callback=None) -> dict:
             }
         
         sql_query = sql_result['query']
-        sql_explanation = sql_result['explanation']
         tables_used = sql_result['tables_used']
         
         await emit_progress("sql_generated", {
             "sql_query": sql_query,
-            "explanation": sql_explanation,
-            "tables_used": tables_used
+            "explanation": sql_result.get('explanation'),
+            "tables_used": tables_used,
+            "cached": sql_cache["hit"],
+            "retrieval": retrieval
         })
         
+        # A explicação só depende do SQL: é gerada enquanto a query executa e os
+        # resultados são humanizados, e chega ao cliente no evento "sql_explained"
+        async def explain():
+            if sql_cache["hit"]:
+                explanation = sql_result['explanation']
+            else:
+                explanation = await explain_sql_query(sql_query)
+            await emit_progress("sql_explained", {"explanation": explanation})
+            return explanation
+        
+        explain_task = asyncio.create_task(explain())
+        
         # Executa a query
         await emit_progress("executing_sql", {"message": "Executando query no banco de dados..."})
         try:
-            cursor.execute(sql_query)
-            results = cursor.fetchall()
+            results, results_cached, truncated = await run_db(
+                execute_sql_query, sql_query, referenced_tables(sql_query, datasheet_tables)
+            )
             
             await emit_progress("sql_executed", {
                 "results_count": len(results),
-                "preview": results[:5]
+                "preview": results[:5],
+                "cached": results_cached,
+                "truncated": truncated
+            })
+            # Histórico de colunas usadas em JOIN/WHERE para o advisor de índices (em segundo plano)
+            schedule_query_usage(sql_query, {
+                table: info["columns"] for table, info in database_context["tables"].items()
             })
         except Exception as e:
             return {
@@ -416,7 +520,7 @@ async def generate_answer(question: str, progress_callback=None) -> dict:
                 "error_type": "execution",
                 "question": question,
                 "sql_query": sql_query,
-                "sql_explanation": sql_explanation,
+                "sql_explanation": None,
                 "tables_used": tables_used,
                 "results_count": 0,
                 "humanized_response": None,
@@ -424,15 +528,33 @@ async def generate_answer(question: str, progress_callback=None) -> dict:
                 "available_tables": datasheet_tables
             }
         
-        # Humaniza os resultados
+        # Humaniza os resultados (em streaming quando há quem receba os eventos)
         await emit_progress("humanizing", {"message": "Gerando resposta humanizada..."})
+        
+        async def emit_token(token: str):
+            await emit_progress("answer_token", {"token": token})
+        
         humanized = await humanize_query_results(
             user_question=question,
             sql_query=sql_query,
             results=results,
-            database_context=database_context
+            database_context=database_context,
+            on_token=emit_token if progress_callback else None,
+            truncated=truncated
         )
         
+        sql_explanation = await explain_task
+        # Só entra no cache a query que executou sem erro e tem explicação. A
+        # entrada é invalidada pela versão das tabelas citadas: sem nenhuma
+        # datasheet reconhecida no SQL ela nunca venceria, então não é gravada
+        cache_tables = referenced_tables(sql_query, datasheet_tables)
+        if not sql_cache["hit"] and sql_explanation is not None and cache_tables:
+            await run_db(
+                store_cached_sql, question,
+                {**sql_result, "explanation": sql_explanation, "tables_used": cache_tables},
+                sql_cache["llm_seconds"]
+            )
+        
         return {
             "success": True,
             "error": None,
@@ -442,9 +564,12 @@ async def generate_answer(question: str, progress_callback=None) -> dict:
             "sql_explanation": sql_explanation,
             "tables_used": tables_used,
             "results_count": len(results),
+            "truncated": truncated,
             "humanized_response": humanized,
             "raw_results": results[:100],
-            "available_tables": datasheet_tables
+            "available_tables": datasheet_tables,
+            "sql_cache": sql_cache,
+            "prompt_tokens": prompt_report_summary(prompt_tokens)
         }
         
     except Exception as e:
@@ -464,8 +589,6 @@ async def generate_answer(question: str, progress_callback=None) -> dict:
         }
     
     finally:
-        # Garante que a conexão seja fechada
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
\ No newline at end of file
+        # Em caso de erro a explicação não será mais usada
+        if explain_task is not None and not explain_task.done():
+            explain_task.cancel()
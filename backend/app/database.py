@@ -1,28 +1,303 @@
+import asyncio
+import functools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
 
 # Carrega variáveis do .env
 load_dotenv()
 
+# Configurações do pool de conexões
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))                # Conexões mantidas abertas
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))  # Conexões extras em picos
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))        # Segundos esperando uma conexão livre
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "3600"))      # Idade máxima de uma conexão (segundos)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Threads dedicadas ao acesso bloqueante ao banco (padrão: capacidade total do pool)
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW)))
+
+
+# Único diretório de onde LOAD DATA LOCAL INFILE pode ler (arquivos temporários do import)
+DB_LOCAL_INFILE_DIR = os.path.abspath(os.getenv("DB_LOCAL_INFILE_DIR", os.getenv("UPLOAD_DIR", "uploads")))
+
+
+def _connect():
+    """Abre uma nova conexão física com o MariaDB."""
+    return mysql.connector.connect(
+        host=os.getenv('SERVICE_NAME'),
+        database=os.getenv('DATABASE_NAME'),
+        user=os.getenv('MARIADB_USER'),
+        password=os.getenv('MARIADB_PASSWORD'),
+        port=os.getenv('DATABASE_PORT'),
+        allow_local_infile_in_path=DB_LOCAL_INFILE_DIR
+    )
+
+
+class PooledConnection:
+    """
+    Conexão emprestada do pool.
+
+    Repassa todos os atributos para a conexão real; close() devolve a
+    conexão ao pool em vez de encerrá-la.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise Error("Conexão já foi devolvida ao pool")
+        return getattr(raw, name)
+
+    def is_connected(self):
+        return self._raw is not None and self._raw.is_connected()
+
+    def close(self):
+        """Devolve a conexão ao pool (idempotente)."""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool limitado de conexões MariaDB com checkout/devolução.
+
+    Mantém até `pool_size` conexões ociosas e permite até `max_overflow`
+    conexões extras em picos, que são fechadas ao serem devolvidas.
+    Conexões são validadas com ping antes do empréstimo (pre-ping) e
+    recicladas após `recycle` segundos.
+    """
+
+    def __init__(self, connect=_connect, pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW,
+                 timeout=DB_POOL_TIMEOUT, recycle=DB_POOL_RECYCLE, pre_ping=DB_POOL_PRE_PING):
+        self._connect = connect
+        self.pool_size = max(1, pool_size)
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._cond = threading.Condition()
+        self._idle = []  # Pilha (LIFO) de (conexão, criada_em): reusa as conexões mais "quentes"
+        self._total = 0
+        self._checked_out = 0
+        self._counters = {
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "connections_invalidated": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+
+    def acquire(self, timeout=None):
+        """
+        Empresta uma conexão do pool, abrindo uma nova se houver capacidade.
+
+        Raises:
+            PoolError: se nenhuma conexão ficar livre dentro do timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        raw = None
+        created_at = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, created_at = self._idle.pop()
+                    break
+                if self._total < self.pool_size + self.max_overflow:
+                    self._total += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolError(
+                        f"Pool de conexões esgotado ({self._total} conexões em uso, timeout de {timeout}s)"
+                    )
+                self._counters["waits"] += 1
+                self._cond.wait(remaining)
+            self._checked_out += 1
+            self._counters["checkouts"] += 1
+
+        # Validação e abertura fora do lock para não bloquear outras threads
+        try:
+            if raw is not None and not self._is_usable(raw, created_at):
+                self._discard(raw)
+                raw = None
+            if raw is None:
+                raw = self._connect()
+                created_at = time.monotonic()
+                with self._cond:
+                    self._counters["connections_created"] += 1
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _is_usable(self, raw, created_at):
+        """Verifica idade e, se habilitado, faz ping na conexão."""
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            with self._cond:
+                self._counters["connections_recycled"] += 1
+            return False
+        if self.pre_ping:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._counters["connections_invalidated"] += 1
+                return False
+        return True
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release(self, raw, created_at):
+        """Recebe uma conexão de volta, limpando transações pendentes."""
+        reusable = True
+        try:
+            if raw.is_connected():
+                # Descarta qualquer transação aberta para não vazar estado entre requisições
+                raw.rollback()
+            else:
+                reusable = False
+        except Exception:
+            reusable = False
+
+        with self._cond:
+            self._checked_out -= 1
+            if reusable and len(self._idle) < self.pool_size:
+                self._idle.append((raw, created_at))
+                raw = None
+            else:
+                self._total -= 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._discard(raw)
+
+    def dispose(self):
+        """Fecha todas as conexões ociosas (as emprestadas são fechadas ao voltar)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        """Retorna estatísticas de uso do pool para dimensionamento."""
+        with self._cond:
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "checked_out": self._checked_out,
+                "idle": len(self._idle),
+                "total": self._total,
+                "overflow": max(0, self._total - self.pool_size),
+                **self._counters,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retorna o pool global, criando-o na primeira chamada."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_pool_stats():
+    """Estatísticas do pool global (vazio se ainda não foi criado)."""
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
+
+def close_pool():
+    """Fecha as conexões ociosas do pool global (usado no shutdown)."""
+    if _pool is not None:
+        _pool.dispose()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """Retorna o executor limitado usado para o acesso bloqueante ao banco."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, DB_EXECUTOR_WORKERS),
+                    thread_name_prefix="db"
+                )
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Executa uma função bloqueante de banco no executor dedicado.
+
+    Os handlers async devem usar `await run_db(func, ...)` em vez de chamar
+    código do mysql.connector diretamente, para não travar o event loop.
+    Como o executor tem o mesmo tamanho do pool, as tarefas não ficam
+    disputando conexões.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_db_executor():
+    """Encerra o executor de banco (usado no shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
 
 def get_db_connection():
     """
-    Cria e retorna uma conexão com o banco MariaDB.
+    Empresta uma conexão do pool do banco MariaDB.
+
+    A conexão deve ser devolvida com connection.close() ou close_db_connection().
     """
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('SERVICE_NAME'),
-            database=os.getenv('DATABASE_NAME'),
-            user=os.getenv('MARIADB_USER'),
-            password=os.getenv('MARIADB_PASSWORD'),
-            port=os.getenv('DATABASE_PORT')
-        )
-        
-        if connection.is_connected():
-            return connection
-            
+        return get_pool().acquire()
     except Error as e:
         print(f"Erro ao conectar ao MariaDB: {e}")
         raise
@@ -37,9 +312,13 @@ def get_db_cursor(connection):
 
 def close_db_connection(connection, cursor=None):
     """
-    Fecha cursor e conexão com o banco.
+    Fecha o cursor e devolve a conexão ao pool.
     """
     if cursor:
-        cursor.close()
-    if connection and connection.is_connected():
+        try:
+            cursor.close()
+        except Exception:
+            pass
+    if connection:
+        # Sempre devolve ao pool, mesmo se a conexão caiu (o pool a descarta)
         connection.close()
@@ -0,0 +1,46 @@
+import hashlib
+import pandas as pd
+
+# Hashes de conteúdo usados para não reimportar arquivos (ou abas) idênticos.
+# Não depende do banco: é usado também pelos processos de parse das abas.
+
+HASH_READ_SIZE = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 (hex) do arquivo inteiro."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentHasher:
+    """
+    SHA-256 dos dados lidos de um arquivo ou aba: nomes das colunas e valores.
+
+    Cada chunk entra como o hash vetorizado de cada linha
+    (pd.util.hash_pandas_object), então o resultado não depende do tamanho
+    dos chunks nem da formatação do arquivo (ex.: a mesma aba em um .xlsx
+    salvo de novo ou com outra aba alterada).
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._has_columns = False
+
+    def update(self, chunk_df: pd.DataFrame):
+        if not self._has_columns:
+            self._digest.update("\x1f".join(str(col) for col in chunk_df.columns).encode("utf-8"))
+            self._has_columns = True
+        self._digest.update(pd.util.hash_pandas_object(chunk_df, index=False).to_numpy().tobytes())
+
+    def wrap(self, chunks):
+        """Repassa os chunks incorporando cada um ao hash."""
+        for chunk_df in chunks:
+            self.update(chunk_df)
+            yield chunk_df
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
@@ -0,0 +1,636 @@
+import asyncio
+import hashlib
+import heapq
+import os
+import re
+import threading
+import time
+from .database import get_db_connection, close_db_connection, run_db
+from .schema import fetch_row_counts, add_column_usage, fetch_column_usage
+from .upsert import canonical_value
+from .utils import INTERNAL_COLUMNS, INDEX_PREFIX_CHARS
+
+# Advisor de índices: as datasheets só têm a chave _row_id, então todo JOIN
+# gerado pela IA entre tabelas grandes vira varredura completa. O advisor
+# cria índices secundários nas colunas com cara de chave (alta cardinalidade,
+# nome ou valores em comum com outras datasheets, uso frequente em WHERE/JOIN)
+# dentro de um orçamento de armazenamento.
+INDEX_ADVISOR_ENABLED = os.getenv("INDEX_ADVISOR_ENABLED", "true").lower() in ("1", "true", "yes")
+# Espaço total estimado para os índices criados pelo advisor
+INDEX_ADVISOR_BUDGET_MB = float(os.getenv("INDEX_ADVISOR_BUDGET_MB", "256"))
+# Tabelas menores que isso são varridas rápido e não recebem índice
+INDEX_ADVISOR_MIN_ROWS = int(os.getenv("INDEX_ADVISOR_MIN_ROWS", "10000"))
+# Linhas lidas de cada tabela para medir cardinalidade e sobreposição de valores
+INDEX_ADVISOR_SAMPLE_ROWS = int(os.getenv("INDEX_ADVISOR_SAMPLE_ROWS", "5000"))
+# Pontuação mínima para criar o índice (ver INDEX_ADVISOR_WEIGHTS)
+INDEX_ADVISOR_MIN_SCORE = float(os.getenv("INDEX_ADVISOR_MIN_SCORE", "3"))
+# Roda o advisor a cada N queries registradas no histórico
+INDEX_ADVISOR_QUERY_INTERVAL = int(os.getenv("INDEX_ADVISOR_QUERY_INTERVAL", "25"))
+# Pares de colunas comparados por execução na sobreposição de valores (limita o custo com centenas de tabelas)
+INDEX_ADVISOR_MAX_COMPARISONS = int(os.getenv("INDEX_ADVISOR_MAX_COMPARISONS", "20000"))
+
+INDEX_ADVISOR_WEIGHTS = {
+    "join": 3,         # por query que usou a coluna em um JOIN
+    "filter": 2,       # por query que usou a coluna no WHERE
+    "overlap": 4,      # valores contidos em uma coluna-chave de outra datasheet
+    "shared_name": 2,  # mesmo nome de coluna em outra datasheet
+    "key_like": 1,     # quase todos os valores distintos na amostra
+}
+# Fração de valores distintos na amostra para a coluna ser considerada chave
+KEY_DISTINCT_RATIO = 0.9
+# Colunas com menos valores distintos que isso não ganham índice (ex.: status, sim/não)
+MIN_DISTINCT_VALUES = 20
+# Fração dos valores de uma coluna encontrados na outra para contar como relação
+MIN_OVERLAP_RATIO = 0.5
+# Valores testados por par de colunas na sobreposição (mantém o custo linear)
+OVERLAP_PROBE_VALUES = 200
+
+ADVISOR_INDEX_PREFIX = "ix_auto_"
+MAX_INDEX_NAME_LENGTH = 64
+
+# Bytes da chave de índice por tipo; texto usa o tamanho médio da amostra
+KEY_BYTES = {
+    "tinyint": 1, "smallint": 2, "mediumint": 3, "int": 4, "bigint": 8, "float": 4, "double": 8,
+    "date": 3, "datetime": 8, "timestamp": 4, "time": 3, "year": 1, "bit": 1,
+}
+NUMBER_TYPES = ("tinyint", "smallint", "mediumint", "int", "bigint", "decimal", "float", "double", "bit")
+TEXT_TYPES = ("char", "varchar", "tinytext", "text", "mediumtext", "longtext")
+DATE_TYPES = ("date", "datetime", "timestamp", "time", "year")
+# Chave primária (_row_id BIGINT) repetida em cada entrada + cabeçalho do registro
+INDEX_ENTRY_OVERHEAD = 8 + 6
+# Páginas do InnoDB não ficam cheias e há os níveis internos da árvore
+INDEX_PAGE_FACTOR = 1.5
+
+SQL_KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "OUTER", "CROSS", "FULL", "NATURAL",
+    "STRAIGHT_JOIN", "ON", "USING", "AS", "AND", "OR", "NOT", "IN", "IS", "NULL", "LIKE", "BETWEEN",
+    "GROUP", "BY", "ORDER", "HAVING", "LIMIT", "OFFSET", "UNION", "ALL", "DISTINCT", "ASC", "DESC",
+    "CASE", "WHEN", "THEN", "ELSE", "END", "EXISTS", "WITH",
+}
+# Palavras que iniciam uma cláusula; as comparações só contam no WHERE e no ON
+CLAUSE_KEYWORDS = {
+    "SELECT", "FROM", "WHERE", "JOIN", "STRAIGHT_JOIN", "ON", "USING", "GROUP", "ORDER", "HAVING", "LIMIT", "UNION",
+}
+COMPARISON_CLAUSES = ("WHERE", "ON")
+COMPARISON_KEYWORDS = ("IN", "LIKE", "BETWEEN", "IS")
+
+# Comentários (-- , # e /* */) viram tokens "comment", ignorados por quem lê a query
+SQL_TOKEN_RE = re.compile(r"""
+    (?P<comment>--(?=\s|$)[^\n]*|\#[^\n]*|/\*[\s\S]*?(?:\*/|\Z))
+  | (?P<literal>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.)*"|\d+(?:\.\d+)?)
+  | `(?P<quoted>(?:[^`]|``)+)`
+  | (?P<word>\w+)
+  | (?P<op><=>|<=|>=|<>|!=|=|<|>)
+  | (?P<other>\S)
+""", re.VERBOSE)
+
+_advisor_lock = threading.Lock()
+_background_tasks = set()
+_advisor_task = None
+_queries_since_advice = 0
+
+
+def tokenize_sql(sql_query: str) -> list:
+    """
+    Quebra a query em tokens (tipo, valor), juntando `tabela`.`coluna`.
+
+    Tipos: "literal", "name" (identificador), "keyword", "op" (comparação),
+    "column" (valor = (qualificador, nome)) e "other".
+    """
+    tokens = []
+    for match in SQL_TOKEN_RE.finditer(sql_query):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        if kind == "quoted":
+            tokens.append(("name", match.group("quoted").replace("``", "`")))
+        elif kind == "word":
+            word = match.group("word")
+            tokens.append(("keyword", word.upper()) if word.upper() in SQL_KEYWORDS else ("name", word))
+        else:
+            tokens.append((kind, match.group(kind)))
+
+    merged = []
+    i = 0
+    while i < len(tokens):
+        if (i + 2 < len(tokens) and tokens[i][0] == "name" and tokens[i + 1] == ("other", ".")
+                and tokens[i + 2][0] == "name"):
+            merged.append(("column", (tokens[i][1], tokens[i + 2][1])))
+            i += 3
+        else:
+            merged.append(tokens[i])
+            i += 1
+    return merged
+
+
+def extract_column_usage(sql_query: str, columns_by_table: dict) -> dict:
+    """
+    Colunas de datasheets comparadas em JOIN (coluna = coluna de outra tabela)
+    ou em filtros (coluna comparada a um valor) no WHERE/ON de uma query.
+
+    Colunas sem qualificador são resolvidas quando só uma das tabelas da
+    query tem a coluna. Cada coluna conta no máximo uma vez por tipo de uso.
+
+    Args:
+        sql_query: Query SELECT gerada
+        columns_by_table: {tabela: [colunas]} das datasheets
+
+    Returns:
+        dict: {(tabela, coluna): {"join": 0|1, "filter": 0|1}}
+    """
+    tokens = tokenize_sql(sql_query)
+    lookup = {
+        table: {col.lower(): col for col in columns}
+        for table, columns in columns_by_table.items()
+    }
+
+    # Tabelas e aliases das cláusulas FROM/JOIN
+    aliases = {}
+    clause = None
+    expect_table = False
+    for i, (kind, value) in enumerate(tokens):
+        if kind == "keyword":
+            if value in ("FROM", "JOIN", "STRAIGHT_JOIN"):
+                expect_table = True
+            if value in CLAUSE_KEYWORDS:
+                clause = value
+            continue
+        if kind == "other" and value == "," and clause == "FROM":
+            expect_table = True
+            continue
+        if expect_table and kind == "name":
+            expect_table = False
+            if value not in lookup:
+                continue
+            aliases[value.lower()] = value
+            following = tokens[i + 1:i + 3]
+            if following and following[0] == ("keyword", "AS"):
+                following = following[1:]
+            if following and following[0][0] == "name":
+                aliases[following[0][1].lower()] = value
+        elif kind != "name":
+            expect_table = False
+    query_tables = set(aliases.values())
+
+    def resolve(token):
+        kind, value = token
+        if kind == "column":
+            qualifier, name = value
+            table = aliases.get(qualifier.lower())
+            candidates = [table] if table else []
+        elif kind == "name":
+            name = value
+            candidates = [t for t in query_tables if name.lower() in lookup[t]]
+        else:
+            return None
+        if len(candidates) != 1 or name.lower() not in lookup[candidates[0]]:
+            return None
+        return candidates[0], lookup[candidates[0]][name.lower()]
+
+    usage = {}
+
+    def mark(column, kind):
+        usage.setdefault(column, {"join": 0, "filter": 0})[kind] = 1
+
+    clause = None
+    for i, (kind, value) in enumerate(tokens):
+        if kind == "keyword" and value in CLAUSE_KEYWORDS:
+            clause = value
+            continue
+        if clause not in COMPARISON_CLAUSES:
+            continue
+        if kind == "op" or (kind == "keyword" and value in COMPARISON_KEYWORDS):
+            left_position = i - 2 if i >= 2 and tokens[i - 1] == ("keyword", "NOT") else i - 1
+            left = resolve(tokens[left_position]) if left_position >= 0 else None
+            right = resolve(tokens[i + 1]) if kind == "op" and i + 1 < len(tokens) else None
+            if left and right and left[0] != right[0]:
+                mark(left, "join")
+                mark(right, "join")
+            else:
+                for column in (left, right):
+                    if column:
+                        mark(column, "filter")
+    return usage
+
+
+def record_query_usage(sql_query: str, columns_by_table: dict) -> dict:
+    """
+    Soma ao histórico (tabela column_usage) as colunas usadas em JOIN/WHERE pela query.
+
+    Função bloqueante: use com run_db.
+    """
+    usage = extract_column_usage(sql_query, columns_by_table)
+    if not usage:
+        return usage
+    connection = None
+    cursor = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        add_column_usage(cursor, usage)
+        connection.commit()
+        return usage
+    finally:
+        close_db_connection(connection, cursor)
+
+
+def column_category(data_type: str):
+    """Família do tipo ("number", "text", "date") ou None se a coluna não deve ser indexada."""
+    if data_type in NUMBER_TYPES:
+        return "number"
+    if data_type in TEXT_TYPES:
+        return "text"
+    if data_type in DATE_TYPES:
+        return "date"
+    return None
+
+
+def profile_sample(rows: list, columns: list) -> dict:
+    """
+    Estatísticas de cada coluna em uma amostra de linhas (lista de dicts).
+
+    Returns:
+        dict: {coluna: {"non_null": n, "distinct": set de valores canônicos,
+        "probe": os OVERLAP_PROBE_VALUES menores valores, "avg_bytes": float}}
+    """
+    profiles = {}
+    for column in columns:
+        values = [row[column] for row in rows if row.get(column) is not None]
+        distinct = {canonical_value(value) for value in values}
+        total_bytes = sum(len(value.encode("utf-8")) for value in distinct)
+        profiles[column] = {
+            "non_null": len(values),
+            "distinct": distinct,
+            "probe": heapq.nsmallest(OVERLAP_PROBE_VALUES, distinct),
+            "avg_bytes": total_bytes / len(distinct) if distinct else 0.0,
+        }
+    return profiles
+
+
+def overlap_ratio(profile: dict, other: dict) -> float:
+    """Fração dos valores de teste (probe) da coluna com menos valores presentes na outra."""
+    small, large = (profile, other) if len(profile["distinct"]) <= len(other["distinct"]) else (other, profile)
+    probe = small["probe"]
+    if not probe:
+        return 0.0
+    distinct = large["distinct"]
+    return sum(1 for value in probe if value in distinct) / len(probe)
+
+
+def overlap_pairs(stats: dict) -> list:
+    """
+    Pares de colunas cuja sobreposição de valores vale medir.
+
+    Só colunas da mesma família de tipo, em tabelas diferentes, com pelo
+    menos uma das duas com cara de chave. Pares com o mesmo nome de coluna
+    vêm primeiro: com o teto INDEX_ADVISOR_MAX_COMPARISONS, são os mais
+    prováveis de formar um JOIN.
+    """
+    by_category = {}
+    for key, info in stats.items():
+        by_category.setdefault(info["category"], []).append(key)
+    pairs = []
+    for group in by_category.values():
+        for key in group:
+            if not stats[key]["key_like"]:
+                continue
+            for other in group:
+                # Entre duas colunas-chave, o par entra uma vez só
+                if other[0] != key[0] and not (stats[other]["key_like"] and other < key):
+                    pairs.append((key, other))
+    pairs.sort(key=lambda pair: pair[0][1].lower() != pair[1][1].lower())
+    return pairs
+
+
+def estimate_index_bytes(data_type: str, column_type: str, rows: int, avg_bytes: float = 0.0) -> int:
+    """Tamanho estimado de um índice secundário de uma coluna no InnoDB."""
+    if data_type in KEY_BYTES:
+        key_bytes = KEY_BYTES[data_type]
+    elif data_type == "decimal":
+        match = re.search(r"\((\d+)", column_type or "")
+        key_bytes = int(match.group(1)) // 2 + 1 if match else 8
+    else:
+        key_bytes = min(avg_bytes, INDEX_PREFIX_CHARS * 4) + 2
+    return int(rows * (key_bytes + INDEX_ENTRY_OVERHEAD) * INDEX_PAGE_FACTOR)
+
+
+def advisor_index_name(column: str) -> str:
+    """Nome do índice criado pelo advisor (nomes longos ganham um sufixo de hash)."""
+    name = f"{ADVISOR_INDEX_PREFIX}{column}"
+    if len(name) <= MAX_INDEX_NAME_LENGTH:
+        return name
+    suffix = hashlib.md5(column.encode("utf-8")).hexdigest()[:8]
+    return f"{name[:MAX_INDEX_NAME_LENGTH - 9]}_{suffix}"
+
+
+def rank_index_candidates(columns: dict, row_counts: dict, samples: dict, usage: dict, indexed: dict) -> list:
+    """
+    Pontua as colunas que merecem um índice.
+
+    Args:
+        columns: {tabela: [{"name", "data_type", "column_type"}]}
+        row_counts: {tabela: total de linhas}
+        samples: {tabela: profile_sample da tabela}
+        usage: {(tabela, coluna): {"join": n, "filter": n}} (histórico de queries)
+        indexed: {tabela: colunas (minúsculas) que já iniciam algum índice}
+
+    Returns:
+        list: dicts com table, column, score, reasons, estimated_bytes e
+        index_name, da maior para a menor pontuação (só acima de INDEX_ADVISOR_MIN_SCORE)
+    """
+    stats = {}
+    for table, table_columns in columns.items():
+        for column in table_columns:
+            profile = samples.get(table, {}).get(column["name"])
+            category = column_category(column["data_type"])
+            if profile is None or category is None or len(profile["distinct"]) < MIN_DISTINCT_VALUES:
+                continue
+            stats[(table, column["name"])] = {
+                **column,
+                "category": category,
+                "profile": profile,
+                "key_like": len(profile["distinct"]) >= KEY_DISTINCT_RATIO * profile["non_null"],
+            }
+
+    # Relações entre datasheets: mesmo nome ou valores contidos em uma coluna-chave
+    relations = {key: {"shared_name": set(), "overlap": {}} for key in stats}
+    by_name = {}
+    for key, info in stats.items():
+        by_name.setdefault((info["category"], key[1].lower()), []).append(key)
+    for group in by_name.values():
+        for key in group:
+            relations[key]["shared_name"].update(other[0] for other in group if other[0] != key[0])
+
+    pairs = overlap_pairs(stats)
+    if len(pairs) > INDEX_ADVISOR_MAX_COMPARISONS:
+        print(f"Aviso: advisor de índices comparou {INDEX_ADVISOR_MAX_COMPARISONS} de {len(pairs)} pares de colunas")
+    for left, right in pairs[:INDEX_ADVISOR_MAX_COMPARISONS]:
+        ratio = overlap_ratio(stats[left]["profile"], stats[right]["profile"])
+        if ratio >= MIN_OVERLAP_RATIO:
+            relations[left]["overlap"][f"{right[0]}.{right[1]}"] = ratio
+            relations[right]["overlap"][f"{left[0]}.{left[1]}"] = ratio
+
+    candidates = []
+    for (table, column), info in stats.items():
+        rows = row_counts.get(table, 0)
+        if rows < INDEX_ADVISOR_MIN_ROWS or column.lower() in indexed.get(table, set()):
+            continue
+        used = usage.get((table, column), {})
+        reasons = {}
+        if used.get("join"):
+            reasons["join"] = used["join"]
+        if used.get("filter"):
+            reasons["filter"] = used["filter"]
+        if relations[(table, column)]["overlap"]:
+            reasons["overlap"] = {k: round(v, 2) for k, v in relations[(table, column)]["overlap"].items()}
+        if relations[(table, column)]["shared_name"]:
+            reasons["shared_name"] = sorted(relations[(table, column)]["shared_name"])
+        if info["key_like"]:
+            reasons["key_like"] = round(len(info["profile"]["distinct"]) / info["profile"]["non_null"], 2)
+
+        score = (
+            INDEX_ADVISOR_WEIGHTS["join"] * reasons.get("join", 0)
+            + INDEX_ADVISOR_WEIGHTS["filter"] * reasons.get("filter", 0)
+            + sum(INDEX_ADVISOR_WEIGHTS[reason] for reason in ("overlap", "shared_name", "key_like") if reason in reasons)
+        )
+        if score < INDEX_ADVISOR_MIN_SCORE:
+            continue
+        candidates.append({
+            "table": table,
+            "column": column,
+            "index_name": advisor_index_name(column),
+            "score": score,
+            "reasons": reasons,
+            "estimated_bytes": estimate_index_bytes(
+                info["data_type"], info["column_type"], rows, info["profile"]["avg_bytes"]
+            ),
+            # Colunas TEXT só podem ser indexadas por um prefixo
+            "prefix": INDEX_PREFIX_CHARS if info["data_type"].endswith("text") else None,
+        })
+
+    candidates.sort(key=lambda c: (-c["score"], c["estimated_bytes"]))
+    return candidates
+
+
+def plan_indexes(candidates: list, budget_bytes: int, used_bytes: int = 0) -> tuple:
+    """
+    Escolhe os candidatos (já ordenados por prioridade) que cabem no orçamento.
+
+    Um candidato grande demais é pulado e os seguintes, menores, ainda podem entrar.
+
+    Returns:
+        tuple: (selecionados, pulados por falta de espaço)
+    """
+    selected, skipped = [], []
+    available = budget_bytes - used_bytes
+    for candidate in candidates:
+        if candidate["estimated_bytes"] <= available:
+            selected.append(candidate)
+            available -= candidate["estimated_bytes"]
+        else:
+            skipped.append(candidate)
+    return selected, skipped
+
+
+def fetch_indexable_columns(cursor) -> dict:
+    """
+    Colunas das datasheets com os tipos, em uma única query.
+
+    Returns:
+        dict: {tabela: [{"name", "data_type", "column_type"}]}
+    """
+    cursor.execute(r"""
+        SELECT table_name AS table_name, column_name AS column_name,
+               data_type AS data_type, column_type AS column_type
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name LIKE 'datasheet\_%'
+        ORDER BY table_name, ordinal_position
+    """)
+    columns = {}
+    for row in cursor.fetchall():
+        table_columns = columns.setdefault(row["table_name"], [])
+        if row["column_name"] not in INTERNAL_COLUMNS:
+            table_columns.append({
+                "name": row["column_name"],
+                "data_type": row["data_type"].lower(),
+                "column_type": row["column_type"],
+            })
+    return columns
+
+
+def fetch_index_columns(cursor) -> tuple:
+    """
+    Índices existentes nas datasheets.
+
+    Returns:
+        tuple: ({tabela: colunas (minúsculas) que iniciam algum índice},
+                {tabela: {coluna: nome do índice}} dos índices do advisor)
+    """
+    cursor.execute(r"""
+        SELECT table_name AS table_name, index_name AS index_name, column_name AS column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+        AND table_name LIKE 'datasheet\_%'
+        AND seq_in_index = 1
+    """)
+    indexed, advisor_indexes = {}, {}
+    for row in cursor.fetchall():
+        indexed.setdefault(row["table_name"], set()).add(row["column_name"].lower())
+        if row["index_name"].startswith(ADVISOR_INDEX_PREFIX):
+            advisor_indexes.setdefault(row["table_name"], {})[row["column_name"]] = row["index_name"]
+    return indexed, advisor_indexes
+
+
+def sample_table(cursor, table_name: str, columns: list, limit: int = INDEX_ADVISOR_SAMPLE_ROWS) -> dict:
+    """Lê as primeiras linhas da tabela e retorna o profile_sample das colunas."""
+    if not columns:
+        return {}
+    columns_str = ", ".join(f"`{col}`" for col in columns)
+    cursor.execute(f"SELECT {columns_str} FROM `{table_name}` LIMIT %s", (limit,))
+    return profile_sample(cursor.fetchall(), columns)
+
+
+def advise_indexes(cursor, apply: bool = True, budget_bytes: int = None) -> dict:
+    """
+    Cria (ou só sugere, com apply=False) índices nas colunas com cara de chave.
+
+    Junta os metadados das datasheets, o histórico de uso das colunas e uma
+    amostra de cada tabela, pontua as colunas (rank_index_candidates) e cria
+    os índices que cabem no orçamento, descontado o tamanho estimado dos
+    índices que o advisor já criou.
+
+    Returns:
+        dict: {"budget_bytes", "used_bytes", "created", "skipped", "seconds"}
+    """
+    start = time.perf_counter()
+    if budget_bytes is None:
+        budget_bytes = int(INDEX_ADVISOR_BUDGET_MB * 1024 * 1024)
+
+    columns = fetch_indexable_columns(cursor)
+    row_counts = {
+        table: count["total_rows"] for table, count in fetch_row_counts(cursor, list(columns)).items()
+    }
+    indexed, advisor_indexes = fetch_index_columns(cursor)
+    usage = fetch_column_usage(cursor)
+    samples = {
+        table: sample_table(cursor, table, [
+            col["name"] for col in table_columns if column_category(col["data_type"]) is not None
+        ])
+        for table, table_columns in columns.items()
+    }
+
+    used_bytes = 0
+    for table, indexes in advisor_indexes.items():
+        for column in columns.get(table, []):
+            if column["name"] in indexes:
+                profile = samples.get(table, {}).get(column["name"], {})
+                used_bytes += estimate_index_bytes(
+                    column["data_type"], column["column_type"], row_counts.get(table, 0), profile.get("avg_bytes", 0.0)
+                )
+
+    candidates = rank_index_candidates(columns, row_counts, samples, usage, indexed)
+    selected, skipped = plan_indexes(candidates, budget_bytes, used_bytes)
+
+    created = []
+    for candidate in selected:
+        if apply:
+            prefix = f"({candidate['prefix']})" if candidate["prefix"] else ""
+            index_start = time.perf_counter()
+            try:
+                cursor.execute(
+                    f"CREATE INDEX `{candidate['index_name']}` ON `{candidate['table']}` "
+                    f"(`{candidate['column']}`{prefix})"
+                )
+            except Exception as e:
+                print(f"Aviso: Erro ao criar índice {candidate['index_name']} em {candidate['table']}: {str(e)}")
+                continue
+            candidate["seconds"] = round(time.perf_counter() - index_start, 3)
+        created.append(candidate)
+
+    return {
+        "applied": apply,
+        "budget_bytes": budget_bytes,
+        "used_bytes": used_bytes + sum(c["estimated_bytes"] for c in created),
+        "created": created,
+        "skipped": skipped,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_index_advisor(apply: bool = True, budget_bytes: int = None):
+    """
+    Executa advise_indexes em uma conexão própria, uma execução por vez.
+
+    Função bloqueante: use com run_db. Retorna None se o advisor já estiver rodando.
+    """
+    if not _advisor_lock.acquire(blocking=False):
+        return None
+    connection = None
+    cursor = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        return advise_indexes(cursor, apply=apply, budget_bytes=budget_bytes)
+    finally:
+        close_db_connection(connection, cursor)
+        _advisor_lock.release()
+
+
+def _spawn(coro):
+    # Mantém referência até o fim (o event loop só guarda referências fracas)
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _advise_in_background(reason: str):
+    try:
+        result = await run_db(run_index_advisor)
+        if result and result["created"]:
+            names = ", ".join(f"{c['table']}.{c['column']}" for c in result["created"])
+            print(f"Advisor de índices ({reason}): criados {len(result['created'])} índice(s): {names}")
+    except Exception as e:
+        print(f"Aviso: Erro no advisor de índices: {str(e)}")
+
+
+def schedule_index_advisor(reason: str = "import") -> bool:
+    """
+    Agenda uma execução do advisor em segundo plano (chamar de dentro do event loop).
+
+    Chamado ao fim dos imports e a cada INDEX_ADVISOR_QUERY_INTERVAL queries.
+    Não agenda se o advisor estiver desligado ou já houver uma execução pendente.
+    """
+    global _advisor_task
+    if not INDEX_ADVISOR_ENABLED or (_advisor_task is not None and not _advisor_task.done()):
+        return False
+    _advisor_task = _spawn(_advise_in_background(reason))
+    return True
+
+
+async def _record_in_background(sql_query: str, columns_by_table: dict):
+    global _queries_since_advice
+    try:
+        usage = await run_db(record_query_usage, sql_query, columns_by_table)
+    except Exception as e:
+        print(f"Aviso: Erro ao registrar uso das colunas: {str(e)}")
+        return
+    if usage:
+        _queries_since_advice += 1
+        if _queries_since_advice >= INDEX_ADVISOR_QUERY_INTERVAL and schedule_index_advisor("queries"):
+            _queries_since_advice = 0
+
+
+def schedule_query_usage(sql_query: str, columns_by_table: dict):
+    """Registra em segundo plano as colunas usadas pela query executada (fora do caminho da resposta)."""
+    if INDEX_ADVISOR_ENABLED:
+        _spawn(_record_in_background(sql_query, columns_by_table))
+
+
+async def shutdown_index_advisor():
+    """Cancela as tarefas pendentes do advisor (usado no shutdown)."""
+    for task in list(_background_tasks):
+        task.cancel()
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
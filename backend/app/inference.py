@@ -0,0 +1,419 @@
+import os
+import re
+from decimal import Decimal, InvalidOperation
+import numpy as np
+import pandas as pd
+
+# Strings tratadas como célula vazia (NULL) no import
+NULL_STRINGS = ("", "nan", "NaN", "NAN")
+
+# Acima desse tamanho (em caracteres) a coluna de texto vira TEXT em vez de VARCHAR(n)
+INFER_VARCHAR_MAX = int(os.getenv("INFER_VARCHAR_MAX", "255"))
+# DECIMAL só é usado até essa escala/precisão; acima disso (ex.: 1/3) fica DOUBLE
+INFER_DECIMAL_MAX_SCALE = int(os.getenv("INFER_DECIMAL_MAX_SCALE", "10"))
+INFER_DECIMAL_MAX_PRECISION = int(os.getenv("INFER_DECIMAL_MAX_PRECISION", "30"))
+
+# Menor tipo inteiro que comporta a faixa de valores
+INT_TYPES = (
+    ("TINYINT", -2 ** 7, 2 ** 7 - 1),
+    ("SMALLINT", -2 ** 15, 2 ** 15 - 1),
+    ("INT", -2 ** 31, 2 ** 31 - 1),
+    ("BIGINT", -2 ** 63, 2 ** 63 - 1),
+)
+
+# Formatos aceitos para datas gravadas como texto (ISO e dd/mm/aaaa)
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%d/%m/%Y",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+)
+DATE_PATTERN = r"^\d{1,4}[-/]\d{1,2}[-/]\d{1,4}([ T]\d{1,2}:\d{2}(:\d{2})?)?$"
+# Códigos com zero à esquerda (CEP, CPF, SKU "007") continuam texto: como número perderiam os zeros
+LEADING_ZERO_PATTERN = r"^[+-]?0\d"
+
+# TEXT guarda até 65.535 bytes (utf8mb4: 4 bytes por caractere)
+TEXT_MAX_CHARS = 65535 // 4
+
+
+class ColumnProfile:
+    """
+    Perfil de uma coluna acumulado chunk a chunk.
+
+    Cada chunk só pode alargar o tipo (ex.: TINYINT -> SMALLINT, número ->
+    texto), então o resultado vale para o arquivo inteiro.
+    """
+
+    def __init__(self):
+        self.non_null = 0
+        self.max_length = 0
+        self.boolean = True
+        self.numeric = True
+        self.integral = True
+        self.exponent = False
+        self.min_value = None
+        self.max_value = None
+        self.scale = 0
+        self.temporal = True
+        self.date_formats = set(DATE_FORMATS)
+        self.native_datetime = False
+        self.has_time = False
+
+    def update(self, series: pd.Series):
+        """Incorpora os valores de um chunk ao perfil (operações vetorizadas)."""
+        values = series[series.notna()]
+        if values.empty:
+            return
+
+        is_string_source = not (
+            pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values)
+        )
+        text = values.astype(str)
+        if is_string_source:
+            text = text.str.strip()
+            keep = ~text.isin(NULL_STRINGS)
+            values, text = values[keep], text[keep]
+            if values.empty:
+                return
+
+        self.non_null += len(values)
+        self.max_length = max(self.max_length, int(text.str.len().max()))
+
+        if self.boolean:
+            self.boolean = bool(pd.api.types.is_bool_dtype(values) or values.map(type).isin([bool, np.bool_]).all())
+        if self.boolean:
+            self.numeric = self.temporal = False
+            return
+
+        if self.numeric:
+            self._update_numeric(values, text, is_string_source)
+        if self.temporal:
+            self._update_temporal(values, text)
+
+    def _update_numeric(self, values, text, is_string_source):
+        if pd.api.types.is_datetime64_any_dtype(values):
+            self.numeric = False
+            return
+        if is_string_source and text.str.match(LEADING_ZERO_PATTERN).any():
+            self.numeric = False
+            return
+        numbers = pd.to_numeric(text if is_string_source else values, errors="coerce")
+        if numbers.isna().any() or not np.isfinite(numbers.astype("float64")).all():
+            self.numeric = False
+            return
+        self.temporal = False
+
+        if self.integral:
+            self.integral = bool((numbers == np.floor(numbers)).all())
+        low, high = numbers.min(), numbers.max()
+        self.min_value = low if self.min_value is None else min(self.min_value, low)
+        self.max_value = high if self.max_value is None else max(self.max_value, high)
+
+        self.exponent = self.exponent or bool(text.str.contains("[eE]").any())
+        fraction = text.str.partition(".")[2]
+        if not is_string_source:
+            # repr de float: "1.0" não tem casa decimal significativa
+            fraction = fraction.str.rstrip("0")
+        self.scale = max(self.scale, int(fraction.str.len().max()))
+
+    def _update_temporal(self, values, text):
+        if pd.api.types.is_datetime64_any_dtype(values):
+            self.native_datetime = True
+            self.has_time = self.has_time or bool((values != values.dt.normalize()).any())
+            return
+        if not self.date_formats or not text.str.match(DATE_PATTERN).all():
+            self.temporal = False
+            return
+        for fmt in sorted(self.date_formats):
+            parsed = pd.to_datetime(text, format=fmt, errors="coerce")
+            if parsed.isna().any():
+                self.date_formats.discard(fmt)
+            else:
+                self.has_time = self.has_time or bool((parsed != parsed.dt.normalize()).any())
+        self.temporal = bool(self.date_formats)
+
+    @property
+    def date_format(self):
+        """Formato usado para converter datas em texto (o primeiro que serve)."""
+        for fmt in DATE_FORMATS:
+            if fmt in self.date_formats:
+                return fmt
+        return None
+
+    @property
+    def kind(self) -> str:
+        """Categoria final: empty, bool, int, decimal, float, date, datetime ou text."""
+        if self.non_null == 0:
+            return "empty"
+        if self.boolean:
+            return "bool"
+        if self.numeric:
+            if self.integral and INT_TYPES[-1][1] <= self.min_value and self.max_value <= INT_TYPES[-1][2]:
+                return "int"
+            if not self.exponent and self.scale <= INFER_DECIMAL_MAX_SCALE and self.precision <= INFER_DECIMAL_MAX_PRECISION:
+                return "decimal"
+            return "float"
+        if self.temporal and (self.native_datetime or self.date_formats):
+            return "datetime" if self.has_time else "date"
+        return "text"
+
+    @property
+    def precision(self) -> int:
+        """Dígitos totais (inteiros + decimais) necessários para o DECIMAL."""
+        largest = max(abs(self.min_value), abs(self.max_value))
+        int_digits = len(str(int(largest))) if largest >= 1 else 1
+        return int_digits + self.scale
+
+    def sql_type(self) -> str:
+        """Tipo SQL mais estreito que comporta todos os valores vistos."""
+        kind = self.kind
+        if kind == "bool":
+            return "BOOLEAN"
+        if kind == "int":
+            for name, low, high in INT_TYPES:
+                if low <= self.min_value and self.max_value <= high:
+                    return name
+        if kind == "decimal":
+            return f"DECIMAL({max(self.precision, 1)},{self.scale})"
+        if kind == "float":
+            return "DOUBLE"
+        if kind == "date":
+            return "DATE"
+        if kind == "datetime":
+            return "DATETIME"
+        if kind == "empty":
+            return f"VARCHAR({INFER_VARCHAR_MAX})"
+        if self.max_length <= INFER_VARCHAR_MAX:
+            return f"VARCHAR({max(self.max_length, 1)})"
+        return "TEXT" if self.max_length <= TEXT_MAX_CHARS else "MEDIUMTEXT"
+
+
+# Dígitos da parte inteira de cada tipo inteiro (para combinar com DECIMAL)
+INT_DIGITS = {"bool": 1, "tinyint": 3, "smallint": 5, "mediumint": 8, "int": 10, "integer": 10, "bigint": 19}
+INT_ORDER = ("bool", "tinyint", "smallint", "mediumint", "int", "integer", "bigint")
+TEXT_ORDER = ("char", "varchar", "tinytext", "text", "mediumtext", "longtext")
+# Caracteres que cabem nos tipos de texto sem tamanho (utf8mb4)
+MEDIUMTEXT_MAX_CHARS = (2 ** 24 - 1) // 4
+TEXT_TYPE_CHARS = {"tinytext": 255 // 4, "text": TEXT_MAX_CHARS, "mediumtext": MEDIUMTEXT_MAX_CHARS, "longtext": (2 ** 32 - 1) // 4}
+# Limites do DECIMAL no MariaDB
+DECIMAL_MAX_PRECISION = 65
+DECIMAL_MAX_SCALE = 30
+# Caracteres que o valor de cada tipo ocupa quando a coluna vira texto
+TEXT_WIDTH = {"date": 10, "datetime": 26, "timestamp": 26, "time": 17, "year": 4, "double": 24, "float": 24}
+
+
+def _parse_sql_type(sql_type: str) -> tuple:
+    """("varchar(20)" | "DECIMAL(10,2)" | "tinyint(1)") -> (nome, tamanho, escala)."""
+    match = re.match(r"\s*(\w+)\s*(?:\((\d+)(?:\s*,\s*(\d+))?\))?", sql_type.lower())
+    name, size, scale = match.group(1), match.group(2), match.group(3)
+    if name == "boolean" or (name == "tinyint" and size == "1"):
+        name = "bool"  # BOOLEAN aparece no DESCRIBE como tinyint(1)
+    return name, int(size) if size else None, int(scale) if scale else 0
+
+
+def _family(name: str) -> str:
+    if name in INT_DIGITS:
+        return "int"
+    if name in ("decimal", "numeric"):
+        return "decimal"
+    if name in ("double", "float", "real"):
+        return "float"
+    if name in ("date", "datetime", "timestamp"):
+        return "date"
+    if name in TEXT_ORDER:
+        return "text"
+    return "other"
+
+
+def _text_width(name: str, size, scale) -> int:
+    family = _family(name)
+    if family == "text":
+        return size if name in ("char", "varchar") else TEXT_TYPE_CHARS[name]
+    if family == "int":
+        return INT_DIGITS[name] + 1  # Sinal
+    if family == "decimal":
+        return (size or 10) + 2  # Sinal e ponto
+    return TEXT_WIDTH.get(name, INFER_VARCHAR_MAX)
+
+
+def _text_type(width: int) -> str:
+    if width <= INFER_VARCHAR_MAX:
+        return f"VARCHAR({max(width, 1)})"
+    if width <= TEXT_MAX_CHARS:
+        return "TEXT"
+    return "MEDIUMTEXT" if width <= MEDIUMTEXT_MAX_CHARS else "LONGTEXT"
+
+
+def widen_sql_type(existing: str, incoming: str):
+    """
+    Tipo que comporta os valores já gravados (existing, como no DESCRIBE) e
+    os do novo arquivo (incoming, de ColumnProfile.sql_type).
+
+    Returns:
+        str | None: Tipo para o ALTER TABLE ... MODIFY COLUMN, ou None se a
+        coluna existente já comporta os novos valores
+    """
+    old_name, old_size, old_scale = _parse_sql_type(existing)
+    new_name, new_size, new_scale = _parse_sql_type(incoming)
+    old_family, new_family = _family(old_name), _family(new_name)
+
+    if old_family == "other" or new_family == "other":
+        return None  # Tipo desconhecido: não mexe
+    if old_family == new_family == "int":
+        if INT_ORDER.index(new_name) <= INT_ORDER.index(old_name):
+            return None
+        return new_name.upper()
+    if old_family in ("int", "decimal") and new_family in ("int", "decimal"):
+        old_digits = INT_DIGITS[old_name] if old_family == "int" else (old_size or 10) - old_scale
+        new_digits = INT_DIGITS[new_name] if new_family == "int" else (new_size or 10) - new_scale
+        scale = max(old_scale, new_scale)
+        digits = max(old_digits, new_digits)
+        if old_family == "decimal" and digits == old_digits and scale == old_scale:
+            return None
+        if digits + scale > DECIMAL_MAX_PRECISION or scale > DECIMAL_MAX_SCALE:
+            return "DOUBLE"
+        return f"DECIMAL({digits + scale},{scale})"
+    if {old_family, new_family} <= {"int", "decimal", "float"}:
+        return None if old_family == "float" else "DOUBLE"
+    if old_family == new_family == "date":
+        if old_name != "date" or new_name == "date":
+            return None
+        return "DATETIME"
+
+    # Texto (ou famílias diferentes, que só convivem como texto): maior largura
+    old_width = _text_width(old_name, old_size, old_scale)
+    new_width = _text_width(new_name, new_size, new_scale)
+    if old_family == "text" and new_width <= old_width:
+        return None
+    return _text_type(max(old_width, new_width))
+
+
+def infer_column_types(chunks) -> list:
+    """
+    Percorre todos os chunks e retorna um ColumnProfile por coluna (na ordem das colunas).
+
+    O primeiro chunk funciona como amostra e os seguintes só alargam os
+    tipos, de modo que valores do fim do arquivo nunca são truncados.
+    """
+    profiles = None
+    for chunk_df in chunks:
+        if profiles is None:
+            profiles = [ColumnProfile() for _ in chunk_df.columns]
+        for profile, (_, series) in zip(profiles, chunk_df.items()):
+            profile.update(series)
+    return profiles or []
+
+
+def normalize_text_nulls(series: pd.Series) -> pd.Series:
+    """
+    Remove espaços das bordas e troca as strings de NULL_STRINGS por NaN.
+
+    Colunas de texto puro usam o acessor .str (vetorizado); só colunas
+    object com tipos misturados caem no map por valor.
+    """
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_object_dtype(series):
+        stripped = series.map(lambda v: v.strip() if isinstance(v, str) else v)
+    else:
+        stripped = series.str.strip()
+    return stripped.mask(stripped.isin(NULL_STRINGS))
+
+
+def _with_nulls(values: np.ndarray, mask: np.ndarray) -> list:
+    """Converte o array em lista de valores Python, com None onde mask é False."""
+    if mask.all():
+        return values.tolist()
+    values = values.astype(object)
+    values[~mask] = None
+    return values.tolist()
+
+
+def _to_decimal(value):
+    """Valor (texto ou número) como Decimal exato; None nos vazios."""
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NA:
+        return None
+    try:
+        return Decimal(value.strip() if isinstance(value, str) else str(value))
+    except InvalidOperation:
+        return None
+
+
+def _to_nullable_number(series: pd.Series, kind: str) -> pd.Series:
+    """
+    Converte para Int64/Float64 (com vazios) pelo cast direto do dtype.
+
+    O cast é bem mais rápido que pd.to_numeric, mas só aceita o formato
+    canônico ("30", "1.5"); valores como "1.0" ou "1e3" (válidos pela
+    inferência) caem no to_numeric.
+    """
+    try:
+        return series.astype("Int64" if kind == "int" else "Float64")
+    except (ValueError, TypeError):
+        # Backend nullable: inteiros com vazios continuam inteiros (Int64)
+        return pd.to_numeric(series, errors="coerce", dtype_backend="numpy_nullable")
+
+
+def coerce_column(series: pd.Series, profile=None) -> list:
+    """
+    Converte uma coluna do chunk para valores Python do tipo inferido, com None nos vazios.
+
+    Números gravados como texto viram números e datas em texto viram
+    date/datetime. Sem perfil, só normaliza os vazios. Cada coluna passa
+    por uma única conversão vetorizada até a lista final.
+    """
+    kind = profile.kind if profile is not None else None
+    series = normalize_text_nulls(series)
+    if kind == "empty":
+        return [None] * len(series)
+
+    if kind in ("int", "decimal", "float"):
+        if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            return series.tolist()  # Sem nulos possíveis: caminho direto
+        if kind == "decimal" and not pd.api.types.is_float_dtype(series):
+            # DECIMAL em texto (ou inteiro além do BIGINT): Decimal exato, sem passar por float64 (~15 dígitos)
+            return [_to_decimal(value) for value in series.tolist()]
+        numbers = _to_nullable_number(series, kind)
+        mask = numbers.notna().to_numpy()
+        if pd.api.types.is_integer_dtype(numbers):
+            # Inteiros grandes (BIGINT) não passam por float64
+            values = numbers.to_numpy(dtype="int64", na_value=0)
+        else:
+            values = numbers.to_numpy(dtype="float64", na_value=0.0)
+            if kind == "int":
+                values = values.round().astype(np.int64)
+        return _with_nulls(values, mask)
+
+    if kind in ("date", "datetime"):
+        if pd.api.types.is_datetime64_any_dtype(series):
+            parsed = series
+        else:
+            parsed = pd.to_datetime(series, format=profile.date_format, errors="coerce")
+        if parsed.dt.tz is not None:
+            parsed = parsed.dt.tz_localize(None)
+        # datetime64 -> date/datetime do Python direto no numpy (NaT vira None)
+        unit = "datetime64[D]" if kind == "date" else "datetime64[us]"
+        return parsed.to_numpy().astype(unit).tolist()
+
+    mask = series.notna().to_numpy()
+    if kind == "text" and not pd.api.types.is_string_dtype(series):
+        # Coluna de texto com números misturados: grava a representação textual
+        series = series.astype(str)
+    return _with_nulls(series.to_numpy(dtype=object), mask)
+
+
+def chunk_to_rows(chunk_df: pd.DataFrame, profiles: list = None) -> list:
+    """
+    Converte o chunk na lista de tuplas do INSERT.
+
+    Cada coluna é convertida uma vez (coerce_column) e as tuplas são
+    montadas por zip, sem passar por um array object do DataFrame inteiro
+    nem por um loop Python por linha.
+    """
+    columns = [
+        coerce_column(series, profiles[position] if profiles else None)
+        for position, (_, series) in enumerate(chunk_df.items())
+    ]
+    return list(zip(*columns))
@@ -0,0 +1,218 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from .cache import LRUCache
+
+# Imports executados ao mesmo tempo; os demais ficam na fila ("queued")
+IMPORT_MAX_CONCURRENT = int(os.getenv("IMPORT_MAX_CONCURRENT", "2"))
+# Quantos jobs (concluídos ou não) ficam consultáveis em /imports/{id}
+IMPORT_JOB_HISTORY = int(os.getenv("IMPORT_JOB_HISTORY", "200"))
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class ImportJob:
+    """
+    Estado de um import em segundo plano.
+
+    Atualizado pela thread do import (via update) e lido pela API e pelos
+    WebSockets de progresso (via snapshot), por isso protegido por lock.
+    """
+
+    def __init__(self, filename: str, owner: str = None, file_size_bytes: int = None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.owner = owner
+        self.file_size_bytes = file_size_bytes
+        self.status = "queued"
+        self.phase = None
+        self.table_name = None
+        self.estimated_rows = None
+        self.rows_profiled = 0
+        self.rows_parsed = 0
+        self.rows_inserted = 0
+        self.sheets = {}  # Progresso por aba no import de várias abas
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._insert_started = None
+        self._finished = None
+        self._lock = threading.Lock()
+        self._listeners = set()
+        self._loop = None
+
+    def update(self, **fields):
+        """Atualiza campos do job (seguro para chamar de qualquer thread) e avisa os ouvintes."""
+        with self._lock:
+            if fields.get("phase") == "inserting" and self._insert_started is None:
+                self._insert_started = time.monotonic()
+            if fields.get("status") in FINISHED_STATUSES:
+                self._finished = time.monotonic()
+            for name, value in fields.items():
+                setattr(self, name, value)
+        self._notify()
+
+    def update_sheet(self, sheet_name: str, **fields):
+        """
+        Atualiza o progresso de uma aba e recalcula os totais do job.
+
+        Usado no import de várias abas, em que cada aba reporta a partir da
+        sua própria thread de INSERT.
+        """
+        with self._lock:
+            sheet = self.sheets.setdefault(sheet_name, {})
+            sheet.update(fields)
+            if fields.get("phase") == "inserting" and self._insert_started is None:
+                self._insert_started = time.monotonic()
+            self.rows_parsed = sum(s.get("rows_parsed", 0) for s in self.sheets.values())
+            self.rows_inserted = sum(s.get("rows_inserted", 0) for s in self.sheets.values())
+            estimates = [s.get("estimated_rows") for s in self.sheets.values()]
+            self.estimated_rows = sum(estimates) if estimates and None not in estimates else None
+        self._notify()
+
+    def _notify(self):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        for event in list(self._listeners):
+            loop.call_soon_threadsafe(event.set)
+
+    def subscribe(self) -> asyncio.Event:
+        """Registra um ouvinte; o evento é setado a cada mudança de estado."""
+        self._loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        event.set()  # Envia o estado atual logo de início
+        self._listeners.add(event)
+        return event
+
+    def unsubscribe(self, event: asyncio.Event):
+        self._listeners.discard(event)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def snapshot(self) -> dict:
+        """Estado atual com taxa (linhas/s) e ETA calculados a partir da fase de inserção."""
+        with self._lock:
+            rows_per_second = None
+            eta_seconds = None
+            if self._insert_started is not None and self.rows_inserted:
+                end = self._finished if self._finished is not None else time.monotonic()
+                elapsed = max(end - self._insert_started, 1e-6)
+                rows_per_second = int(self.rows_inserted / elapsed)
+            if rows_per_second and self.estimated_rows and not self.finished:
+                remaining = max(self.estimated_rows - self.rows_inserted, 0)
+                eta_seconds = round(remaining / rows_per_second, 1)
+            progress = None
+            if self.status == "completed":
+                progress = 1.0
+            elif self.estimated_rows:
+                progress = round(min(self.rows_inserted / self.estimated_rows, 1.0), 3)
+
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "phase": self.phase,
+                "filename": self.filename,
+                "table_name": self.table_name,
+                "file_size_bytes": self.file_size_bytes,
+                "estimated_rows": self.estimated_rows,
+                "rows_profiled": self.rows_profiled,
+                "rows_parsed": self.rows_parsed,
+                "rows_inserted": self.rows_inserted,
+                "sheets": {name: dict(sheet) for name, sheet in self.sheets.items()},
+                "rows_per_second": rows_per_second,
+                "eta_seconds": eta_seconds,
+                "progress": progress,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "result": self.result,
+                "error": self.error,
+            }
+
+    def start(self):
+        self.update(status="running", started_at=time.time())
+
+    def complete(self, result: dict):
+        self.update(status="completed", phase=None, result=result, finished_at=time.time())
+
+    def fail(self, error: str):
+        self.update(status="failed", phase=None, error=error, finished_at=time.time())
+
+
+class ImportJobManager:
+    """
+    Executa imports em segundo plano com concorrência limitada.
+
+    Jobs acima de `max_concurrent` esperam na fila. O histórico é mantido em
+    um LRU limitado para não crescer indefinidamente.
+    """
+
+    def __init__(self, max_concurrent: int = IMPORT_MAX_CONCURRENT, history: int = IMPORT_JOB_HISTORY):
+        self.max_concurrent = max(1, max_concurrent)
+        self._jobs = LRUCache(max_entries=history)
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._tasks = set()
+
+    def create(self, filename: str, owner: str = None, file_size_bytes: int = None) -> ImportJob:
+        job = ImportJob(filename, owner=owner, file_size_bytes=file_size_bytes)
+        self._jobs.set(job.id, job)
+        return job
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def submit(self, job: ImportJob, func, *args, **kwargs) -> asyncio.Task:
+        """
+        Agenda `await func(*args, job=job, **kwargs)` respeitando o limite de concorrência.
+
+        A função recebe o job para reportar progresso e retorna o dict de resultado.
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            # O semáforo pertence ao event loop em que foi criado
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._semaphore_loop = loop
+        job._loop = loop
+        task = asyncio.create_task(self._run(job, func, *args, **kwargs))
+        # Mantém referência até o fim (o event loop só guarda referências fracas)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, job, func, *args, **kwargs):
+        async with self._semaphore:
+            job.start()
+            try:
+                result = await func(*args, job=job, **kwargs)
+            except asyncio.CancelledError:
+                job.fail("Import cancelado")
+                raise
+            except Exception as e:
+                job.fail(str(e))
+            else:
+                job.complete(result)
+
+    async def shutdown(self):
+        """Cancela os imports pendentes (usado no shutdown)."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": len(self._tasks),
+            "jobs_tracked": len(self._jobs),
+        }
+
+
+import_jobs = ImportJobManager()
@@ -0,0 +1,51 @@
+import os
+import threading
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+load_dotenv()
+
+# Cliente assíncrono do modelo: as chamadas (5-20 s cada) não travam o event
+# loop, então um worker atende outras requisições e WebSockets enquanto espera.
+# Um único cliente por processo reaproveita as conexões HTTP (keep-alive).
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))                  # Segundos por chamada (SQL, humanização)
+OPENAI_EXPLAIN_TIMEOUT = float(os.getenv("OPENAI_EXPLAIN_TIMEOUT", "30"))  # Segundos para a explicação do SQL
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "10"))  # Segundos para abrir a conexão
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))              # Novas tentativas em erros transitórios
+# Conexões simultâneas com a API e quantas ficam abertas esperando a próxima chamada
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> AsyncOpenAI:
+    """Cliente assíncrono compartilhado (criado na primeira chamada)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_MAX_CONNECTIONS,
+                        max_keepalive_connections=OPENAI_MAX_KEEPALIVE
+                    )
+                )
+                _client = AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    max_retries=OPENAI_MAX_RETRIES,
+                    http_client=http_client
+                )
+    return _client
+
+
+async def close_llm_client():
+    """Fecha as conexões do cliente (shutdown da aplicação)."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        await client.close()
@@ -1,17 +1,46 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from .controllers import import_excel_to_database, get_tables, generate_answer, get_table_data_paginated, register_user, login_user, get_current_user
+from .controllers import get_tables, generate_answer, get_table_data_paginated, register_user, login_user, get_current_user
 from .utils import sanitize_sql_name
-from .database import get_db_connection, get_db_cursor
+from .controllers.datasheets import UPLOAD_DIR, spool_upload_to_disk, import_file, import_workbook_sheets
+from .workbook import shutdown_parse_executor
+from .columnar import detect_file_format
+from .upsert import IMPORT_MODES
+from .jobs import import_jobs
+from .indexing import run_index_advisor, shutdown_index_advisor
+from .sql_cache import get_sql_cache_stats
+from .result_cache import get_result_cache_stats
+from .prompt_budget import get_prompt_stats
+from .llm import close_llm_client
+from .database import get_db_connection, get_db_cursor, close_db_connection, get_pool_stats, close_pool, run_db, shutdown_db_executor
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
+import asyncio
 import os
 import json
 
+# Intervalo mínimo entre mensagens de progresso no WebSocket de imports (segundos)
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "0.25"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Ciclo de vida da aplicação: cancela imports e libera o executor, o pool de conexões e o cliente do modelo no shutdown"""
+    yield
+    await import_jobs.shutdown()
+    await shutdown_index_advisor()
+    await close_llm_client()
+    shutdown_parse_executor()
+    shutdown_db_executor()
+    close_pool()
+
+
 app = FastAPI(
     title="Interview AI - Datasheet Importer",
     description="API para importação de datasheets XLSX e XLS",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configuração CORS
@@ -23,8 +52,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Diretório para uploads
-UPLOAD_DIR = "uploads"
+# Diretório para uploads (arquivos temporários do import)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Security
@@ -77,7 +105,7 @@ async def register(request: RegisterRequest):
             "username": "username"
         }
     """
-    result = register_user(request.username, request.password)
+    result = await run_db(register_user, request.username, request.password)
     
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -102,7 +130,7 @@ async def login(request: LoginRequest):
             "username": "username"
         }
     """
-    result = login_user(request.username, request.password)
+    result = await run_db(login_user, request.username, request.password)
     
     if not result["success"]:
         raise HTTPException(status_code=401, detail=result["error"])
@@ -120,35 +148,57 @@ async def get_me(current_user: str = Depends(get_current_user_dep)):
     }
 
 
+def check_database_connection():
+    """Testa conexão com o banco (o pool valida com ping no checkout)"""
+    connection = get_db_connection()
+    close_db_connection(connection)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint para Docker"""
     try:
-        # Testa conexão com o banco
-        connection = get_db_connection()
-        connection.close()
+        await run_db(check_database_connection)
         db_status = "connected"
     except Exception as e:
         db_status = f"disconnected: {str(e)}"
     
     return {
         "status": "healthy",
-        "database": db_status
+        "database": db_status,
+        "pool": get_pool_stats(),
+        "imports": import_jobs.stats(),
+        "sql_cache": get_sql_cache_stats(),
+        "result_cache": get_result_cache_stats(),
+        "prompt_tokens": get_prompt_stats()
     }
 
 
-@app.post("/upload/excel")
+@app.post("/upload/excel", status_code=202)
 async def upload_excel(
     file: UploadFile = File(...),
     table_name: str = None,
+    sheets: str = None,
+    mode: str = "append",
+    key: str = None,
     current_user: str = Depends(get_current_user_dep)
 ):
     """
-    Upload e importação de arquivos Excel (XLSX ou XLS) para o banco de dados
+    Upload de arquivos Excel (XLSX ou XLS) e importação em segundo plano
+    
+    O arquivo é gravado em disco e o import roda como job; a resposta traz
+    o job_id para acompanhar o progresso em GET /imports/{job_id} ou no
+    WebSocket /ws/imports/{job_id}.
     
     Args:
         file: Arquivo Excel (.xlsx ou .xls)
-        table_name: Nome da tabela (opcional, usa o nome do arquivo se não fornecido)
+        table_name: Nome da tabela (opcional, usa o nome do arquivo se não fornecido);
+            com várias abas, é o prefixo das tabelas
+        sheets: Abas a importar: "*" para todas ou nomes separados por vírgula
+            (opcional, padrão: só a aba ativa). Cada aba vira datasheet_<nome>_<aba>
+        mode: Se a tabela já existe: "append" (padrão) acrescenta as linhas,
+            "upsert" grava só as novas/alteradas e "replace" recria a tabela
+        key: Coluna que identifica a linha no upsert (opcional, padrão: conteúdo da linha)
     """
     # Validar extensão do arquivo
     if not file.filename.endswith(('.xlsx', '.xls')):
@@ -157,29 +207,132 @@ async def upload_excel(
             detail="Formato de arquivo inválido. Use .xlsx ou .xls"
         )
     
-    try:
-        # Await na função assíncrona e passa o UploadFile completo
-        result = await import_excel_to_database(file, table_name)
-        
-        return {
-            "success": True,
-            "message": f"Tabela '{result['table_name']}' importada com sucesso!",
-            "table_name": result['table_name'],
-            "rows_imported": result.get('rows_imported', 0)
-        }
+    return await start_import_job(file, table_name, sheets, current_user, mode, key)
+
+
+@app.post("/upload/file", status_code=202)
+async def upload_file(
+    file: UploadFile = File(...),
+    table_name: str = None,
+    mode: str = "append",
+    key: str = None,
+    current_user: str = Depends(get_current_user_dep)
+):
+    """
+    Upload e importação em segundo plano de arquivos CSV, TSV ou Parquet (e também Excel)
+    
+    CSV/TSV são lidos pelo parser colunar do pandas (separador e encoding
+    detectados automaticamente) e Parquet pelo pyarrow, em lotes grandes,
+    alimentando o mesmo pipeline de tipos e INSERT do import de Excel.
     
+    Args:
+        file: Arquivo .csv, .tsv, .parquet, .xlsx ou .xls
+        table_name: Nome da tabela (opcional, usa o nome do arquivo se não fornecido)
+        mode: "append" (padrão), "upsert" ou "replace" (ver /upload/excel)
+        key: Coluna que identifica a linha no upsert (opcional)
+    """
+    if detect_file_format(file.filename) is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Formato de arquivo inválido. Use .csv, .tsv, .parquet, .xlsx ou .xls"
+        )
+    
+    return await start_import_job(file, table_name, None, current_user, mode, key)
+
+
+async def start_import_job(file: UploadFile, table_name: str, sheets: str, username: str,
+                           mode: str = "append", key: str = None) -> dict:
+    """Grava o upload em disco e agenda o import como job, retornando o job_id."""
+    if mode not in IMPORT_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Modo de import inválido. Use {', '.join(IMPORT_MODES)}"
+        )
+    if key and mode != "upsert":
+        raise HTTPException(status_code=400, detail="O parâmetro key só vale com mode=upsert")
+    
+    try:
+        # O UploadFile é fechado ao fim da requisição: grava em disco antes de agendar o job
+        spool_path, file_size, file_hash = await spool_upload_to_disk(file)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Erro ao processar arquivo: {str(e)}"
         )
+    
+    job = import_jobs.create(file.filename, owner=username, file_size_bytes=file_size)
+    if sheets:
+        selected = None if sheets.strip() == "*" else [s.strip() for s in sheets.split(",") if s.strip()]
+        import_jobs.submit(
+            job, import_workbook_sheets, spool_path, file.filename, selected, table_name, file_size,
+            mode=mode, key_column=key or None, file_hash=file_hash
+        )
+    else:
+        import_jobs.submit(
+            job, import_file, spool_path, file.filename, table_name, file_size,
+            mode=mode, key_column=key or None, file_hash=file_hash
+        )
+    
+    return {
+        "success": True,
+        "message": f"Import de '{file.filename}' iniciado",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/imports/{job.id}",
+        "progress_ws": f"/ws/imports/{job.id}"
+    }
+
+
+def get_user_import_job(job_id: str, username: str):
+    """Retorna o job de import se existir e pertencer ao usuário."""
+    job = import_jobs.get(job_id)
+    if job is None or job.owner != username:
+        return None
+    return job
+
+
+@app.get("/imports/{job_id}")
+async def get_import_job(job_id: str, current_user: str = Depends(get_current_user_dep)):
+    """
+    Status de um import em segundo plano
+    
+    Retorna status (queued|running|completed|failed), fase, linhas lidas e
+    inseridas, linhas/s, ETA e, ao final, o resultado ou o erro.
+    """
+    job = get_user_import_job(job_id, current_user)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Import '{job_id}' não encontrado")
+    return job.snapshot()
+
+
+@app.post("/indexes/advise")
+async def advise_indexes_endpoint(dry_run: bool = False, current_user: str = Depends(get_current_user_dep)):
+    """
+    Executa o advisor de índices agora
+    
+    O advisor também roda sozinho ao fim de cada import e a cada
+    INDEX_ADVISOR_QUERY_INTERVAL perguntas. Pontua as colunas das datasheets
+    pelo uso em JOIN/WHERE nas queries já feitas, nomes e valores em comum
+    entre tabelas e cardinalidade, e cria os índices que cabem em
+    INDEX_ADVISOR_BUDGET_MB.
+    
+    Args:
+        dry_run: Se true, só retorna os índices que seriam criados
+    """
+    try:
+        result = await run_db(run_index_advisor, apply=not dry_run)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro no advisor de índices: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=409, detail="O advisor de índices já está em execução")
+    return result
 
 
 @app.get("/tables")
 async def list_tables(current_user: str = Depends(get_current_user_dep)):
     """Lista todas as tabelas de datasheets (prefixo datasheet_)"""
     try:
-        datasheet_tables = get_tables()
+        datasheet_tables = await run_db(get_tables)
         
         return {
             "tables": datasheet_tables,
@@ -200,6 +353,8 @@ async def get_table_data(
     search: str = None,
     sort_by: str = None,
     sort_order: str = "asc",
+    cursor: str = None,
+    approximate: bool = False,
     current_user: str = Depends(get_current_user_dep)
 ):
     """
@@ -212,6 +367,8 @@ async def get_table_data(
         search: Termo de busca (busca em todas as colunas de texto)
         sort_by: Nome da coluna para ordenação
         sort_order: Ordem de classificação (asc ou desc)
+        cursor: Cursor opaco (next_cursor/prev_cursor) para navegar sem OFFSET
+        approximate: Total via estatísticas ou contagem limitada ("10000+") em vez de COUNT(*) exato
     
     Returns:
         {
@@ -221,20 +378,29 @@ async def get_table_data(
                 "page": 1,
                 "page_size": 50,
                 "total_records": 1000,
-                "total_pages": 20
+                "total_pages": 20,
+                "total_is_exact": true,
+                "total_records_label": "1000",
+                "mode": "keyset",
+                "has_more": true,
+                "next_cursor": "eyJzIjpudWxs...",
+                "prev_cursor": null
             },
             "columns": ["id", "nome", "valor"]
         }
     """
     
     # Usa o controller para buscar os dados
-    success, result = get_table_data_paginated(
+    success, result = await run_db(
+        get_table_data_paginated,
         table_name=table_name,
         page=page,
         page_size=page_size,
         search=search,
         sort_by=sort_by,
-        sort_order=sort_order
+        sort_order=sort_order,
+        cursor=cursor,
+        approximate=approximate
     )
     
     # Se houve erro, lança HTTPException apropriada
@@ -245,6 +411,7 @@ async def get_table_data(
         # Define status code baseado no tipo de erro
         status_code_map = {
             "validation": 403,   # Forbidden (acesso negado)
+            "invalid_cursor": 400,  # Bad Request
             "not_found": 404,    # Not Found
             "database": 500,     # Internal Server Error
         }
@@ -275,8 +442,11 @@ async def query_multi_table(
             "sql_explanation": "explicação da query",
             "tables_used": ["table1", "table2"],
             "results_count": 10,
+            "truncated": false,
             "humanized_response": "resposta em linguagem natural",
-            "raw_results": [...] (primeiras 100 linhas)
+            "raw_results": [...] (primeiras 100 linhas),
+            "sql_cache": {"hit": true, "llm_seconds": 0.0, "llm_seconds_saved": 4.2},
+            "prompt_tokens": {"explain": 95, "humanize": 1830, "total": 1925, "estimated": false}
         }
     """
     try:        
@@ -306,9 +476,12 @@ async def query_multi_table(
             "sql_explanation": result["sql_explanation"],
             "tables_used": result["tables_used"],
             "results_count": result["results_count"],
+            "truncated": result["truncated"],
             "humanized_response": result["humanized_response"],
             "raw_results": result["raw_results"],
-            "available_tables": result["available_tables"]
+            "available_tables": result["available_tables"],
+            "sql_cache": result["sql_cache"],
+            "prompt_tokens": result["prompt_tokens"]
         }
         
     except HTTPException:
@@ -344,16 +517,23 @@ async def query_multi_websocket(websocket: WebSocket):
     - type: "generating_sql" -> gerando query SQL
     - type: "sql_generated" -> query SQL gerada
     - type: "executing_sql" -> executando query
+    - type: "sql_explained" -> explicação da query (gerada em paralelo com a execução)
     - type: "sql_executed" -> query executada
     - type: "humanizing" -> gerando resposta humanizada
-    - type: "response" -> resposta final
+    - type: "answer_token" -> trecho da resposta humanizada, enviado assim que chega do modelo
+    - type: "response" -> resposta final (com o texto completo em humanized_response)
     - type: "end" -> fim do processamento
     - type: "error" -> erro no processamento
+    
+    Se o cliente desconectar durante o processamento, a pergunta é cancelada
+    (inclusive as chamadas ao modelo em andamento).
     """
     await websocket.accept()
     
     authenticated = False
     current_user = None
+    # Leitura da próxima mensagem; fica pendente durante o processamento para detectar desconexão
+    receive_task = None
     
     try:
         # Envia confirmação de conexão
@@ -364,7 +544,10 @@ async def query_multi_websocket(websocket: WebSocket):
         
         # Loop de perguntas
         while True:
-            data = await websocket.receive_text()
+            if receive_task is None:
+                receive_task = asyncio.create_task(websocket.receive_text())
+            data = await receive_task
+            receive_task = None
             message_data = json.loads(data)
             
             # Verifica autenticação na primeira mensagem ou se token fornecido
@@ -405,8 +588,16 @@ async def query_multi_websocket(websocket: WebSocket):
                     **data
                 })
             
-            # Usa generate_answer com callback de progresso
-            result = await generate_answer(question, progress_callback=progress_callback)
+            # Usa generate_answer com callback de progresso, acompanhando a conexão
+            answer_task = asyncio.create_task(generate_answer(question, progress_callback=progress_callback))
+            receive_task = asyncio.create_task(websocket.receive_text())
+            await asyncio.wait({answer_task, receive_task}, return_when=asyncio.FIRST_COMPLETED)
+            if receive_task.done() and receive_task.exception() is not None:
+                # Cliente desconectou: não adianta continuar gastando chamadas ao modelo
+                answer_task.cancel()
+                raise receive_task.exception()
+            # Uma mensagem que chegue antes da resposta fica para a próxima volta do loop
+            result = await answer_task
             
             # Se houve erro
             if not result["success"]:
@@ -433,8 +624,11 @@ async def query_multi_websocket(websocket: WebSocket):
                 "sql_explanation": result["sql_explanation"],
                 "tables_used": result["tables_used"],
                 "results_count": result["results_count"],
+                "truncated": result["truncated"],
                 "humanized_response": result["humanized_response"],
-                "available_tables": result["available_tables"]
+                "available_tables": result["available_tables"],
+                "sql_cache": result["sql_cache"],
+                "prompt_tokens": result["prompt_tokens"]
             })
             
             # Finaliza
@@ -454,6 +648,74 @@ async def query_multi_websocket(websocket: WebSocket):
         except:
             pass
     finally:
+        if receive_task is not None and not receive_task.done():
+            receive_task.cancel()
+        try:
+            await websocket.close()
+        except:
+            pass
+
+
+@app.websocket("/ws/imports/{job_id}")
+async def import_progress_websocket(websocket: WebSocket, job_id: str):
+    """
+    WebSocket com o progresso de um import em segundo plano
+    
+    Autenticação: envie o token na primeira mensagem como {"token": "jwt_token"}
+    
+    O servidor responde com:
+    - type: "progress" -> estado atual do job (mesmos campos de GET /imports/{job_id})
+    - type: "completed" | "failed" -> estado final, seguido do fechamento da conexão
+    - type: "error" -> token inválido ou job não encontrado
+    """
+    await websocket.accept()
+    event = None
+    job = None
+    
+    try:
+        message_data = json.loads(await websocket.receive_text())
+        username = get_current_user(message_data.get("token", ""))
+        if not username:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Token inválido ou expirado"
+            })
+            return
+        
+        job = get_user_import_job(job_id, username)
+        if job is None:
+            await websocket.send_json({
+                "type": "error",
+                "message": f"Import '{job_id}' não encontrado"
+            })
+            return
+        
+        event = job.subscribe()
+        while True:
+            await event.wait()
+            event.clear()
+            snapshot = job.snapshot()
+            if job.finished:
+                await websocket.send_json({"type": snapshot["status"], **snapshot})
+                return
+            await websocket.send_json({"type": "progress", **snapshot})
+            # Agrupa as atualizações de vários chunks em uma única mensagem
+            await asyncio.sleep(IMPORT_PROGRESS_INTERVAL)
+    
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        try:
+            await websocket.send_json({
+                "type": "error",
+                "error_type": "internal",
+                "message": f"Erro interno: {str(e)}"
+            })
+        except:
+            pass
+    finally:
+        if job is not None and event is not None:
+            job.unsubscribe(event)
         try:
             await websocket.close()
         except:
@@ -0,0 +1,280 @@
+import contextvars
+import math
+import os
+import threading
+from decimal import Decimal
+
+# Orçamento de tokens dos prompts: o contexto das tabelas (prompt do SQL) e os
+# resultados da query (prompt da humanização) são montados dentro de um teto
+# por etapa. Valores longos são cortados, colunas sem informação saem e, se
+# ainda não couber, o restante vira um resumo. O tamanho de cada prompt é
+# informado na resposta e acumulado em /health.
+PROMPT_SCHEMA_MAX_TOKENS = int(os.getenv("PROMPT_SCHEMA_MAX_TOKENS", "6000"))    # Tabelas no prompt do SQL
+PROMPT_RESULTS_MAX_TOKENS = int(os.getenv("PROMPT_RESULTS_MAX_TOKENS", "3000"))  # Resultados na humanização
+PROMPT_CELL_MAX_CHARS = int(os.getenv("PROMPT_CELL_MAX_CHARS", "80"))            # Valores maiores são cortados
+# Linhas de resultado enviadas, no máximo, para a humanização
+PROMPT_RESULTS_MAX_ROWS = 100
+# Fração do orçamento dos resultados que o cabeçalho (nomes das colunas) pode ocupar
+RESULTS_HEADER_SHARE = 0.5
+# Modelo usado para escolher o tokenizer do tiktoken
+PROMPT_TOKENIZER_MODEL = "gpt-4"
+# Tokens extras por mensagem do chat (papel e separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {}  # etapa -> {"calls", "tokens", "max_tokens"}
+
+# Tamanhos dos prompts da pergunta em andamento (ver start_prompt_report)
+_prompt_report = contextvars.ContextVar("prompt_report", default=None)
+
+
+def _get_encoding():
+    """Tokenizer do tiktoken, se o pacote estiver instalado (senão None)."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.encoding_for_model(PROMPT_TOKENIZER_MODEL)
+                except Exception:
+                    # Sem o pacote (ou sem acesso ao arquivo do tokenizer): usa a estimativa
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def tokens_are_estimated() -> bool:
+    """True se a contagem usa a estimativa de 4 caracteres por token."""
+    return _get_encoding() is None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens do texto (tiktoken, ou caracteres / 4 sem ele)."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_value(value, max_chars: int = PROMPT_CELL_MAX_CHARS):
+    """Corta textos longos (e bytes) mantendo o começo; outros valores passam como estão."""
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "…"
+    return value
+
+
+def _format_cell(value) -> str:
+    if value is None:
+        return ""
+    return str(truncate_value(value)).replace("\n", " ").replace("|", "/")
+
+
+def compact_preview(rows: list) -> list:
+    """Linhas do preview com valores cortados e sem as colunas vazias em todas elas."""
+    if not rows:
+        return []
+    columns = [column for column in rows[0] if any(row.get(column) not in (None, "") for row in rows)]
+    return [{column: truncate_value(row.get(column)) for column in columns} for row in rows]
+
+
+def _table_block(table_name: str, info: dict, preview_rows: int) -> str:
+    total_rows = info.get('total_rows', 0)
+    if info.get('total_rows_source') == 'estimate':
+        total_rows = f"~{total_rows} (estimativa)"
+    block = f"""
+Tabela: `{table_name}`
+- Colunas: {', '.join([f'`{col}`' for col in info.get('columns', [])])}
+- Total de linhas: {total_rows}
+"""
+    if preview_rows:
+        block += f"- Preview: {compact_preview(info.get('preview', [])[:preview_rows])}\n"
+    return block + "\n"
+
+
+def describe_tables(tables_info: dict, max_tokens: int = PROMPT_SCHEMA_MAX_TOKENS) -> tuple:
+    """
+    Descrição das tabelas para o prompt do SQL, dentro de max_tokens.
+
+    Reduz o preview (2 linhas, 1, nenhuma) até caber; se nem só as colunas
+    couberem, mantém as primeiras tabelas (as mais relevantes, vindas da
+    seleção por relevância) e informa quantas ficaram de fora.
+
+    Returns:
+        tuple: (texto, {"tokens", "preview_rows", "tables_omitted"})
+    """
+    for preview_rows in (2, 1, 0):
+        blocks = [_table_block(name, info, preview_rows) for name, info in tables_info.items()]
+        text = "".join(blocks)
+        tokens = count_tokens(text)
+        if tokens <= max_tokens:
+            return text, {"tokens": tokens, "preview_rows": preview_rows, "tables_omitted": 0}
+
+    kept = []
+    tokens = 0
+    for block in blocks:
+        block_tokens = count_tokens(block)
+        if kept and tokens + block_tokens > max_tokens:
+            break
+        kept.append(block)
+        tokens += block_tokens
+    omitted = len(blocks) - len(kept)
+    text = "".join(kept) + f"({omitted} tabela(s) omitida(s) por limite de tamanho do prompt)\n"
+    return text, {"tokens": count_tokens(text), "preview_rows": 0, "tables_omitted": omitted}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def numeric_summary(results: list, columns: list) -> list:
+    """Linhas 'coluna: mín, máx, soma, média' das colunas numéricas, sobre todos os resultados."""
+    lines = []
+    for column in columns:
+        values = [row.get(column) for row in results if row.get(column) is not None]
+        if not values or not all(_is_number(value) for value in values):
+            continue
+        total = sum(float(value) for value in values)
+        lines.append(
+            f"{column}: mín={min(values)}, máx={max(values)}, soma={round(total, 4)}, "
+            f"média={round(total / len(values), 4)}"
+        )
+    return lines
+
+
+def _fit_list(label: str, items: list, max_tokens: int) -> str:
+    """Linha "label: a, b, c" com os itens que couberem em max_tokens; os demais viram "… (+N)"."""
+    line = f"{label}: " + ", ".join(items)
+    if count_tokens(line) <= max_tokens:
+        return line
+    kept = []
+    for item in items:
+        remaining = len(items) - len(kept) - 1
+        if count_tokens(f"{label}: " + ", ".join(kept + [item, f"… (+{remaining})"])) > max_tokens:
+            break
+        kept.append(item)
+    return f"{label}: " + ", ".join(kept + [f"… (+{len(items) - len(kept)})"])
+
+
+def summarize_results(results: list, max_tokens: int = PROMPT_RESULTS_MAX_TOKENS,
+                      max_rows: int = PROMPT_RESULTS_MAX_ROWS) -> tuple:
+    """
+    Resultados da query em formato de tabela compacta (coluna | coluna) dentro de max_tokens.
+
+    Colunas sem valor saem; colunas com o mesmo valor em todas as linhas
+    aparecem uma vez só. O cabeçalho ocupa no máximo RESULTS_HEADER_SHARE do
+    orçamento: em resultados largos as últimas colunas saem. Entram as linhas
+    que couberem (até max_rows); as demais viram um resumo das colunas
+    numéricas calculado sobre todas as linhas, cortado no espaço que sobrar.
+
+    Returns:
+        tuple: (texto, {"tokens", "rows_included", "rows_total"})
+    """
+    if not results:
+        return "(nenhuma linha)", {"tokens": count_tokens("(nenhuma linha)"), "rows_included": 0, "rows_total": 0}
+
+    columns = list(results[0].keys())
+    empty = [c for c in columns if all(row.get(c) in (None, "") for row in results)]
+    constant = [
+        c for c in columns
+        if c not in empty and len(results) > 1 and all(row.get(c) == results[0].get(c) for row in results)
+    ]
+    shown = [c for c in columns if c not in empty and c not in constant]
+
+    header_budget = int(max_tokens * RESULTS_HEADER_SHARE)
+    header = []
+    if constant:
+        header.append(_fit_list(
+            "Valor igual em todas as linhas",
+            [f"{c}={_format_cell(results[0].get(c))}" for c in constant], header_budget // 4
+        ))
+    if empty:
+        header.append(_fit_list("Colunas sem valor", empty, header_budget // 4))
+    # Colunas demais: as últimas saem até o cabeçalho caber (com espaço para o aviso)
+    omitted = []
+    while len(shown) > 1 and count_tokens("\n".join(header + [" | ".join(shown)])) > header_budget * 7 // 8:
+        omitted.insert(0, shown.pop())
+    if omitted:
+        header.append(_fit_list("Colunas omitidas por limite de tamanho do prompt", omitted, header_budget // 8))
+    if shown:
+        header.append(" | ".join(shown))
+
+    summary = numeric_summary(results, shown)
+    used = count_tokens("\n".join(header))
+    notice = f"... {len(results)} linha(s) omitida(s). Resumo de todas as linhas:"  # Maior aviso possível
+    notice_tokens = count_tokens(notice) + 1
+    # O resumo usa o que precisa, até metade do espaço que sobra depois do cabeçalho
+    reserved = notice_tokens + min(count_tokens("\n".join(summary)), max(0, max_tokens - used) // 2)
+    lines = list(header)
+    rows_included = 0
+    if shown:
+        for row in results[:max_rows]:
+            line = " | ".join(_format_cell(row.get(c)) for c in shown)
+            line_tokens = count_tokens(line) + 1
+            if used + line_tokens > max_tokens - reserved:
+                break
+            lines.append(line)
+            used += line_tokens
+            rows_included += 1
+    else:
+        rows_included = len(results)  # Todas as linhas são iguais ao cabeçalho
+
+    if rows_included < len(results):
+        lines.append(f"... {len(results) - rows_included} linha(s) omitida(s). Resumo de todas as linhas:")
+        used += notice_tokens
+        for line in summary:
+            line_tokens = count_tokens(line) + 1
+            if used + line_tokens > max_tokens:
+                break
+            lines.append(line)
+            used += line_tokens
+
+    text = "\n".join(lines)
+    return text, {"tokens": count_tokens(text), "rows_included": rows_included, "rows_total": len(results)}
+
+
+def start_prompt_report() -> dict:
+    """Começa a registrar os prompts da pergunta atual; retorna o dict preenchido por record_prompt."""
+    report = {}
+    _prompt_report.set(report)
+    return report
+
+
+def record_prompt(stage: str, messages: list) -> int:
+    """Conta os tokens das mensagens de uma chamada ao modelo e registra na pergunta atual e em /health."""
+    tokens = sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+    report = _prompt_report.get()
+    if report is not None:
+        report[stage] = report.get(stage, 0) + tokens
+    with _stats_lock:
+        stage_stats = _stats.setdefault(stage, {"calls": 0, "tokens": 0, "max_tokens": 0})
+        stage_stats["calls"] += 1
+        stage_stats["tokens"] += tokens
+        stage_stats["max_tokens"] = max(stage_stats["max_tokens"], tokens)
+    return tokens
+
+
+def prompt_report_summary(report: dict) -> dict:
+    """Tokens por etapa da pergunta, total e se a contagem é estimada."""
+    return {**report, "total": sum(report.values()), "estimated": tokens_are_estimated()}
+
+
+def get_prompt_stats() -> dict:
+    """Chamadas, média e máximo de tokens de prompt por etapa, e os tetos configurados."""
+    with _stats_lock:
+        stages = {
+            stage: {**values, "avg_tokens": round(values["tokens"] / values["calls"], 1) if values["calls"] else 0}
+            for stage, values in _stats.items()
+        }
+    return {
+        "stages": stages,
+        "schema_max_tokens": PROMPT_SCHEMA_MAX_TOKENS,
+        "results_max_tokens": PROMPT_RESULTS_MAX_TOKENS,
+        "estimated": tokens_are_estimated(),
+    }
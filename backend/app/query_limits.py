@@ -0,0 +1,105 @@
+import os
+from mysql.connector import Error
+from .indexing import SQL_TOKEN_RE
+
+# Limites das queries geradas pela IA, aplicados pelo servidor e não pelo
+# prompt: tempo máximo de execução no MariaDB, teto de linhas (LIMIT injetado
+# ou reduzido) e leitura em lotes que para no teto, sem fetchall().
+QUERY_MAX_SECONDS = float(os.getenv("QUERY_MAX_SECONDS", "30"))  # 0 desliga o limite de tempo
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "1000"))
+QUERY_FETCH_BATCH = int(os.getenv("QUERY_FETCH_BATCH", "500"))   # Linhas por fetchmany
+
+# ER_STATEMENT_TIMEOUT: query interrompida por max_statement_time
+STATEMENT_TIMEOUT_ERRNO = 1969
+
+
+class QueryTimeoutError(Exception):
+    """A query passou de QUERY_MAX_SECONDS e foi interrompida pelo banco."""
+
+
+def _strip_trailing_semicolons(sql_query: str) -> str:
+    sql_query = sql_query.rstrip()
+    while sql_query.endswith(";"):
+        sql_query = sql_query[:-1].rstrip()
+    return sql_query
+
+
+def cap_limit(sql_query: str, max_rows: int) -> str:
+    """
+    Garante no máximo max_rows linhas no nível mais externo da query.
+
+    Um LIMIT externo maior (LIMIT n, LIMIT off, n ou LIMIT n OFFSET m) é
+    reduzido; sem LIMIT externo, um é acrescentado em nova linha (fora de
+    qualquer comentário de linha). LIMITs dentro de subqueries ou de
+    comentários não contam.
+    """
+    sql_query = _strip_trailing_semicolons(sql_query)
+    depth = 0
+    limit_at = None
+    matches = [match for match in SQL_TOKEN_RE.finditer(sql_query) if match.lastgroup != "comment"]
+    for i, match in enumerate(matches):
+        value = match.group()
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif depth == 0 and match.lastgroup == "word" and value.upper() == "LIMIT":
+            limit_at = i
+
+    if limit_at is None:
+        return f"{sql_query}\nLIMIT {max_rows}"
+
+    # Quantidade de linhas: LIMIT n | LIMIT off, n | LIMIT n OFFSET m
+    args = matches[limit_at + 1:limit_at + 4]
+    count = args[0] if args else None
+    if len(args) >= 3 and args[1].group() == ",":
+        count = args[2]
+    if count is None or not count.group().isdigit():
+        return sql_query  # LIMIT não numérico: o teto fica só na leitura
+    if int(count.group()) <= max_rows:
+        return sql_query
+    return sql_query[:count.start()] + str(max_rows) + sql_query[count.end():]
+
+
+def with_statement_timeout(sql_query: str, max_seconds: float = None) -> str:
+    """Prefixa a query com o limite de tempo do MariaDB (SET STATEMENT max_statement_time=N FOR ...)."""
+    max_seconds = QUERY_MAX_SECONDS if max_seconds is None else max_seconds
+    if max_seconds <= 0:
+        return sql_query
+    return f"SET STATEMENT max_statement_time={max_seconds:g} FOR {sql_query}"
+
+
+def fetch_capped(cursor, max_rows: int, batch_size: int = None) -> list:
+    """Lê as linhas em lotes de fetchmany e para ao chegar em max_rows."""
+    batch_size = QUERY_FETCH_BATCH if batch_size is None else batch_size
+    rows = []
+    while len(rows) < max_rows:
+        batch = cursor.fetchmany(min(batch_size, max_rows - len(rows)))
+        if not batch:
+            break
+        rows.extend(batch)
+    return rows
+
+
+def run_limited_query(cursor, sql_query: str, max_rows: int = None) -> list:
+    """
+    Executa a query com limite de tempo e LIMIT de max_rows + 1 e lê até
+    max_rows + 1 linhas: uma linha além do teto indica que o resultado foi cortado.
+
+    Se a leitura parar antes do fim (LIMIT não pôde ser injetado), a conexão
+    fica com linhas não lidas e o pool a descarta em vez de reaproveitá-la.
+
+    Raises:
+        QueryTimeoutError: A query passou de QUERY_MAX_SECONDS
+    """
+    max_rows = QUERY_MAX_ROWS if max_rows is None else max_rows
+    statement = with_statement_timeout(cap_limit(sql_query, max_rows + 1))
+    try:
+        cursor.execute(statement)
+        return fetch_capped(cursor, max_rows + 1)
+    except Error as e:
+        if getattr(e, "errno", None) == STATEMENT_TIMEOUT_ERRNO:
+            raise QueryTimeoutError(
+                f"A query passou do limite de {QUERY_MAX_SECONDS:g} s de execução e foi interrompida"
+            ) from e
+        raise
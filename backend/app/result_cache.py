@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+import threading
+from .cache import LRUCache
+from .indexing import tokenize_sql
+from .schema import fetch_table_versions
+
+# Cache de resultados das queries geradas pela IA: agregações repetidas
+# ("total de vendas por categoria") não varrem de novo as datasheets. A
+# entrada guarda a versão de cada tabela de que a query depende e deixa de
+# valer assim que alguma delas é reimportada ou removida.
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Memória total dos resultados em cache (os menos usados são despejados)
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512"))
+# Segundos até a entrada expirar mesmo sem mudança nas tabelas
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+# Funções cujo resultado muda a cada execução: queries com elas não entram no cache
+NONDETERMINISTIC_FUNCTIONS = {
+    "NOW", "CURDATE", "CURTIME", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "SYSDATE",
+    "UNIX_TIMESTAMP", "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP", "LOCALTIME", "LOCALTIMESTAMP",
+    "RAND", "UUID", "UUID_SHORT", "CONNECTION_ID",
+}
+# Bytes estimados de cada linha (dict) além dos valores
+ROW_OVERHEAD_BYTES = sys.getsizeof({})
+
+_results = LRUCache(
+    max_entries=RESULT_CACHE_MAX_ENTRIES, ttl=RESULT_CACHE_TTL, max_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024)
+)
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stale": 0, "uncacheable": 0, "too_large": 0}
+
+
+def _quote(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def canonicalize_sql(sql_query: str) -> str:
+    """
+    Forma canônica da query para a chave do cache: sem comentários, palavras-chave
+    e funções em maiúsculas, identificadores sempre entre crases, um espaço entre
+    tokens e sem ';' final. Literais são mantidos como estão.
+    """
+    sql_query = re.sub(r'--.*$', '', sql_query, flags=re.MULTILINE)
+    sql_query = re.sub(r'/\*.*?\*/', '', sql_query, flags=re.DOTALL)
+    parts = []
+    tokens = tokenize_sql(sql_query)
+    for i, (kind, value) in enumerate(tokens):
+        if kind == "name" and i + 1 < len(tokens) and tokens[i + 1] == ("other", "("):
+            parts.append(value.upper())  # Nome de função: não diferencia maiúsculas
+        elif kind == "name":
+            parts.append(_quote(value))
+        elif kind == "column":
+            parts.append(f"{_quote(value[0])}.{_quote(value[1])}")
+        else:
+            parts.append(value)
+    while parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+def referenced_tables(sql_query: str, known_tables: list) -> list:
+    """Datasheets citadas na query (como tabela ou qualificador de coluna)."""
+    known = set(known_tables)
+    found = []
+    for kind, value in tokenize_sql(sql_query):
+        name = value[0] if kind == "column" else value if kind == "name" else None
+        if name in known and name not in found:
+            found.append(name)
+    return found
+
+
+def is_cacheable(sql_query: str) -> bool:
+    """False se a query usa funções de data/hora atual ou aleatórias."""
+    return not any(
+        kind == "name" and value.upper() in NONDETERMINISTIC_FUNCTIONS
+        for kind, value in tokenize_sql(sql_query)
+    )
+
+
+def estimate_rows_bytes(rows: list) -> int:
+    """Memória aproximada de uma lista de linhas (dicts) retornadas pelo cursor."""
+    return sys.getsizeof(rows) + sum(
+        ROW_OVERHEAD_BYTES + sum(sys.getsizeof(value) for value in row.values()) for row in rows
+    )
+
+
+def _count(field: str):
+    with _stats_lock:
+        _stats[field] += 1
+
+
+def lookup_result(cursor, sql_query: str, tables: list) -> tuple:
+    """
+    Busca o resultado em cache da query, validado pela versão atual das tabelas.
+
+    As versões são lidas antes da execução: se um import terminar enquanto a
+    query roda, o resultado fica gravado com a versão antiga e é descartado
+    na próxima consulta.
+
+    Returns:
+        tuple: (linhas ou None, versões atuais para store_result; None se a query não entra no cache)
+    """
+    if not RESULT_CACHE_ENABLED or not tables or not is_cacheable(sql_query):
+        _count("uncacheable")
+        return None, None
+    versions = fetch_table_versions(cursor, tables)
+    key = canonicalize_sql(sql_query)
+    entry = _results.get(key)
+    if entry is not None:
+        if entry["versions"] == versions:
+            _count("hits")
+            return list(entry["rows"]), versions
+        _results.delete(key)
+        _count("stale")
+    _count("misses")
+    return None, versions
+
+
+def store_result(sql_query: str, rows: list, versions: dict) -> bool:
+    """Grava o resultado com as versões lidas em lookup_result (False se não couber no cache)."""
+    stored = _results.set(
+        canonicalize_sql(sql_query), {"rows": list(rows), "versions": versions}, size=estimate_rows_bytes(rows)
+    )
+    if not stored:
+        _count("too_large")
+    return stored
+
+
+def get_result_cache_stats() -> dict:
+    """Acertos, falhas, entradas desatualizadas, memória usada e despejos."""
+    with _stats_lock:
+        stats = dict(_stats)
+    cache_stats = _results.stats()
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": round(stats["hits"] / lookups, 3) if lookups else None,
+        "entries": cache_stats["entries"],
+        "bytes": cache_stats["bytes"],
+        "max_bytes": cache_stats["max_bytes"],
+        "evictions": cache_stats["evictions"],
+        "expirations": cache_stats["expirations"],
+        "ttl_seconds": RESULT_CACHE_TTL,
+    }
+
+
+def clear_result_cache():
+    """Esvazia o cache de resultados."""
+    _results.clear()
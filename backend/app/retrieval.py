@@ -0,0 +1,167 @@
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from .indexing import tokenize_sql
+
+# Seleção das tabelas relevantes para a pergunta: com centenas de datasheets o
+# contexto completo não cabe no prompt de geração do SQL. Um índice BM25 local
+# (nome da tabela, nomes das colunas e valores do preview) escolhe as top-k
+# tabelas; se o SQL gerado citar uma tabela de fora, o conjunto é ampliado.
+TABLE_RETRIEVAL_ENABLED = os.getenv("TABLE_RETRIEVAL_ENABLED", "true").lower() in ("1", "true", "yes")
+# Tabelas enviadas ao modelo (com até esse número de datasheets, vão todas)
+TABLE_RETRIEVAL_TOP_K = int(os.getenv("TABLE_RETRIEVAL_TOP_K", "8"))
+
+# Parâmetros do BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Peso (repetições do termo) de cada parte do documento de uma tabela
+FIELD_WEIGHTS = {"table": 3, "column": 2, "value": 1}
+TABLE_PREFIX = "datasheet_"
+
+# Palavras frequentes em perguntas que não ajudam a escolher tabelas
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "de", "do", "da", "dos", "das", "e", "em", "no", "na", "nos", "nas",
+    "por", "para", "com", "que", "qual", "quais", "quanto", "quantos", "quanta", "quantas", "como", "se",
+    "ao", "aos", "mais", "menos", "entre", "cada", "todo", "todos", "toda", "todas", "foi", "foram", "tem",
+    "temos", "ha", "the", "of", "and", "in", "by", "per",
+}
+
+_index_lock = threading.Lock()
+_index_cache = {"context": None, "index": None}
+
+
+def text_terms(text) -> list:
+    """
+    Termos de busca de um texto: sem acentos, minúsculos, separados em
+    letras/dígitos (inclusive nos '_' de nomes de colunas), sem stopwords e
+    com o plural simples removido ("vendas" -> "venda").
+    """
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def table_document(table_name: str, info: dict) -> Counter:
+    """Termos de uma tabela, com o nome e as colunas valendo mais que os valores do preview."""
+    document = Counter()
+    name = table_name[len(TABLE_PREFIX):] if table_name.startswith(TABLE_PREFIX) else table_name
+    for term in text_terms(name):
+        document[term] += FIELD_WEIGHTS["table"]
+    for column in info.get("columns", []):
+        for term in text_terms(column):
+            document[term] += FIELD_WEIGHTS["column"]
+    for row in info.get("preview", []):
+        for value in row.values():
+            if isinstance(value, str):
+                for term in text_terms(value):
+                    document[term] += FIELD_WEIGHTS["value"]
+    return document
+
+
+class TableIndex:
+    """Índice BM25 em memória sobre os documentos das tabelas do contexto."""
+
+    def __init__(self, tables_info: dict):
+        self.documents = {table: table_document(table, info) for table, info in tables_info.items()}
+        self.lengths = {table: sum(document.values()) for table, document in self.documents.items()}
+        self.average_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 0.0
+        frequencies = Counter()
+        for document in self.documents.values():
+            frequencies.update(document.keys())
+        total = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (total - count + 0.5) / (count + 0.5)) for term, count in frequencies.items()
+        }
+
+    def score(self, table: str, terms: list) -> float:
+        document = self.documents[table]
+        length_norm = 1 - BM25_B + BM25_B * (self.lengths[table] / self.average_length if self.average_length else 0)
+        score = 0.0
+        for term in set(terms):
+            tf = document.get(term, 0)
+            if tf:
+                score += self.idf[term] * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+        return score
+
+    def rank(self, question: str) -> list:
+        """Tabelas da mais para a menos relevante: [(tabela, pontuação)]."""
+        terms = text_terms(question)
+        scores = [(table, self.score(table, terms)) for table in self.documents]
+        return sorted(scores, key=lambda item: (-item[1], item[0]))
+
+
+def get_table_index(database_context: dict) -> TableIndex:
+    """
+    Índice das tabelas do contexto. O contexto vem do cache por versão do
+    schema (get_database_context), então o índice só é refeito quando ele muda.
+    """
+    with _index_lock:
+        if _index_cache["context"] is database_context:
+            return _index_cache["index"]
+    index = TableIndex(database_context.get("tables", {}))
+    with _index_lock:
+        _index_cache["context"] = database_context
+        _index_cache["index"] = index
+    return index
+
+
+def rank_tables(question: str, database_context: dict) -> list:
+    """Nomes das tabelas do contexto, da mais para a menos relevante à pergunta."""
+    return [table for table, _ in get_table_index(database_context).rank(question)]
+
+
+def select_tables(question: str, database_context: dict, top_k: int = None) -> list:
+    """
+    Tabelas enviadas ao modelo: todas, se couberem em top_k (ou a seleção
+    estiver desligada); senão as top_k mais relevantes à pergunta.
+    """
+    top_k = TABLE_RETRIEVAL_TOP_K if top_k is None else top_k
+    tables = list(database_context.get("tables", {}).keys())
+    if not TABLE_RETRIEVAL_ENABLED or len(tables) <= top_k:
+        return tables
+    return rank_tables(question, database_context)[:top_k]
+
+
+def widen_tables(question: str, database_context: dict, selected: list, referenced: list, top_k: int = None) -> list:
+    """
+    Conjunto ampliado após o SQL citar tabelas fora da seleção: as já
+    escolhidas, as citadas que existem e as próximas top_k do ranking.
+    """
+    top_k = TABLE_RETRIEVAL_TOP_K if top_k is None else top_k
+    known = database_context.get("tables", {})
+    widened = list(selected) + [table for table in referenced if table in known and table not in selected]
+    added = 0
+    for table in rank_tables(question, database_context):
+        if added >= top_k:
+            break
+        if table not in widened:
+            widened.append(table)
+            added += 1
+    return widened
+
+
+def unknown_tables(sql_query: str, selected: list) -> list:
+    """Tabelas datasheet_ citadas no SQL que não estavam entre as enviadas ao modelo."""
+    allowed = set(selected)
+    found = []
+    for kind, value in tokenize_sql(sql_query or ""):
+        name = value[0] if kind == "column" else value if kind == "name" else None
+        if name and name.lower().startswith(TABLE_PREFIX) and name not in allowed and name not in found:
+            found.append(name)
+    return found
+
+
+def subset_context(database_context: dict, tables: list) -> dict:
+    """Contexto com apenas as tabelas informadas (na ordem dada)."""
+    tables_info = database_context.get("tables", {})
+    return {**database_context, "tables": {table: tables_info[table] for table in tables if table in tables_info}}
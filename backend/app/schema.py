@@ -0,0 +1,507 @@
+import json
+import os
+import threading
+from .database import get_db_connection, close_db_connection
+from .utils import INTERNAL_COLUMNS
+
+# Tabela de controle de versões do schema (não usa o prefixo datasheet_,
+# portanto nunca é exposta para a IA nem para a listagem de tabelas)
+SCHEMA_VERSIONS_TABLE = "schema_versions"
+
+# Contagem de linhas gravada pelo import (evita COUNT(*) que varre tabelas InnoDB)
+TABLE_STATS_TABLE = "table_stats"
+
+# Último upload importado em cada tabela (hash do arquivo e dos dados), para
+# não reimportar arquivos idênticos
+UPLOAD_REGISTRY_TABLE = "upload_registry"
+
+# Quantas vezes cada coluna apareceu em JOIN/WHERE nas queries geradas (base do
+# advisor de índices, ver app.indexing)
+COLUMN_USAGE_TABLE = "column_usage"
+
+# Cache pergunta -> SQL gerado (ver app.sql_cache), validado pela versão das tabelas usadas
+SQL_CACHE_TABLE = "sql_cache"
+
+# Escopo global: muda sempre que o conjunto/estrutura das datasheets muda
+GLOBAL_SCOPE = "__global__"
+
+# Quantidade de tabelas por query de introspecção em lote
+CONTEXT_BATCH_SIZE = int(os.getenv("SCHEMA_CONTEXT_BATCH_SIZE", "25"))
+
+# Se true, o contexto usa COUNT(*) exato em vez de metadados/estimativas
+SCHEMA_EXACT_ROW_COUNTS = os.getenv("SCHEMA_EXACT_ROW_COUNTS", "false").lower() in ("1", "true", "yes")
+
+_metadata_tables_ready = False
+
+_context_lock = threading.Lock()
+_context_cache = {
+    "version": None,
+    "tables": None,
+    "context": None,
+}
+_context_stats = {"hits": 0, "misses": 0}
+
+
+def ensure_metadata_tables(cursor):
+    """Cria as tabelas de versões e de estatísticas se não existirem (uma vez por processo)."""
+    global _metadata_tables_ready
+    if _metadata_tables_ready:
+        return
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{SCHEMA_VERSIONS_TABLE}` (
+            scope VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{TABLE_STATS_TABLE}` (
+            table_name VARCHAR(64) PRIMARY KEY,
+            row_count BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{UPLOAD_REGISTRY_TABLE}` (
+            table_name VARCHAR(64) PRIMARY KEY,
+            file_hash CHAR(64) NOT NULL,
+            data_hash CHAR(64) NULL,
+            table_version BIGINT NOT NULL,
+            exact BOOLEAN NOT NULL DEFAULT FALSE,
+            filename VARCHAR(255) NULL,
+            sheet_name VARCHAR(255) NULL,
+            result MEDIUMTEXT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX ix_file_hash (file_hash)
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{COLUMN_USAGE_TABLE}` (
+            table_name VARCHAR(64) NOT NULL,
+            column_name VARCHAR(64) NOT NULL,
+            join_count BIGINT NOT NULL DEFAULT 0,
+            filter_count BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, column_name)
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS `{SQL_CACHE_TABLE}` (
+            question_key CHAR(64) PRIMARY KEY,
+            question TEXT NOT NULL,
+            sql_query MEDIUMTEXT NOT NULL,
+            explanation TEXT NULL,
+            tables_used TEXT NOT NULL,
+            table_versions TEXT NOT NULL,
+            llm_seconds DOUBLE NOT NULL DEFAULT 0,
+            hits BIGINT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX ix_last_used (last_used_at)
+        )
+    """)
+    _metadata_tables_ready = True
+
+
+def get_schema_version(cursor, scope: str = GLOBAL_SCOPE) -> int:
+    """Retorna a versão atual de um escopo (0 se nunca foi incrementada)."""
+    ensure_metadata_tables(cursor)
+    cursor.execute(f"SELECT version FROM `{SCHEMA_VERSIONS_TABLE}` WHERE scope = %s", (scope,))
+    row = cursor.fetchone()
+    if not row:
+        return 0
+    return row["version"] if isinstance(row, dict) else row[0]
+
+
+def fetch_table_versions(cursor, tables: list) -> dict:
+    """Versão atual de cada tabela (0 se nunca foi incrementada), em uma única query."""
+    ensure_metadata_tables(cursor)
+    versions = {table: 0 for table in tables}
+    if not versions:
+        return versions
+    placeholders = ", ".join(["%s"] * len(versions))
+    cursor.execute(
+        f"SELECT scope, version FROM `{SCHEMA_VERSIONS_TABLE}` WHERE scope IN ({placeholders})",
+        list(versions)
+    )
+    for row in cursor.fetchall():
+        versions[row["scope"]] = int(row["version"])
+    return versions
+
+
+def bump_schema_version(cursor, tables=None):
+    """
+    Incrementa a versão global e, opcionalmente, a de cada tabela informada.
+
+    Deve ser chamada sempre que o conjunto de tabelas datasheet_ ou seu conteúdo
+    mudar (import, drop). O commit fica a cargo de quem chama.
+
+    Args:
+        cursor: Cursor de uma conexão aberta
+        tables: Lista de nomes de tabelas afetadas (opcional)
+    """
+    ensure_metadata_tables(cursor)
+    scopes = [GLOBAL_SCOPE] + [t for t in (tables or []) if t]
+    for scope in scopes:
+        cursor.execute(
+            f"INSERT INTO `{SCHEMA_VERSIONS_TABLE}` (scope, version) VALUES (%s, 1) "
+            f"ON DUPLICATE KEY UPDATE version = version + 1",
+            (scope,)
+        )
+    # Invalida imediatamente o cache deste processo
+    invalidate_context_cache()
+
+
+def invalidate_context_cache():
+    """Descarta o contexto em cache deste processo."""
+    with _context_lock:
+        _context_cache["version"] = None
+        _context_cache["tables"] = None
+        _context_cache["context"] = None
+
+
+def _quote_identifier(name: str) -> str:
+    """Escapa um identificador para uso entre backticks."""
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def fetch_datasheet_columns(cursor) -> dict:
+    """
+    Busca as colunas de TODAS as tabelas datasheet_ em uma única query.
+
+    Returns:
+        dict: {nome_tabela: [colunas na ordem da tabela]}
+    """
+    cursor.execute(r"""
+        SELECT table_name AS table_name, column_name AS column_name
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name LIKE 'datasheet\_%'
+        ORDER BY table_name, ordinal_position
+    """)
+    tables = {}
+    for row in cursor.fetchall():
+        columns = tables.setdefault(row["table_name"], [])
+        # A chave substituta e o hash de linha não têm significado para a IA
+        if row["column_name"] not in INTERNAL_COLUMNS:
+            columns.append(row["column_name"])
+    return tables
+
+
+def fetch_row_counts(cursor, datasheet_tables: list, exact: bool = False) -> dict:
+    """
+    Retorna o total de linhas de cada tabela.
+
+    Por padrão usa a contagem gravada pelo import (table_stats) e, na falta
+    dela, a estimativa de information_schema.tables, sem varrer as tabelas.
+    Com exact=True faz COUNT(*) em lotes de tabelas via UNION ALL.
+
+    Returns:
+        dict: {nome_tabela: {"total_rows": int, "source": "metadata|estimate|exact"}}
+    """
+    counts = {}
+    if not datasheet_tables:
+        return counts
+
+    if exact:
+        for i in range(0, len(datasheet_tables), CONTEXT_BATCH_SIZE):
+            batch = datasheet_tables[i:i + CONTEXT_BATCH_SIZE]
+            query = " UNION ALL ".join(
+                f"SELECT %s AS table_name, COUNT(*) AS row_count FROM {_quote_identifier(t)}" for t in batch
+            )
+            cursor.execute(query, batch)
+            for row in cursor.fetchall():
+                counts[row["table_name"]] = {"total_rows": int(row["row_count"]), "source": "exact"}
+        return counts
+
+    cursor.execute(rf"""
+        SELECT t.table_name AS table_name, t.table_rows AS estimated_rows, s.row_count AS row_count
+        FROM information_schema.tables t
+        LEFT JOIN `{TABLE_STATS_TABLE}` s ON s.table_name = t.table_name
+        WHERE t.table_schema = DATABASE()
+        AND t.table_name LIKE 'datasheet\_%'
+    """)
+    for row in cursor.fetchall():
+        if row["row_count"] is not None:
+            counts[row["table_name"]] = {"total_rows": int(row["row_count"]), "source": "metadata"}
+        else:
+            counts[row["table_name"]] = {"total_rows": int(row["estimated_rows"] or 0), "source": "estimate"}
+    return counts
+
+
+def fetch_row_count(cursor, table_name: str):
+    """
+    Contagem gravada pelo import (ou estimativa) de uma única tabela, sem varrê-la.
+
+    Returns:
+        dict: {"total_rows": int, "source": "metadata|estimate"} ou None se a tabela não existir
+    """
+    ensure_metadata_tables(cursor)
+    cursor.execute(f"""
+        SELECT t.table_rows AS estimated_rows, s.row_count AS row_count
+        FROM information_schema.tables t
+        LEFT JOIN `{TABLE_STATS_TABLE}` s ON s.table_name = t.table_name
+        WHERE t.table_schema = DATABASE()
+        AND t.table_name = %s
+    """, (table_name,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    if row["row_count"] is not None:
+        return {"total_rows": int(row["row_count"]), "source": "metadata"}
+    return {"total_rows": int(row["estimated_rows"] or 0), "source": "estimate"}
+
+
+def fetch_previews(cursor, columns_by_table: dict, limit: int = 3) -> dict:
+    """
+    Busca as primeiras linhas de várias tabelas em poucas queries.
+
+    Cada linha é serializada com JSON_OBJECT para que tabelas com colunas
+    diferentes caibam no mesmo UNION ALL.
+
+    Returns:
+        dict: {nome_tabela: [linhas como dict]}
+    """
+    previews = {table: [] for table in columns_by_table}
+    tables = [t for t, cols in columns_by_table.items() if cols]
+
+    for i in range(0, len(tables), CONTEXT_BATCH_SIZE):
+        batch = tables[i:i + CONTEXT_BATCH_SIZE]
+        parts = []
+        params = []
+        for table in batch:
+            pairs = ", ".join(f"%s, {_quote_identifier(col)}" for col in columns_by_table[table])
+            parts.append(
+                f"(SELECT %s AS table_name, JSON_OBJECT({pairs}) AS row_json "
+                f"FROM {_quote_identifier(table)} LIMIT {int(limit)})"
+            )
+            params.append(table)
+            params.extend(columns_by_table[table])
+        cursor.execute(" UNION ALL ".join(parts), params)
+        for row in cursor.fetchall():
+            row_json = row["row_json"]
+            if isinstance(row_json, (bytes, bytearray)):
+                row_json = row_json.decode("utf-8")
+            previews[row["table_name"]].append(json.loads(row_json))
+
+    return previews
+
+
+def build_database_context(cursor, datasheet_tables: list = None, exact_counts: bool = False) -> dict:
+    """
+    Monta o contexto (colunas, total de linhas e preview) das tabelas datasheet_.
+
+    Usa introspecção em lote: uma query para todas as colunas, uma para as
+    contagens e uma query de preview a cada CONTEXT_BATCH_SIZE tabelas, em vez
+    de DESCRIBE + COUNT(*) + SELECT por tabela.
+
+    Args:
+        cursor: Cursor (dictionary) de uma conexão aberta
+        datasheet_tables: Restringe o contexto a estas tabelas (opcional)
+        exact_counts: Se True, usa COUNT(*) exato em vez de metadados/estimativas
+    """
+    database_context = {"tables": {}}
+
+    columns_by_table = fetch_datasheet_columns(cursor)
+    if datasheet_tables is not None:
+        wanted = set(datasheet_tables)
+        columns_by_table = {t: cols for t, cols in columns_by_table.items() if t in wanted}
+
+    tables = list(columns_by_table.keys())
+    counts = fetch_row_counts(cursor, tables, exact=exact_counts)
+
+    try:
+        previews = fetch_previews(cursor, columns_by_table)
+    except Exception as e:
+        # Preview é opcional: o contexto continua útil sem ele
+        print(f"Aviso: Erro ao carregar preview das tabelas: {str(e)}")
+        previews = {}
+
+    for table_name, columns in columns_by_table.items():
+        count = counts.get(table_name, {"total_rows": 0, "source": "estimate"})
+        database_context["tables"][table_name] = {
+            "columns": columns,
+            "total_rows": count["total_rows"],
+            "total_rows_source": count["source"],
+            "preview": previews.get(table_name, [])
+        }
+
+    return database_context
+
+
+def set_table_row_count(cursor, table_name: str, row_count: int):
+    """Grava a contagem de linhas de uma tabela (usada no lugar de COUNT(*))."""
+    ensure_metadata_tables(cursor)
+    cursor.execute(
+        f"INSERT INTO `{TABLE_STATS_TABLE}` (table_name, row_count) VALUES (%s, %s) "
+        f"ON DUPLICATE KEY UPDATE row_count = VALUES(row_count)",
+        (table_name, row_count)
+    )
+
+
+def delete_table_row_count(cursor, table_name: str):
+    """Remove a contagem gravada de uma tabela (ex.: tabela temporária descartada)."""
+    ensure_metadata_tables(cursor)
+    cursor.execute(f"DELETE FROM `{TABLE_STATS_TABLE}` WHERE table_name = %s", (table_name,))
+
+
+def add_table_row_count(cursor, table_name: str, rows: int):
+    """
+    Soma linhas inseridas à contagem gravada de uma tabela.
+
+    Deve ser chamada depois dos INSERTs, na mesma transação. Sem contagem
+    gravada (tabela anterior ao table_stats ou contagem removida), somar
+    partiria de zero: a contagem é feita com COUNT(*), que já inclui as
+    linhas novas.
+    """
+    ensure_metadata_tables(cursor)
+    cursor.execute(
+        f"SELECT row_count FROM `{TABLE_STATS_TABLE}` WHERE table_name = %s FOR UPDATE", (table_name,)
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(f"SELECT COUNT(*) AS total FROM {_quote_identifier(table_name)}")
+        set_table_row_count(cursor, table_name, int(cursor.fetchone()["total"]))
+        return
+    cursor.execute(
+        f"INSERT INTO `{TABLE_STATS_TABLE}` (table_name, row_count) VALUES (%s, %s) "
+        f"ON DUPLICATE KEY UPDATE row_count = row_count + VALUES(row_count)",
+        (table_name, rows)
+    )
+
+
+def find_registered_uploads(cursor, file_hash: str = None, table_name: str = None) -> list:
+    """
+    Registros de upload ainda válidos, pelo hash do arquivo ou pela tabela.
+
+    Um registro só vale enquanto a versão da tabela for a gravada no import:
+    qualquer import, drop ou limpeza posterior incrementa a versão e o
+    invalida.
+
+    Returns:
+        list: dicts com table_name, file_hash, data_hash, exact, filename,
+        sheet_name, result (dict) e updated_at
+    """
+    ensure_metadata_tables(cursor)
+    column, value = ("r.file_hash", file_hash) if file_hash is not None else ("r.table_name", table_name)
+    cursor.execute(f"""
+        SELECT r.table_name, r.file_hash, r.data_hash, r.exact, r.filename, r.sheet_name,
+               r.result, r.updated_at, r.table_version, v.version AS current_version
+        FROM `{UPLOAD_REGISTRY_TABLE}` r
+        LEFT JOIN `{SCHEMA_VERSIONS_TABLE}` v ON v.scope = r.table_name
+        WHERE {column} = %s
+    """, (value,))
+    entries = []
+    for row in cursor.fetchall():
+        if row["current_version"] != row["table_version"]:
+            continue
+        row["exact"] = bool(row["exact"])
+        row["result"] = json.loads(row["result"]) if row["result"] else {}
+        entries.append(row)
+    return entries
+
+
+def register_upload(cursor, table_name: str, file_hash: str, data_hash: str = None, exact: bool = False,
+                    filename: str = None, sheet_name: str = None, result: dict = None):
+    """
+    Registra o upload que acabou de ser importado na tabela (substitui o registro anterior).
+
+    Deve ser chamada depois do bump de versão do import; o commit fica a
+    cargo de quem chama.
+
+    Args:
+        exact: True se a tabela tem exatamente o conteúdo do arquivo (criada
+            ou recriada pelo import), False se o arquivo foi acrescentado a dados existentes
+        result: Resumo do import devolvido quando o mesmo arquivo chegar de novo
+    """
+    version = get_schema_version(cursor, table_name)
+    cursor.execute(
+        f"REPLACE INTO `{UPLOAD_REGISTRY_TABLE}` "
+        f"(table_name, file_hash, data_hash, table_version, exact, filename, sheet_name, result) "
+        f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        (table_name, file_hash, data_hash, version, exact, filename, sheet_name,
+         json.dumps(result or {}, default=str))
+    )
+
+
+def add_column_usage(cursor, usage: dict):
+    """
+    Soma usos de colunas ao histórico de queries. O commit fica a cargo de quem chama.
+
+    Args:
+        usage: {(tabela, coluna): {"join": n, "filter": n}}
+    """
+    if not usage:
+        return
+    ensure_metadata_tables(cursor)
+    cursor.executemany(
+        f"INSERT INTO `{COLUMN_USAGE_TABLE}` (table_name, column_name, join_count, filter_count) "
+        f"VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+        f"join_count = join_count + VALUES(join_count), filter_count = filter_count + VALUES(filter_count)",
+        [(table, column, counts.get("join", 0), counts.get("filter", 0)) for (table, column), counts in usage.items()]
+    )
+
+
+def fetch_column_usage(cursor) -> dict:
+    """
+    Histórico de uso das colunas das datasheets em JOIN e WHERE.
+
+    Returns:
+        dict: {(tabela, coluna): {"join": n, "filter": n}}
+    """
+    ensure_metadata_tables(cursor)
+    cursor.execute(f"SELECT table_name, column_name, join_count, filter_count FROM `{COLUMN_USAGE_TABLE}`")
+    return {
+        (row["table_name"], row["column_name"]): {"join": int(row["join_count"]), "filter": int(row["filter_count"])}
+        for row in cursor.fetchall()
+    }
+
+
+def get_database_context(exact_counts: bool = SCHEMA_EXACT_ROW_COUNTS):
+    """
+    Retorna as tabelas datasheet_ e o contexto do banco, usando cache por versão.
+
+    Em cache quente custa apenas a leitura da versão global (nenhuma query de
+    introspecção). Função bloqueante: use com run_db.
+
+    Returns:
+        tuple: (datasheet_tables, database_context, cache_hit)
+    """
+    connection = None
+    cursor = None
+
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+
+        # Lê a versão ANTES de montar o contexto: se um import terminar durante a
+        # montagem, a versão gravada fica desatualizada e a próxima chamada remonta
+        version = get_schema_version(cursor)
+
+        with _context_lock:
+            if _context_cache["version"] == version and _context_cache["context"] is not None:
+                _context_stats["hits"] += 1
+                return list(_context_cache["tables"]), _context_cache["context"], True
+            _context_stats["misses"] += 1
+
+        # FILTRO DE SEGURANÇA: a introspecção só enxerga tabelas com prefixo datasheet_
+        database_context = build_database_context(cursor, exact_counts=exact_counts)
+        datasheet_tables = list(database_context["tables"].keys())
+
+        with _context_lock:
+            _context_cache["version"] = version
+            _context_cache["tables"] = datasheet_tables
+            _context_cache["context"] = database_context
+
+        return list(datasheet_tables), database_context, False
+
+    finally:
+        close_db_connection(connection, cursor)
+
+
+def get_context_cache_stats():
+    """Estatísticas de acerto do cache de contexto."""
+    with _context_lock:
+        return {
+            **_context_stats,
+            "version": _context_cache["version"],
+        }
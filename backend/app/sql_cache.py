@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from .cache import LRUCache
+from .database import get_db_connection, close_db_connection
+from .schema import SQL_CACHE_TABLE, ensure_metadata_tables, fetch_table_versions
+
+# Cache pergunta -> SQL: a mesma pergunta (de um dashboard, por exemplo) não
+# passa de novo pelas chamadas ao modelo que geram a query e a explicação.
+# A entrada guarda a versão de cada tabela usada e deixa de valer quando
+# alguma delas muda (import, drop). Fica em memória (LRU) e na tabela
+# sql_cache, então sobrevive a reinícios.
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Entradas mantidas (em memória e no banco); as menos usadas são descartadas
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "1000"))
+
+_memory = LRUCache(max_entries=SQL_CACHE_SIZE)
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stale": 0, "stored": 0, "llm_seconds_saved": 0.0}
+
+
+def normalize_question(question: str) -> str:
+    """
+    Forma canônica da pergunta: sem acentos, minúscula, espaços colapsados e
+    sem pontuação final ("Total de vendas?" == "total  de vendas").
+    """
+    text = unicodedata.normalize("NFKD", question)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"\s+", " ", text.casefold()).strip()
+    return text.rstrip("?!.;: ")
+
+
+def question_key(question: str) -> str:
+    """Chave do cache: SHA-256 da pergunta normalizada."""
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+def _count(field: str, amount=1):
+    with _stats_lock:
+        _stats[field] += amount
+
+
+def find_cached_sql(cursor, key: str):
+    """
+    Entrada do cache para a chave, se as tabelas usadas não mudaram desde a geração.
+
+    Procura na memória e depois no banco; entradas desatualizadas são
+    removidas. Um acerto atualiza hits/last_used_at (commit a cargo de quem chama).
+
+    Returns:
+        dict: {"query", "explanation", "tables_used", "table_versions", "llm_seconds", "hits"} ou None
+    """
+    entry = _memory.get(key)
+    if entry is None:
+        ensure_metadata_tables(cursor)
+        cursor.execute(
+            f"SELECT sql_query, explanation, tables_used, table_versions, llm_seconds, hits "
+            f"FROM `{SQL_CACHE_TABLE}` WHERE question_key = %s",
+            (key,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            _count("misses")
+            return None
+        entry = {
+            "query": row["sql_query"],
+            "explanation": row["explanation"],
+            "tables_used": json.loads(row["tables_used"]),
+            "table_versions": json.loads(row["table_versions"]),
+            "llm_seconds": float(row["llm_seconds"]),
+            "hits": int(row["hits"]),
+        }
+
+    # Sem tabelas não há versão que invalide a entrada: é tratada como desatualizada
+    if not entry["tables_used"] or fetch_table_versions(cursor, entry["tables_used"]) != entry["table_versions"]:
+        _memory.delete(key)
+        cursor.execute(f"DELETE FROM `{SQL_CACHE_TABLE}` WHERE question_key = %s", (key,))
+        _count("stale")
+        _count("misses")
+        return None
+
+    cursor.execute(
+        f"UPDATE `{SQL_CACHE_TABLE}` SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP "
+        f"WHERE question_key = %s",
+        (key,)
+    )
+    entry = {**entry, "hits": entry["hits"] + 1}
+    _memory.set(key, entry)
+    _count("hits")
+    _count("llm_seconds_saved", entry["llm_seconds"])
+    return entry
+
+
+def save_cached_sql(cursor, key: str, question: str, sql_result: dict, llm_seconds: float) -> dict:
+    """
+    Grava o resultado de generate_sql_query com a versão atual das tabelas usadas.
+
+    Mantém no banco no máximo SQL_CACHE_SIZE entradas, descartando as usadas
+    há mais tempo. O commit fica a cargo de quem chama.
+
+    Returns:
+        dict: Entrada gravada, ou None se o SQL não usa nenhuma tabela conhecida
+    """
+    tables_used = list(sql_result["tables_used"])
+    if not tables_used:
+        return None
+    ensure_metadata_tables(cursor)
+    entry = {
+        "query": sql_result["query"],
+        "explanation": sql_result["explanation"],
+        "tables_used": tables_used,
+        "table_versions": fetch_table_versions(cursor, tables_used),
+        "llm_seconds": round(llm_seconds, 3),
+        "hits": 0,
+    }
+    cursor.execute(
+        f"INSERT INTO `{SQL_CACHE_TABLE}` "
+        f"(question_key, question, sql_query, explanation, tables_used, table_versions, llm_seconds) "
+        f"VALUES (%s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+        f"sql_query = VALUES(sql_query), explanation = VALUES(explanation), tables_used = VALUES(tables_used), "
+        f"table_versions = VALUES(table_versions), llm_seconds = VALUES(llm_seconds), hits = 0, "
+        f"last_used_at = CURRENT_TIMESTAMP",
+        (key, question, entry["query"], entry["explanation"], json.dumps(tables_used),
+         json.dumps(entry["table_versions"]), entry["llm_seconds"])
+    )
+    cursor.execute(f"SELECT COUNT(*) AS entries FROM `{SQL_CACHE_TABLE}`")
+    excess = int(cursor.fetchone()["entries"]) - SQL_CACHE_SIZE
+    if excess > 0:
+        cursor.execute(f"DELETE FROM `{SQL_CACHE_TABLE}` ORDER BY last_used_at LIMIT {excess}")
+    _memory.set(key, entry)
+    _count("stored")
+    return entry
+
+
+def get_cached_sql(question: str):
+    """
+    Busca o SQL já gerado para a pergunta (ver find_cached_sql).
+
+    Função bloqueante: use com run_db. Falhas do cache não impedem a
+    resposta: viram um miss.
+    """
+    if not SQL_CACHE_ENABLED:
+        return None
+    connection = None
+    cursor = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        entry = find_cached_sql(cursor, question_key(question))
+        connection.commit()
+        return entry
+    except Exception as e:
+        print(f"Aviso: Erro ao consultar o cache de SQL: {str(e)}")
+        return None
+    finally:
+        close_db_connection(connection, cursor)
+
+
+def store_cached_sql(question: str, sql_result: dict, llm_seconds: float):
+    """
+    Grava no cache o SQL gerado para a pergunta (ver save_cached_sql).
+
+    Função bloqueante: use com run_db. Erros são apenas registrados no log.
+    """
+    if not SQL_CACHE_ENABLED:
+        return
+    connection = None
+    cursor = None
+    try:
+        connection = get_db_connection()
+        cursor = connection.cursor(dictionary=True)
+        save_cached_sql(cursor, question_key(question), question, sql_result, llm_seconds)
+        connection.commit()
+    except Exception as e:
+        print(f"Aviso: Erro ao gravar o cache de SQL: {str(e)}")
+    finally:
+        close_db_connection(connection, cursor)
+
+
+def get_sql_cache_stats() -> dict:
+    """Acertos, falhas, entradas desatualizadas e tempo de modelo economizado."""
+    with _stats_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "llm_seconds_saved": round(_stats["llm_seconds_saved"], 3),
+            "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else None,
+            "memory_entries": len(_memory),
+            "max_entries": SQL_CACHE_SIZE,
+        }
+
+
+def clear_sql_cache_memory():
+    """Esvazia a parte em memória do cache (o banco continua valendo)."""
+    _memory.clear()
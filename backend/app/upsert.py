@@ -0,0 +1,99 @@
+import datetime
+import decimal
+import hashlib
+
+# Import incremental: compara as linhas do arquivo com as já gravadas e só
+# escreve as novas ou alteradas. Este módulo só calcula hashes e decide o
+# destino de cada linha; o SQL fica em controllers/datasheets.py.
+
+# append: insere tudo; upsert: só linhas novas/alteradas; replace: recria a tabela
+IMPORT_MODES = ("append", "upsert", "replace")
+
+_FIELD_SEPARATOR = "\x1f"
+_NULL_MARK = "\\N"
+
+
+def canonical_value(value) -> str:
+    """
+    Representação textual estável de um valor, igual para o valor vindo do
+    arquivo e o mesmo valor lido de volta do banco.
+
+    Ex.: 1.5 (float do import) e Decimal("1.50") (coluna DECIMAL) dão "1.5";
+    True e 1 (BOOLEAN) dão "1"; DATETIME é comparado até os segundos.
+    """
+    if value is None:
+        return _NULL_MARK
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, decimal.Decimal) and len(value.as_tuple().digits) > 15:
+        # Além da precisão do float: compara o valor exato (sem zeros à direita)
+        exact = value.normalize()
+        return str(int(exact)) if exact == exact.to_integral_value() else format(exact, "f")
+    if isinstance(value, (float, decimal.Decimal)):
+        number = float(value)
+        return str(int(number)) if number.is_integer() else repr(number)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(" ", timespec="seconds")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return str(value)
+
+
+def row_hashes(rows, columns: list) -> list:
+    """
+    Hash MD5 (hex) do conteúdo de cada linha.
+
+    As colunas entram ordenadas pelo nome, então o hash não depende da ordem
+    das colunas no arquivo nem na tabela.
+    """
+    order = sorted(range(len(columns)), key=lambda i: columns[i])
+    names = [columns[i] + "=" for i in order]
+    hashes = []
+    for row in rows:
+        payload = _FIELD_SEPARATOR.join(name + canonical_value(row[i]) for name, i in zip(names, order))
+        hashes.append(hashlib.md5(payload.encode("utf-8")).hexdigest())
+    return hashes
+
+
+def plan_upsert(rows: list, hashes: list, existing: dict, key_position: int = None) -> tuple:
+    """
+    Separa as linhas de um chunk em inserções e atualizações.
+
+    Args:
+        rows: Linhas do chunk (tuplas na ordem das colunas do arquivo)
+        hashes: Hash de cada linha (ver row_hashes)
+        existing: Com chave, {canonical_value(chave): hash gravado}; sem chave,
+            {hash: True} com os hashes já gravados
+        key_position: Posição da coluna chave (None = linha identificada pelo hash)
+
+    Returns:
+        tuple: (inserts, updates, unchanged), inserts/updates como listas de
+        (linha, hash). Linhas repetidas no chunk contam uma vez (vale a última).
+    """
+    latest = {}
+    inserts = []
+    for row, row_hash in zip(rows, hashes):
+        if key_position is None:
+            identity = row_hash
+        else:
+            if row[key_position] is None:
+                inserts.append((row, row_hash))  # Sem chave: sempre linha nova
+                continue
+            identity = canonical_value(row[key_position])
+        latest.pop(identity, None)
+        latest[identity] = (row, row_hash)
+
+    updates = []
+    unchanged = len(rows) - len(latest) - len(inserts)
+    for identity, (row, row_hash) in latest.items():
+        if identity not in existing:
+            inserts.append((row, row_hash))
+        elif key_position is not None and existing[identity] != row_hash:
+            updates.append((row, row_hash))
+        else:
+            unchanged += 1
+    return inserts, updates, unchanged
@@ -1,3 +1,14 @@
+# Chave substituta criada em toda tabela importada (usada na paginação por cursor).
+# Começa com "_" e por isso nunca colide com nomes sanitizados de colunas.
+ROW_ID_COLUMN = "_row_id"
+# Hash do conteúdo da linha, criado nas tabelas importadas com mode=upsert
+ROW_HASH_COLUMN = "_row_hash"
+# Colunas de controle: não aparecem na listagem nem no contexto da IA
+INTERNAL_COLUMNS = (ROW_ID_COLUMN, ROW_HASH_COLUMN)
+# Tamanho do prefixo indexado em colunas TEXT (que não podem ser indexadas inteiras)
+INDEX_PREFIX_CHARS = 255
+
+
 def sanitize_sql_name(name):
     """Sanitize input name for SQL usage by removing special characters."""
     import re
@@ -18,12 +29,14 @@ def get_sql_type(dtype):
     if pd.api.types.is_integer_dtype(dtype):
         return "INT"
     elif pd.api.types.is_float_dtype(dtype):
-        return "FLOAT"
+        # DOUBLE em vez de FLOAT: o valor lido volta idêntico ao gravado,
+        # o que a paginação por cursor exige para comparar posições
+        return "DOUBLE"
     elif pd.api.types.is_datetime64_any_dtype(dtype):
         return "DATETIME"
     elif pd.api.types.is_bool_dtype(dtype):
         return "BOOLEAN"
-    elif pd.api.types.is_object_dtype(dtype):
+    elif pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
         return "VARCHAR(255)"
     else:
-        return "TEXT"
\ No newline at end of file
+        return "TEXT"
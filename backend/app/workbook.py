@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from openpyxl import load_workbook
+import pandas as pd
+from .inference import infer_column_types
+from .dedup import ContentHasher
+
+# Leitura de planilhas. Este módulo não depende do banco nem da API: é
+# importado pelos processos que fazem o parse das abas em paralelo.
+
+# Linhas por DataFrame ao ler a planilha (limita a memória de cada chunk)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+# Processos que fazem o parse das abas em paralelo no import de várias abas
+IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Chunks já lidos que podem esperar pelo INSERT, por aba (limita a memória do pipeline)
+IMPORT_PIPELINE_DEPTH = int(os.getenv("IMPORT_PIPELINE_DEPTH", "4"))
+
+
+def _get_sheet(wb, sheet_name=None):
+    return wb[sheet_name] if sheet_name is not None else wb.active
+
+
+def read_excel_in_chunks(file, batch_size=IMPORT_BATCH_SIZE, sheet_name=None):
+    """
+    Lê um arquivo Excel em chunks de DataFrames.
+
+    Args:
+        file: Caminho do arquivo (ou file-like) aberto em modo read-only pelo openpyxl
+        batch_size: Linhas por chunk
+        sheet_name: Aba a ler (padrão: a aba ativa)
+    """
+    wb = load_workbook(file, read_only=True)
+    try:
+        ws = _get_sheet(wb, sheet_name)
+        rows_iter = ws.iter_rows(values_only=True)
+        headers = list(next(rows_iter, ()))  # primeira linha
+        rows = []
+        for row in rows_iter:
+            rows.append(row)
+            if len(rows) == batch_size:
+                yield pd.DataFrame(rows, columns=headers)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=headers)
+    finally:
+        # Em modo read-only o openpyxl mantém o arquivo aberto até o close
+        wb.close()
+
+
+def estimate_excel_rows(file, sheet_name=None):
+    """
+    Estima o número de linhas de dados da aba (padrão: a ativa) pela dimensão
+    gravada no arquivo, sem ler as células. Retorna None se a dimensão não existir.
+    """
+    wb = load_workbook(file, read_only=True)
+    try:
+        max_row = _get_sheet(wb, sheet_name).max_row
+        return max(0, max_row - 1) if max_row else None
+    finally:
+        wb.close()
+
+
+def list_excel_sheets(file) -> list:
+    """Nomes das abas da planilha, na ordem do arquivo."""
+    wb = load_workbook(file, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def parse_sheet_worker(path: str, sheet_name: str, batch_size: int, queue, skip_hash: str = None):
+    """
+    Faz o parse de uma aba em um processo do pool e envia o resultado pela fila.
+
+    Mensagens, nesta ordem:
+    - ("profiles", (linhas estimadas, tipos inferidos, hash dos dados))
+    - ("chunk", DataFrame) para cada chunk lido
+    - ("done", total de linhas) ou ("error", mensagem)
+
+    Se o hash dos dados (calculado na passada de inferência) for igual a
+    skip_hash, a aba não mudou desde o último import: envia só
+    ("unchanged", hash) e não lê a aba de novo.
+
+    A fila é limitada (IMPORT_PIPELINE_DEPTH), então o parse espera quando
+    os INSERTs ficam para trás.
+    """
+    try:
+        estimated_rows = estimate_excel_rows(path, sheet_name)
+        hasher = ContentHasher()
+        profiles = infer_column_types(hasher.wrap(read_excel_in_chunks(path, batch_size, sheet_name)))
+        data_hash = hasher.hexdigest()
+        if data_hash == skip_hash:
+            queue.put(("unchanged", data_hash))
+            return 0
+        queue.put(("profiles", (estimated_rows, profiles, data_hash)))
+        total = 0
+        for chunk_df in read_excel_in_chunks(path, batch_size, sheet_name):
+            total += len(chunk_df)
+            queue.put(("chunk", chunk_df))
+        queue.put(("done", total))
+        return total
+    except Exception as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+        raise
+
+
+_parse_executor = None
+_insert_executor = None
+_parse_manager = None
+_parse_lock = threading.Lock()
+
+
+def get_parse_executor():
+    """
+    Retorna o pool de processos usado no parse das abas, criando-o na primeira chamada.
+
+    Usa "spawn": os processos não herdam as threads nem as conexões da API.
+    """
+    global _parse_executor
+    if _parse_executor is None:
+        with _parse_lock:
+            if _parse_executor is None:
+                _parse_executor = ProcessPoolExecutor(
+                    max_workers=max(1, IMPORT_PARSE_WORKERS),
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _parse_executor
+
+
+def discard_parse_executor():
+    """Descarta o pool atual (ex.: após um processo morrer); o próximo uso cria outro."""
+    global _parse_executor
+    with _parse_lock:
+        executor, _parse_executor = _parse_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_insert_executor():
+    """
+    Retorna o pool de threads que consome as filas das abas e grava os chunks.
+
+    É separado do executor de banco (ver app.database.run_db): cada consumidor
+    fica bloqueado na fila enquanto o parse não envia o próximo chunk, e não
+    pode ocupar os workers de que as outras requisições precisam. Tem o mesmo
+    tamanho do pool de parse, já que há no máximo uma fila por processo.
+    """
+    global _insert_executor
+    if _insert_executor is None:
+        with _parse_lock:
+            if _insert_executor is None:
+                _insert_executor = ThreadPoolExecutor(
+                    max_workers=max(1, IMPORT_PARSE_WORKERS),
+                    thread_name_prefix="sheet-insert"
+                )
+    return _insert_executor
+
+
+def create_pipeline_queue(maxsize: int = IMPORT_PIPELINE_DEPTH):
+    """Fila limitada que pode ser enviada aos processos do pool."""
+    global _parse_manager
+    if _parse_manager is None:
+        with _parse_lock:
+            if _parse_manager is None:
+                _parse_manager = multiprocessing.get_context("spawn").Manager()
+    return _parse_manager.Queue(maxsize=maxsize)
+
+
+def shutdown_parse_executor():
+    """Encerra o pool de processos, as threads de INSERT e o gerenciador das filas (usado no shutdown)."""
+    global _parse_executor, _insert_executor, _parse_manager
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=True, cancel_futures=True)
+        _parse_executor = None
+    if _insert_executor is not None:
+        _insert_executor.shutdown(wait=True)
+        _insert_executor = None
+    if _parse_manager is not None:
+        _parse_manager.shutdown()
+        _parse_manager = None
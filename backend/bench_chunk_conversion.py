@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark da conversão chunk -> linhas do INSERT no import
+
+Compara o caminho antigo (replace/where ou coerce_chunk no DataFrame
+inteiro, tuplas a partir de df.values e INSERT remontado a cada chunk)
+com o atual (chunk_to_rows, coluna a coluna) e mostra o tempo de CPU
+por chunk, com e sem os tipos inferidos.
+
+Uso: python bench_chunk_conversion.py [linhas_por_chunk] [repetições]
+"""
+import sys
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# Adiciona o diretório app ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.inference import infer_column_types, chunk_to_rows, NULL_STRINGS
+from app.utils import sanitize_sql_name
+
+
+def build_chunk(rows: int) -> pd.DataFrame:
+    """Chunk com a cara de uma planilha real: texto, números em texto, datas e vazios"""
+    rng = np.random.default_rng(42)
+    ids = np.arange(rows)
+    df = pd.DataFrame({
+        "id": ids,
+        "codigo": [str(v) for v in rng.integers(0, 10 ** 6, rows)],
+        "valor": np.round(rng.random(rows) * 1000, 2),
+        "data": [f"{d:02d}/{m:02d}/2024" for d, m in zip(rng.integers(1, 29, rows), rng.integers(1, 13, rows))],
+        "nome": [f"cliente {v}" for v in ids],
+        "cidade": rng.choice(["São Paulo", "Recife", "Curitiba", "nan", ""], rows),
+        "ativo": rng.choice([True, False], rows),
+    })
+    df.loc[ids % 7 == 0, "valor"] = np.nan
+    df.loc[ids % 11 == 0, "codigo"] = None
+    return df
+
+
+def legacy_coerce_chunk(chunk_df: pd.DataFrame, profiles: list) -> pd.DataFrame:
+    """coerce_chunk anterior: cada coluna vira Series object e o DataFrame é remontado"""
+    converted = {}
+    for position, (name, series) in enumerate(chunk_df.items()):
+        kind = profiles[position].kind
+        if not (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)):
+            stripped = series.astype(object).where(series.notna()).map(
+                lambda v: v.strip() if isinstance(v, str) else v
+            )
+            series = stripped.where(~stripped.isin(NULL_STRINGS))
+        mask = series.notna()
+        if kind in ("int", "decimal", "float"):
+            numbers = pd.to_numeric(series, errors="coerce")
+            if kind == "int":
+                numbers = numbers.round().astype("Int64")
+            values = numbers.astype(object)
+        elif kind in ("date", "datetime"):
+            parsed = pd.to_datetime(series, format=profiles[position].date_format, errors="coerce")
+            values = pd.Series(
+                list(parsed.dt.date) if kind == "date" else list(parsed.dt.to_pydatetime()),
+                index=series.index, dtype=object
+            )
+        elif kind == "text":
+            values = series.astype(object).map(str, na_action="ignore")
+        else:
+            values = series.astype(object)
+        values = values.astype(object)
+        converted[name] = values.where(mask & values.notna(), None)
+    return pd.DataFrame(converted, index=chunk_df.index)
+
+
+def legacy_convert(chunk_df: pd.DataFrame, table_name: str, profiles: list = None):
+    """Conversão como era feita antes: nomes e INSERT a cada chunk, tuplas de df.values"""
+    new_columns = []
+    for i, col in enumerate(chunk_df.columns):
+        if pd.isna(col) or str(col).strip() == '' or str(col).lower() == 'nan':
+            new_columns.append(f'column_{i}')
+        else:
+            new_columns.append(str(col))
+    chunk_df.columns = new_columns
+    if profiles:
+        chunk_df = legacy_coerce_chunk(chunk_df, profiles)
+    else:
+        chunk_df = chunk_df.replace({pd.NA: None, pd.NaT: None, np.nan: None, 'nan': None, 'NaN': None, 'NAN': None})
+        chunk_df = chunk_df.where(pd.notnull(chunk_df), None)
+    sanitized_columns = [sanitize_sql_name(col) for col in chunk_df.columns]
+    placeholders = ", ".join(["%s"] * len(sanitized_columns))
+    columns_str = ", ".join([f"`{col}`" for col in sanitized_columns])
+    insert_query = f"INSERT INTO `{table_name}` ({columns_str}) VALUES ({placeholders})"
+    return insert_query, [tuple(row) for row in chunk_df.values]
+
+
+def cpu_per_chunk(func, repeat: int) -> float:
+    """Tempo de CPU médio por chamada, em milissegundos"""
+    func()  # aquecimento
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - start) / repeat * 1000
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    chunk = build_chunk(rows)
+    profiles = infer_column_types([chunk])
+
+    # O INSERT agora é montado uma vez por import, fora da medição
+    results = {
+        "sem perfis, antes": cpu_per_chunk(lambda: legacy_convert(chunk.copy(), "datasheet_bench"), repeat),
+        "sem perfis, agora": cpu_per_chunk(lambda: chunk_to_rows(chunk), repeat),
+        "tipos inferidos, antes": cpu_per_chunk(lambda: legacy_convert(chunk.copy(), "datasheet_bench", profiles), repeat),
+        "tipos inferidos, agora": cpu_per_chunk(lambda: chunk_to_rows(chunk, profiles), repeat),
+    }
+
+    print(f"Chunk de {rows} linhas x {len(chunk.columns)} colunas, {repeat} repetições")
+    for label, ms in results.items():
+        print(f"  {label:<24} {ms:8.2f} ms de CPU por chunk")
+
+
+if __name__ == "__main__":
+    main()
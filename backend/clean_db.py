@@ -9,6 +9,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.database import get_db_connection, get_db_cursor
+from app.schema import bump_schema_version
 
 def clean_datasheet_tables():
     """Remove todas as tabelas com prefixo datasheet_"""
@@ -46,6 +47,8 @@ def clean_datasheet_tables():
             print(f"✓ Removida: {table_name}")
             dropped += 1
         
+        # Invalida o contexto de schema em cache na API
+        bump_schema_version(cursor, [list(table.values())[0] for table in tables])
         connection.commit()
         print(f"\n✓ {dropped} tabela(s) removida(s) com sucesso!")
         
@@ -8,6 +8,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.database import get_db_connection, get_db_cursor
+from app.schema import bump_schema_version
 
 def clean_all_datasheets():
     connection = None
@@ -30,6 +31,8 @@ def clean_all_datasheets():
             cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`")
             print(f"✓ Removida: {table_name}")
         
+        # Invalida o contexto de schema em cache na API
+        bump_schema_version(cursor, [list(table.values())[0] for table in tables])
         connection.commit()
         print(f"\n✓ Total: {len(tables)} tabela(s) removida(s)")
         
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Script para criar o índice FULLTEXT de busca nas tabelas de datasheets
+importadas antes da busca indexada
+"""
+import sys
+import os
+
+# Adiciona o diretório app ao path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import get_db_connection, get_db_cursor
+from app.controllers.datasheets import ensure_fulltext_index
+
+def create_search_indexes():
+    """Cria o índice de busca em todas as tabelas com prefixo datasheet_"""
+    connection = None
+    cursor = None
+    
+    try:
+        connection = get_db_connection()
+        cursor = get_db_cursor(connection)
+        
+        cursor.execute("SHOW TABLES LIKE 'datasheet_%'")
+        tables = [list(table.values())[0] for table in cursor.fetchall()]
+        
+        if not tables:
+            print("✓ Nenhuma tabela de datasheet encontrada")
+            return
+        
+        for table_name in tables:
+            result = ensure_fulltext_index(cursor, table_name)
+            if result["created"]:
+                print(f"✓ {table_name}: índice criado em {len(result['columns'])} coluna(s) ({result['seconds']}s)")
+            elif result["columns"]:
+                print(f"  {table_name}: índice já existe")
+            else:
+                print(f"  {table_name}: sem colunas de texto")
+        
+    except Exception as e:
+        print(f"✗ Erro ao criar índices: {e}")
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+if __name__ == "__main__":
+    create_search_indexes()
@@ -17,3 +17,42 @@ USE interview_ai;
 --     level VARCHAR(20),
 --     message TEXT
 -- );
+
+-- Versões do schema das datasheets (invalida caches da API após imports/drops)
+CREATE TABLE IF NOT EXISTS schema_versions (
+    scope VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Contagem de linhas das datasheets mantida pelo import (evita COUNT(*))
+CREATE TABLE IF NOT EXISTS table_stats (
+    table_name VARCHAR(64) PRIMARY KEY,
+    row_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Uso das colunas em JOIN/WHERE pelas queries geradas (advisor de índices)
+CREATE TABLE IF NOT EXISTS column_usage (
+    table_name VARCHAR(64) NOT NULL,
+    column_name VARCHAR(64) NOT NULL,
+    join_count BIGINT NOT NULL DEFAULT 0,
+    filter_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (table_name, column_name)
+);
+
+-- Cache pergunta -> SQL gerado pela IA (validado pela versão das tabelas usadas)
+CREATE TABLE IF NOT EXISTS sql_cache (
+    question_key CHAR(64) PRIMARY KEY,
+    question TEXT NOT NULL,
+    sql_query MEDIUMTEXT NOT NULL,
+    explanation TEXT NULL,
+    tables_used TEXT NOT NULL,
+    table_versions TEXT NOT NULL,
+    llm_seconds DOUBLE NOT NULL DEFAULT 0,
+    hits BIGINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_last_used (last_used_at)
+);
@@ -0,0 +1,40 @@
+import pytest
+from app import indexing
+from app.controllers import datasheets
+
+
+@pytest.fixture(autouse=True)
+def disable_index_advisor(monkeypatch):
+    """O advisor de índices roda em segundo plano contra o banco real: desligado nos testes"""
+    monkeypatch.setattr(indexing, "INDEX_ADVISOR_ENABLED", False)
+
+
+class FakeUploadRegistry:
+    """Registro de uploads em memória no lugar da tabela upload_registry"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def find_duplicate_upload(self, file_hash, table_name, mode="append", sheet_name=None):
+        entry = self.entries.get(table_name)
+        if entry and entry["file_hash"] == file_hash and entry["sheet_name"] == sheet_name:
+            return entry, False
+        return None, False
+
+    def find_previous_uploads(self, table_names, mode="append"):
+        return {name: self.entries[name] for name in table_names if name in self.entries}
+
+    def record_upload(self, table_name, file_hash, data_hash, exact, filename, sheet_name=None, result=None):
+        self.entries[table_name] = {
+            "table_name": table_name, "file_hash": file_hash, "data_hash": data_hash, "exact": exact,
+            "filename": filename, "sheet_name": sheet_name, "result": result or {}, "updated_at": "agora",
+        }
+
+
+@pytest.fixture
+def upload_registry(monkeypatch):
+    registry = FakeUploadRegistry()
+    monkeypatch.setattr(datasheets, "find_duplicate_upload", registry.find_duplicate_upload)
+    monkeypatch.setattr(datasheets, "find_previous_uploads", registry.find_previous_uploads)
+    monkeypatch.setattr(datasheets, "record_upload", registry.record_upload)
+    return registry
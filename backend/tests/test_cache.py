@@ -0,0 +1,49 @@
+import time
+from app.cache import LRUCache
+
+
+class TestLRUCache:
+    """Testes para o cache LRU em memória"""
+
+    def test_evicts_least_recently_used(self):
+        """Ao passar do limite, despeja a entrada usada há mais tempo"""
+        cache = LRUCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1  # "a" passa a ser a mais recente
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiration(self):
+        """Entradas expiram após o TTL"""
+        cache = LRUCache(max_entries=10, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a", "vazio") == "vazio"
+        assert cache.stats()["expirations"] == 1
+
+    def test_hit_rate(self):
+        """Estatísticas contam acertos e falhas"""
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+    def test_memory_cap(self):
+        """Entradas são despejadas pelo total de bytes; uma entrada maior que o limite não entra"""
+        cache = LRUCache(max_entries=10, max_bytes=100)
+        cache.set("a", 1, size=60)
+        cache.set("b", 2, size=30)
+        cache.set("c", 3, size=30)
+        assert cache.get("a") is None
+        assert cache.stats()["bytes"] == 60
+        assert cache.set("d", 4, size=101) is False
+        assert cache.get("d") is None
+        cache.set("b", 5, size=10)  # Regravar atualiza o tamanho
+        assert cache.stats()["bytes"] == 40
@@ -0,0 +1,143 @@
+import asyncio
+import pandas as pd
+import pytest
+from app.columnar import (
+    detect_file_format, read_csv_in_chunks, read_columnar_in_chunks, estimate_columnar_rows
+)
+from app.controllers import datasheets
+from app.inference import infer_column_types, chunk_to_rows
+
+
+class TestDetectFileFormat:
+    def test_formats_by_extension(self):
+        assert detect_file_format("vendas.CSV") == "csv"
+        assert detect_file_format("vendas.tsv") == "tsv"
+        assert detect_file_format("vendas.parquet") == "parquet"
+        assert detect_file_format("vendas.xlsx") == "excel"
+        assert detect_file_format("vendas.json") is None
+
+
+class TestReadCsvInChunks:
+    """Testes para a leitura de CSV/TSV em lotes"""
+
+    def test_semicolon_latin1_export(self, tmp_path):
+        """CSV exportado pelo Excel em pt-BR: separador ";" e Latin-1"""
+        path = tmp_path / "vendas.csv"
+        path.write_bytes("código;descrição\n007;ação\n8;pão\n".encode("latin-1"))
+        chunks = list(read_csv_in_chunks(str(path), batch_size=1))
+        assert [len(c) for c in chunks] == [1, 1]
+        assert list(chunks[0].columns) == ["código", "descrição"]
+        # Tudo lido como texto: os zeros à esquerda não se perdem no parse
+        assert chunks[0].iloc[0].tolist() == ["007", "ação"]
+
+    def test_latin1_after_the_sample_is_detected(self, tmp_path):
+        """Acento em Latin-1 só depois dos primeiros 64 KB não vira '�'"""
+        path = tmp_path / "vendas.csv"
+        rows = "".join(f"{i};item\n" for i in range(20000))
+        path.write_bytes(f"id;nome\n{rows}20000;pão\n".encode("latin-1"))
+        assert path.stat().st_size > 64 * 1024
+        df = pd.concat(read_csv_in_chunks(str(path), batch_size=5000))
+        assert len(df) == 20001
+        assert df.iloc[-1].tolist() == ["20000", "pão"]
+
+    def test_invalid_utf8_with_bom_fails(self, tmp_path):
+        path = tmp_path / "vendas.csv"
+        path.write_bytes(b"\xef\xbb\xbfid;nome\n1;" + "pão".encode("latin-1") + b"\n")
+        with pytest.raises(ValueError, match="Encoding do CSV"):
+            list(read_csv_in_chunks(str(path)))
+
+    def test_tsv(self, tmp_path):
+        path = tmp_path / "vendas.tsv"
+        path.write_text("a\tb\n1\tx, y\n", encoding="utf-8")
+        df = next(read_columnar_in_chunks(str(path), "tsv"))
+        assert df.iloc[0].tolist() == ["1", "x, y"]
+
+    def test_estimate_rows_small_file(self, tmp_path):
+        path = tmp_path / "vendas.csv"
+        path.write_text("a,b\n1,2\n3,4\n", encoding="utf-8")
+        assert estimate_columnar_rows(str(path), "csv") == 2
+
+
+class TestReadParquetInChunks:
+    def test_batches_keep_types(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        path = tmp_path / "vendas.parquet"
+        pd.DataFrame({"id": range(5), "valor": [1.5] * 5}).to_parquet(path)
+        chunks = list(read_columnar_in_chunks(str(path), "parquet", batch_size=2))
+        assert [len(c) for c in chunks] == [2, 2, 1]
+        assert str(chunks[0]["id"].dtype) == "int64"
+        assert estimate_columnar_rows(str(path), "parquet") == 5
+
+    def test_nullable_big_integers_keep_every_digit(self, tmp_path):
+        """Inteiro com nulo na coluna não passa por float64"""
+        pa = pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+        path = tmp_path / "ids.parquet"
+        pq.write_table(pa.table({"id": pa.array([2**62 + 1, None, 5], pa.int64())}), path)
+        df = next(read_columnar_in_chunks(str(path), "parquet"))
+        profiles = infer_column_types([df])
+        assert profiles[0].sql_type() == "BIGINT"
+        assert chunk_to_rows(df, profiles) == [(2**62 + 1,), (None,), (5,)]
+
+    def test_binary_columns(self, tmp_path):
+        """Binário com texto UTF-8 vira texto; binário de verdade falha com o nome da coluna"""
+        pa = pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+        path = tmp_path / "arquivos.parquet"
+        pq.write_table(pa.table({"nome": pa.array(["ação".encode(), None], pa.binary())}), path)
+        df = next(read_columnar_in_chunks(str(path), "parquet"))
+        assert [p.sql_type() for p in infer_column_types([df])] == ["VARCHAR(4)"]
+        assert df["nome"].tolist() == ["ação", None]
+
+        pq.write_table(pa.table({"foto": pa.array([b"\xff\xd8\xff\xe0", None], pa.binary())}), path)
+        with pytest.raises(ValueError, match="Coluna 'foto'"):
+            list(read_columnar_in_chunks(str(path), "parquet"))
+
+
+class TestImportFile:
+    """O import de CSV usa o mesmo pipeline de tipos e INSERT do Excel"""
+
+    @pytest.fixture
+    def captured(self, monkeypatch, upload_registry):
+        captured = {"imports": 0}
+
+        def fake_import(chunks, table_name, estimated_rows=None, column_profiles=None, progress=None,
+                        mode="append", key_column=None):
+            captured["imports"] += 1
+            captured["rows"] = sum(len(c) for c in chunks)
+            captured["types"] = [p.sql_type() for p in column_profiles]
+            return {
+                "table_name": f"datasheet_{table_name}", "rows_imported": captured["rows"],
+                "peak_chunk_bytes": 0, "insert_modes": {}, "search_index": None, "column_types": {},
+                "mode": mode, "table_created": True, "added_columns": [], "widened_columns": {}, "upsert": None
+            }
+
+        monkeypatch.setattr(datasheets, "import_chunks_to_database", fake_import)
+        return captured
+
+    def test_csv_feeds_import_pipeline(self, tmp_path, captured):
+        path = tmp_path / "upload.csv"
+        path.write_text("id;valor;data\n1;10.50;2024-01-02\n2;3.25;2024-02-03\n", encoding="utf-8")
+
+        result = asyncio.run(datasheets.import_file(str(path), "Vendas 2024.csv"))
+        assert result["file_format"] == "csv"
+        assert result["table_name"] == "datasheet_vendas 2024"
+        assert captured == {"imports": 1, "rows": 2, "types": ["TINYINT", "DECIMAL(4,2)", "DATE"]}
+        assert not path.exists()
+
+    def test_repeated_upload_is_not_reimported(self, tmp_path, captured):
+        """Arquivo idêntico retorna sem ser lido; outro arquivo com os mesmos dados pula os INSERTs"""
+        content = "id;nome\n1;ana\n2;bo\n"
+        for name, text in [("a.csv", content), ("b.csv", content), ("c.csv", content.replace("\n", "\r\n"))]:
+            path = tmp_path / name
+            path.write_text(text, encoding="utf-8", newline="")
+            result = asyncio.run(datasheets.import_file(str(path), name, table_name="clientes"))
+            assert not path.exists()
+            if name == "a.csv":
+                assert "deduplicated" not in result
+            elif name == "b.csv":
+                assert result["deduplicated"]["reason"] == "file"
+                assert result["table_name"] == "datasheet_clientes"
+            else:
+                assert result["deduplicated"]["reason"] == "data"
+        assert captured["imports"] == 1
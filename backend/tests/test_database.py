@@ -0,0 +1,141 @@
+import asyncio
+import pytest
+import threading
+from mysql.connector.errors import PoolError, InterfaceError
+from app.database import ConnectionPool, run_db
+
+
+class FakeConnection:
+    """Conexão falsa para testar o pool sem MariaDB"""
+
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise InterfaceError("conexão perdida")
+
+    def is_connected(self):
+        return self.alive and not self.closed
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    pool = ConnectionPool(connect=connect, **kwargs)
+    return pool, created
+
+
+class TestConnectionPool:
+    """Testes para o pool de conexões"""
+
+    def test_reuses_returned_connection(self):
+        """Conexão devolvida deve ser reutilizada no próximo checkout"""
+        pool, created = make_pool(pool_size=2, max_overflow=0)
+        conn = pool.acquire()
+        conn.close()
+        conn2 = pool.acquire()
+        assert len(created) == 1
+        assert conn2._raw is created[0]
+        assert created[0].rollbacks == 1
+
+    def test_overflow_connections_closed_on_return(self):
+        """Conexões de overflow são fechadas ao voltar para o pool"""
+        pool, created = make_pool(pool_size=1, max_overflow=1)
+        c1 = pool.acquire()
+        c2 = pool.acquire()
+        assert pool.stats()["overflow"] == 1
+        c1.close()
+        c2.close()
+        stats = pool.stats()
+        assert stats["idle"] == 1
+        assert stats["total"] == 1
+        assert stats["checked_out"] == 0
+        assert created[1].closed
+
+    def test_timeout_when_exhausted(self):
+        """Pool esgotado deve gerar PoolError após o timeout"""
+        pool, _ = make_pool(pool_size=1, max_overflow=0, timeout=0.05)
+        pool.acquire()
+        with pytest.raises(PoolError):
+            pool.acquire()
+        assert pool.stats()["timeouts"] == 1
+
+    def test_waiter_receives_released_connection(self):
+        """Thread bloqueada recebe a conexão assim que outra é devolvida"""
+        pool, created = make_pool(pool_size=1, max_overflow=0, timeout=2)
+        conn = pool.acquire()
+        acquired = []
+
+        def worker():
+            acquired.append(pool.acquire())
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        conn.close()
+        thread.join(timeout=2)
+        assert acquired and acquired[0]._raw is created[0]
+
+    def test_pre_ping_replaces_dead_connection(self):
+        """Conexão morta é descartada e substituída no checkout"""
+        pool, created = make_pool(pool_size=1, max_overflow=0)
+        pool.acquire().close()
+        created[0].alive = False
+        conn = pool.acquire()
+        assert conn._raw is created[1]
+        assert pool.stats()["connections_invalidated"] == 1
+
+    def test_failed_connect_releases_slot(self):
+        """Falha ao conectar não deve consumir capacidade do pool"""
+        def connect():
+            raise InterfaceError("banco fora do ar")
+
+        pool = ConnectionPool(connect=connect, pool_size=1, max_overflow=0, timeout=0.05)
+        for _ in range(3):
+            with pytest.raises(InterfaceError):
+                pool.acquire()
+        assert pool.stats()["total"] == 0
+
+    def test_close_is_idempotent(self):
+        """Fechar a mesma conexão duas vezes não devolve duas vezes"""
+        pool, _ = make_pool(pool_size=2, max_overflow=0)
+        conn = pool.acquire()
+        conn.close()
+        conn.close()
+        assert pool.stats()["idle"] == 1
+        assert pool.stats()["checked_out"] == 0
+
+
+class TestRunDb:
+    """Testes para o executor de banco"""
+
+    def test_runs_outside_event_loop_thread(self):
+        """run_db executa a função em uma thread do executor dedicado"""
+        async def main():
+            loop_thread = threading.current_thread().name
+            worker_thread = await run_db(lambda: threading.current_thread().name)
+            return loop_thread, worker_thread
+
+        loop_thread, worker_thread = asyncio.run(main())
+        assert worker_thread != loop_thread
+        assert worker_thread.startswith("db")
+
+    def test_forwards_arguments(self):
+        """run_db repassa args e kwargs para a função"""
+        def add(a, b, c=0):
+            return a + b + c
+
+        assert asyncio.run(run_db(add, 1, 2, c=3)) == 6
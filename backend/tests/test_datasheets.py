@@ -0,0 +1,643 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+import threading
+import pandas as pd
+import pytest
+from openpyxl import Workbook, load_workbook
+from starlette.datastructures import UploadFile
+from app import schema
+from app.controllers import datasheets
+from app.inference import infer_column_types
+
+
+def make_workbook(path, rows=25):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["id", "nome", "valor"])
+    for i in range(rows):
+        ws.append([i, f"item {i}", i * 1.5])
+    wb.save(path)
+
+
+class TestReadExcelInChunks:
+    """Testes para a leitura de planilhas em chunks"""
+
+    def test_chunks_from_path(self, tmp_path):
+        """Lê a planilha a partir do caminho em chunks do tamanho pedido"""
+        path = tmp_path / "dados.xlsx"
+        make_workbook(path, rows=25)
+        chunks = list(datasheets.read_excel_in_chunks(str(path), batch_size=10))
+        assert [len(c) for c in chunks] == [10, 10, 5]
+        assert list(chunks[0].columns) == ["id", "nome", "valor"]
+        assert chunks[-1]["id"].tolist() == [20, 21, 22, 23, 24]
+
+
+class TestSpoolUpload:
+    """Testes para a gravação do upload em disco"""
+
+    def test_spools_in_blocks(self, tmp_path, monkeypatch):
+        """O upload é copiado em blocos para um arquivo temporário"""
+        monkeypatch.setattr(datasheets, "UPLOAD_CHUNK_SIZE", 4)
+        content = b"0123456789" * 3
+        upload = UploadFile(file=io.BytesIO(content), filename="dados.xlsx")
+        path, size, digest = asyncio.run(datasheets.spool_upload_to_disk(upload, directory=str(tmp_path)))
+        try:
+            assert size == len(content)
+            assert digest == hashlib.sha256(content).hexdigest()
+            assert path.endswith(".xlsx")
+            with open(path, "rb") as f:
+                assert f.read() == content
+        finally:
+            os.remove(path)
+
+
+class FakeCursor:
+    """
+    Cursor falso que pode recusar LOAD DATA ou carregar só parte das linhas,
+    com avisos (a tabela já tem contagem gravada)
+    """
+
+    def __init__(self, refuse_load_data=False, loaded_rows=None, warnings=()):
+        self.refuse_load_data = refuse_load_data
+        self.loaded_rows = loaded_rows
+        self.warnings = list(warnings)
+        self.executed = []
+        self.inserted = []
+        self.rowcount = -1
+        self.warning_count = 0
+        self._row = None
+
+    def execute(self, query, params=None):
+        if query.startswith("LOAD DATA") and self.refuse_load_data:
+            from mysql.connector.errors import ProgrammingError
+            raise ProgrammingError("Loading local data is disabled")
+        self.executed.append((query, params))
+        if query.startswith("LOAD DATA"):
+            with open(params[0]) as f:
+                self.rowcount = sum(1 for _ in f) if self.loaded_rows is None else self.loaded_rows
+            self.warning_count = len(self.warnings)
+        self._row = {"row_count": 0} if query.startswith("SELECT row_count") else None
+
+    def executemany(self, query, rows):
+        self.inserted.extend(rows)
+
+    def fetchone(self):
+        return self._row
+
+    def fetchall(self):
+        return self.warnings
+
+
+class FakeConnection:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class TestLoadData:
+    """Testes para o caminho de carga em massa (LOAD DATA LOCAL INFILE)"""
+
+    def test_value_round_trip(self):
+        """Valores com TAB, quebra de linha, barra e NULL sobrevivem ao arquivo"""
+        row = (None, "a\tb", "linha1\nlinha2", "c:\\dir", True, 1.5)
+        line = "\t".join(datasheets.format_load_data_value(v) for v in row) + "\n"
+        assert datasheets.parse_load_data_line(line) == (None, "a\tb", "linha1\nlinha2", "c:\\dir", "1", "1.5")
+
+    def test_flush_uses_load_data(self, tmp_path):
+        """Flush executa LOAD DATA com o arquivo e registra o modo"""
+        buffer = datasheets.LoadDataBuffer("datasheet_x", ["a", "b"], directory=str(tmp_path))
+        cursor = FakeCursor()
+        stats = {}
+        try:
+            buffer.append([(1, "x"), (2, None)])
+            buffer.flush(FakeConnection(), cursor, "INSERT", stats)
+        finally:
+            buffer.close()
+        load_query, params = cursor.executed[0]
+        assert load_query.startswith("LOAD DATA LOCAL INFILE")
+        assert params == (buffer.path,)
+        assert stats["load_data"]["rows"] == 2
+        assert not os.path.exists(buffer.path)
+
+    @pytest.mark.parametrize("loaded_rows, warnings", [
+        (1, [{"Level": "Warning", "Code": 1062, "Message": "Duplicate entry '1' for key 'PRIMARY'"}]),
+        (2, [{"Level": "Warning", "Code": 1265, "Message": "Data truncated for column 'b' at row 2"}]),
+    ])
+    def test_incomplete_load_fails(self, tmp_path, loaded_rows, warnings):
+        """Linhas puladas ou valores truncados pelo LOAD DATA falham o import"""
+        buffer = datasheets.LoadDataBuffer("datasheet_x", ["a", "b"], directory=str(tmp_path))
+        cursor = FakeCursor(loaded_rows=loaded_rows, warnings=warnings)
+        stats = {}
+        try:
+            buffer.append([(1, "x"), (2, "y" * 300)])
+            with pytest.raises(ValueError, match=f"gravou {loaded_rows} de 2 linhas .*{warnings[0]['Code']}"):
+                buffer.flush(FakeConnection(), cursor, "INSERT", stats)
+        finally:
+            buffer.close()
+        assert cursor.inserted == []  # Sem fallback para executemany
+        assert stats == {}
+
+    def test_falls_back_to_executemany(self, tmp_path):
+        """Servidor sem local_infile: linhas vão por executemany e o buffer se desativa"""
+        buffer = datasheets.LoadDataBuffer("datasheet_x", ["a", "b"], directory=str(tmp_path))
+        cursor = FakeCursor(refuse_load_data=True)
+        stats = {}
+        try:
+            buffer.append([(1, "x"), (2, None)])
+            buffer.flush(FakeConnection(), cursor, "INSERT", stats)
+        finally:
+            buffer.close()
+        assert cursor.inserted == [("1", "x"), ("2", None)]
+        assert buffer.enabled is False
+        assert stats["executemany"]["rows"] == 2
+
+
+def keyset_pages(conn, sort_column, ascending, page_size):
+    """Percorre a tabela inteira página a página usando build_keyset_condition"""
+    direction = "ASC" if ascending else "DESC"
+    order = f"`{sort_column}` {direction}, `_row_id` {direction}" if sort_column else f"`_row_id` {direction}"
+    rows, last = [], None
+    while True:
+        where, params = "", []
+        if last is not None:
+            sql, params = datasheets.build_keyset_condition(
+                sort_column, last[1] if sort_column else None, last[0], ascending
+            )
+            where = f"WHERE {sql}"
+        query = f"SELECT `_row_id`, `valor` FROM t {where} ORDER BY {order} LIMIT ?"
+        page = conn.execute(query.replace("%s", "?"), params + [page_size]).fetchall()
+        if not page:
+            return rows
+        rows.extend(page)
+        last = page[-1]
+
+
+class TestKeysetPagination:
+    """Testes para a paginação por cursor"""
+
+    def test_cursor_round_trip(self):
+        """Cursor opaco preserva ordenação, valor e row id"""
+        token = datasheets.encode_page_cursor("valor", "desc", 10.5, 42, "next")
+        assert datasheets.decode_page_cursor(token) == {"s": "valor", "o": "desc", "v": 10.5, "id": 42, "d": "next"}
+
+    def test_invalid_cursor(self):
+        """Cursor adulterado é rejeitado"""
+        assert datasheets.decode_page_cursor("não-é-base64!") is None
+        assert datasheets.decode_page_cursor(datasheets.encode_page_cursor(None, "asc", None, 1, "x")) is None
+
+    @pytest.mark.parametrize("sort_column", [None, "valor"])
+    @pytest.mark.parametrize("ascending", [True, False])
+    def test_pages_cover_table_in_order(self, sort_column, ascending):
+        """Percorrer por cursor devolve todas as linhas na ordem, com NULLs e empates"""
+        import sqlite3
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE t (`_row_id` INTEGER PRIMARY KEY, `valor` INTEGER)")
+        values = [3, None, 1, 3, None, 2, 1, 3, None, 5, 2, 2, 4]
+        conn.executemany("INSERT INTO t (`valor`) VALUES (?)", [(v,) for v in values])
+
+        direction = "ASC" if ascending else "DESC"
+        order = f"`{sort_column}` {direction}, `_row_id` {direction}" if sort_column else f"`_row_id` {direction}"
+        expected = conn.execute(f"SELECT `_row_id`, `valor` FROM t ORDER BY {order}").fetchall()
+
+        assert keyset_pages(conn, sort_column, ascending, page_size=2) == expected
+
+
+class CountingCursor:
+    """Cursor falso para as contagens da paginação"""
+
+    def __init__(self, db):
+        self.db = db
+        self._result = None
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split()).upper()
+        if q.startswith("SELECT VERSION FROM"):
+            self._result = {"version": self.db["version"]}
+        elif "INFORMATION_SCHEMA.TABLES" in q:
+            self._result = {"estimated_rows": 990, "row_count": self.db["stored"]}
+        elif q.startswith("SELECT COUNT(*)"):
+            self.db["count_queries"].append((q, params))
+            limited = "LIMIT" in q
+            total = self.db["rows"]
+            self._result = {"total": min(total, params[-1]) if limited else total}
+        else:
+            self._result = None
+
+    def fetchone(self):
+        return self._result
+
+
+class TestCountCache:
+    """Testes para as contagens em cache e aproximadas da paginação"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        datasheets._count_cache.clear()
+        yield
+        datasheets._count_cache.clear()
+
+    def make_db(self, rows=25000, stored=25000):
+        return {"version": 1, "rows": rows, "stored": stored, "count_queries": []}
+
+    def test_exact_count_is_cached_until_version_changes(self):
+        """Segunda página não repete o COUNT(*); reimport (nova versão) invalida"""
+        db = self.make_db()
+        cursor = CountingCursor(db)
+        first = datasheets.count_table_records(cursor, "datasheet_x", "", [])
+        second = datasheets.count_table_records(cursor, "datasheet_x", "", [])
+        assert first["total"] == second["total"] == 25000
+        assert second["cached"] is True
+        assert len(db["count_queries"]) == 1
+
+        db["version"] += 1
+        datasheets.count_table_records(cursor, "datasheet_x", "", [])
+        assert len(db["count_queries"]) == 2
+
+    def test_approximate_without_search_uses_stored_count(self):
+        """Sem busca, o modo aproximado não varre a tabela"""
+        db = self.make_db(stored=25000)
+        result = datasheets.count_table_records(CountingCursor(db), "datasheet_x", "", [], approximate=True)
+        assert result["total"] == 25000
+        assert result["exact"] is True
+        assert db["count_queries"] == []
+
+    def test_approximate_search_is_capped(self, monkeypatch):
+        """Com busca, a contagem para no limite e sinaliza com capped"""
+        monkeypatch.setattr(datasheets, "COUNT_APPROX_CAP", 100)
+        db = self.make_db()
+        result = datasheets.count_table_records(
+            CountingCursor(db), "datasheet_x", " WHERE (`a` LIKE %s)", ["%x%"], search="x", approximate=True
+        )
+        assert result == {"total": 100, "exact": False, "capped": True, "cached": False}
+        assert db["count_queries"][0][1] == ["%x%", 101]
+
+
+class TestSearchCondition:
+    """Testes para a busca indexada (FULLTEXT com fallback para LIKE)"""
+
+    COLUMNS = [
+        {"Field": "nome", "Type": "varchar(255)"},
+        {"Field": "obs", "Type": "text"},
+        {"Field": "valor", "Type": "double"},
+    ]
+
+    def test_fulltext_query_uses_required_prefix_terms(self):
+        """Cada palavra vira um termo obrigatório com prefixo; operadores são descartados"""
+        assert datasheets.build_fulltext_query('joão +silva "x') is None  # "x" é curto demais
+        assert datasheets.build_fulltext_query("joão -silva") == "+joão* +silva*"
+
+    def test_text_search_uses_index_only(self):
+        """Termo textual usa só o MATCH: colunas numéricas nunca casariam"""
+        sql, params, mode = datasheets.build_search_condition(self.COLUMNS, ["nome", "obs"], "maria")
+        assert mode == "fulltext"
+        assert sql == "(MATCH(`nome`, `obs`) AGAINST (%s IN BOOLEAN MODE))"
+        assert params == ["+maria*"]
+
+    def test_numeric_search_adds_like_on_numeric_columns(self):
+        """Termo numérico também procura nas colunas não textuais"""
+        sql, params, mode = datasheets.build_search_condition(self.COLUMNS, ["nome", "obs"], "1500")
+        assert mode == "fulltext"
+        assert "`valor` LIKE %s" in sql
+        assert params == ["+1500*", "%1500%"]
+
+    def test_text_columns_outside_index_use_like(self):
+        """Colunas de texto fora do índice continuam com LIKE"""
+        sql, params, _ = datasheets.build_search_condition(self.COLUMNS, ["nome"], "maria")
+        assert "`obs` LIKE %s" in sql
+        assert "`valor`" not in sql
+
+    def test_short_term_or_missing_index_falls_back_to_like(self):
+        """Sem índice ou com termo curto, busca com LIKE em todas as colunas"""
+        for fulltext_columns, search in ((["nome", "obs"], "ab"), ([], "maria")):
+            sql, params, mode = datasheets.build_search_condition(self.COLUMNS, fulltext_columns, search)
+            assert mode == "like"
+            assert sql.count("LIKE") == 3
+            assert params == [f"%{search}%"] * 3
+
+
+class IndexCursor:
+    """Cursor falso para SHOW INDEX / DESCRIBE / ALTER TABLE"""
+
+    def __init__(self, indexes=None):
+        self.indexes = indexes or []
+        self.executed = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        if query.startswith("SHOW INDEX"):
+            self._rows = self.indexes
+        elif query.startswith("DESCRIBE"):
+            self._rows = [
+                {"Field": "_row_id", "Type": "bigint(20) unsigned"},
+                {"Field": "nome", "Type": "varchar(255)"},
+                {"Field": "valor", "Type": "double"},
+                {"Field": "obs", "Type": "text"},
+            ]
+        else:
+            self._rows = []
+
+    def fetchall(self):
+        return self._rows
+
+
+class TestEnsureFulltextIndex:
+    """Testes para a criação do índice de busca no import"""
+
+    def test_creates_index_on_text_columns(self):
+        cursor = IndexCursor()
+        result = datasheets.ensure_fulltext_index(cursor, "datasheet_x")
+        assert result["created"] is True
+        assert result["columns"] == ["nome", "obs"]
+        assert cursor.executed[-1] == (
+            "ALTER TABLE `datasheet_x` ADD FULLTEXT INDEX `ft_search` (`nome`, `obs`)"
+        )
+
+    def test_existing_index_is_reused(self):
+        cursor = IndexCursor(indexes=[
+            {"Key_name": "PRIMARY", "Index_type": "BTREE", "Column_name": "_row_id", "Seq_in_index": 1},
+            {"Key_name": "ft_search", "Index_type": "FULLTEXT", "Column_name": "obs", "Seq_in_index": 2},
+            {"Key_name": "ft_search", "Index_type": "FULLTEXT", "Column_name": "nome", "Seq_in_index": 1},
+        ])
+        result = datasheets.ensure_fulltext_index(cursor, "datasheet_x")
+        assert result == {"columns": ["nome", "obs"], "created": False, "seconds": 0.0}
+        assert not any(q.startswith("ALTER") for q in cursor.executed)
+
+
+class UpsertCursor:
+    """Cursor falso: o SELECT de busca retorna as linhas já gravadas"""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.executed = []
+        self.many = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        self._rows = self.stored if query.startswith("SELECT") else []
+
+    def executemany(self, query, rows):
+        self.many.append((query.split()[0], list(rows)))
+
+    def fetchall(self):
+        return self._rows
+
+
+class DescribeCursor:
+    """Cursor falso: DESCRIBE retorna as colunas já gravadas na tabela"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.executed = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        self._rows = self.columns if query.startswith("DESCRIBE") else []
+
+    def fetchall(self):
+        return self._rows
+
+
+class TestWidenExistingColumns:
+    """Testes para o append/upsert com valores maiores que os tipos gravados"""
+
+    def test_longer_values_widen_columns(self):
+        df = pd.DataFrame({"nome": ["a" * 20, "bo"], "qtd": [70000, 5], "obs": ["x", "y"]})
+        profiles = infer_column_types([df])
+        column_types = {name: profile.sql_type() for name, profile in zip(df.columns, profiles)}
+        cursor = DescribeCursor([
+            {"Field": "nome", "Type": "varchar(3)"},
+            {"Field": "qtd", "Type": "tinyint(4)"},
+            {"Field": "obs", "Type": "varchar(10)"},
+        ])
+
+        widened = datasheets.widen_existing_columns(cursor, "datasheet_x", column_types)
+
+        assert widened == {"nome": "VARCHAR(20)", "qtd": "INT"}
+        assert cursor.executed[-1] == (
+            "ALTER TABLE `datasheet_x` MODIFY COLUMN `nome` VARCHAR(20), MODIFY COLUMN `qtd` INT"
+        )
+
+    def test_values_that_fit_keep_the_table(self):
+        cursor = DescribeCursor([{"Field": "nome", "Type": "text"}, {"Field": "qtd", "Type": "int(11)"}])
+        widened = datasheets.widen_existing_columns(cursor, "datasheet_x", {"nome": "VARCHAR(5)", "qtd": "TINYINT"})
+        assert widened == {}
+        assert not any(q.startswith("ALTER") for q in cursor.executed)
+
+
+class TableCursor:
+    """Cursor falso que mantém as linhas de cada tabela (CREATE, INSERT, RENAME e DROP)"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.executed = []
+        self._row = None
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split())
+        self.executed.append(q)
+        self._row = None
+        if "information_schema.tables" in q:
+            self._row = {"count": int(params[0] in self.tables)}
+        elif q.startswith("CREATE TABLE IF NOT EXISTS"):
+            self.tables.setdefault(q.split("`")[1], [])
+        elif q.startswith("RENAME TABLE"):
+            for old, new in re.findall(r"`([^`]+)` TO `([^`]+)`", q):
+                self.tables[new] = self.tables.pop(old)
+        elif q.startswith("DROP TABLE"):
+            self.tables.pop(q.split("`")[1], None)
+        elif q.startswith("SELECT row_count"):
+            self._row = {"row_count": 0}
+
+    def executemany(self, query, rows):
+        self.tables[query.split("`")[1]].extend(rows)
+
+    def fetchone(self):
+        return self._row
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class TestReplaceImport:
+    """Testes para o mode=replace com tabela temporária"""
+
+    @pytest.fixture
+    def tables(self, monkeypatch):
+        tables = {"datasheet_vendas": [(1, "antigo"), (2, "antigo")]}
+        connection = FakeConnection()
+        connection.cursor = lambda dictionary=False: TableCursor(tables)
+        monkeypatch.setattr(datasheets, "get_db_connection", lambda: connection)
+        monkeypatch.setattr(datasheets, "close_db_connection", lambda connection, cursor=None: None)
+        monkeypatch.setattr(datasheets, "SEARCH_FULLTEXT_ENABLED", False)
+        monkeypatch.setattr(schema, "_metadata_tables_ready", True)  # Só as tabelas de dados no dict
+        return tables
+
+    def chunks(self, fail=False):
+        yield pd.DataFrame({"id": ["1", "2"], "nome": ["novo", "novo"]})
+        if fail:
+            raise ValueError("valor inválido na linha 3")
+        yield pd.DataFrame({"id": ["3"], "nome": ["novo"]})
+
+    def test_failed_replace_keeps_original_rows(self, tables):
+        with pytest.raises(ValueError, match="valor inválido"):
+            datasheets.import_chunks_to_database(self.chunks(fail=True), "vendas", mode="replace")
+        assert tables == {"datasheet_vendas": [(1, "antigo"), (2, "antigo")]}
+
+    def test_replace_swaps_table_after_load(self, tables):
+        result = datasheets.import_chunks_to_database(self.chunks(), "vendas", mode="replace")
+        assert result["rows_imported"] == 3
+        assert list(tables) == ["datasheet_vendas"]
+        assert [row[1] for row in tables["datasheet_vendas"]] == ["novo", "novo", "novo"]
+
+
+class TestUpsertWriter:
+    """Testes para o import incremental (mode=upsert)"""
+
+    def test_writes_only_new_and_changed_rows(self, monkeypatch):
+        monkeypatch.setattr(datasheets, "add_table_row_count", lambda cursor, table, rows: None)
+        writer = datasheets.UpsertWriter("datasheet_x", ["id", "nome"], key_column="id")
+        unchanged_hash = datasheets.row_hashes([(1, "ana")], ["id", "nome"])[0]
+        cursor = UpsertCursor([{"k": 1, "h": unchanged_hash}, {"k": 2, "h": "hash-antigo"}])
+
+        writer.write(FakeConnection(), cursor, [(1, "ana"), (2, "bo"), (3, "cy")], {})
+
+        assert "WHERE `id` IN (%s, %s, %s)" in cursor.executed[0]
+        inserts = dict(cursor.many)["INSERT"]
+        updates = dict(cursor.many)["UPDATE"]
+        assert [row[:2] for row in inserts] == [(3, "cy")]
+        assert [(row[0], row[1], row[3]) for row in updates] == [(2, "bo", 2)]
+        assert writer.summary()["inserted"] == 1
+        assert writer.summary()["updated"] == 1
+        assert writer.summary()["unchanged"] == 1
+
+    def test_unknown_key_column(self):
+        with pytest.raises(ValueError):
+            datasheets.UpsertWriter("datasheet_x", ["id", "nome"], key_column="codigo")
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            datasheets.import_chunks_to_database([], "x", mode="merge")
+
+
+class TestMultiSheetImport:
+    """Testes para o import de várias abas com parse em processos separados"""
+
+    @pytest.fixture(autouse=True)
+    def shutdown_pool(self):
+        yield
+        from app.workbook import shutdown_parse_executor
+        shutdown_parse_executor()
+
+    def make_workbook(self, path):
+        wb = Workbook()
+        wb.active.title = "Receitas"
+        wb.active.append(["mes", "valor"])
+        for i in range(25):
+            wb.active.append([i, i * 2.5])
+        ws = wb.create_sheet("Custos Fixos")
+        ws.append(["item", "valor"])
+        for i in range(7):
+            ws.append([f"item {i}", i])
+        wb.create_sheet("Resumo").append(["total"])
+        wb.save(path)
+
+    def test_sheet_table_names_do_not_collide(self):
+        names = datasheets.build_sheet_table_names("fin", ["Custos", "custos", "Resumo!"])
+        assert names == {"Custos": "fin_custos", "custos": "fin_custos_2", "Resumo!": "fin_resumo"}
+
+    @pytest.fixture
+    def inserted(self, monkeypatch, upload_registry):
+        monkeypatch.setattr(datasheets, "IMPORT_BATCH_SIZE", 10)
+        inserted = {}
+
+        def fake_import(chunks, table_name, estimated_rows=None, column_profiles=None, progress=None,
+                        mode="append", key_column=None):
+            rows = 0
+            for chunk in chunks:
+                rows += len(chunk)
+                if progress:
+                    progress(rows_parsed=rows, rows_inserted=rows)
+            inserted[table_name] = [p.sql_type() for p in column_profiles]
+            return {"table_name": f"datasheet_{table_name}", "rows_imported": rows, "table_created": True}
+
+        monkeypatch.setattr(datasheets, "import_chunks_to_database", fake_import)
+        return inserted
+
+    def test_imports_selected_sheets_into_separate_tables(self, tmp_path, inserted, monkeypatch):
+        """Cada aba é lida no pool de processos e inserida em sua própria tabela"""
+        from app.jobs import ImportJob
+
+        threads = set()
+        import_sheet_from_queue = datasheets.import_sheet_from_queue
+
+        def recording_import(*args, **kwargs):
+            threads.add(threading.current_thread().name.split("_")[0])
+            return import_sheet_from_queue(*args, **kwargs)
+
+        monkeypatch.setattr(datasheets, "import_sheet_from_queue", recording_import)
+
+        path = tmp_path / "financas.xlsx"
+        self.make_workbook(path)
+        job = ImportJob("financas.xlsx")
+
+        result = asyncio.run(datasheets.import_workbook_sheets(
+            str(path), "financas.xlsx", ["Receitas", "Custos Fixos"], job=job
+        ))
+
+        assert result["tables"] == ["datasheet_financas_receitas", "datasheet_financas_custos_fixos"]
+        assert result["rows_imported"] == 32
+        assert threads == {"sheet-insert"}  # Consumidores das filas fora do executor de banco
+        assert inserted == {
+            "financas_receitas": ["TINYINT", "DECIMAL(3,1)"],
+            "financas_custos_fixos": ["VARCHAR(6)", "TINYINT"],
+        }
+        snapshot = job.snapshot()
+        assert snapshot["rows_inserted"] == 32
+        assert snapshot["sheets"]["Custos Fixos"]["phase"] == "completed"
+        assert not path.exists()  # Arquivo temporário removido
+
+    def test_unchanged_workbook_and_sheets_are_skipped(self, tmp_path, inserted):
+        """Planilha idêntica não é lida; após editar uma aba, só ela é reimportada"""
+        path = tmp_path / "financas.xlsx"
+
+        def upload():
+            inserted.clear()
+            return asyncio.run(datasheets.import_workbook_sheets(str(path), "financas.xlsx"))
+
+        self.make_workbook(path)
+        content = path.read_bytes()
+        assert upload()["deduplicated"] is None
+        assert len(inserted) == 3
+
+        path.write_bytes(content)
+        result = upload()
+        assert result["deduplicated"] == {"reason": "file", "sheets_skipped": 3}
+        assert result["tables"][0] == "datasheet_financas_receitas"
+        assert inserted == {}
+
+        self.make_workbook(path)
+        wb = load_workbook(path)
+        wb["Custos Fixos"].append(["item novo", 99])
+        wb.save(path)
+        result = upload()
+        assert list(inserted) == ["financas_custos_fixos"]
+        assert result["deduplicated"] == {"reason": "data", "sheets_skipped": 2}
+        skipped = {r["sheet_name"]: r["deduplicated"]["reason"] for r in result["sheets"] if r.get("deduplicated")}
+        assert skipped == {"Receitas": "data", "Resumo": "data"}
+
+    def test_unknown_sheet_is_rejected(self, tmp_path):
+        path = tmp_path / "financas.xlsx"
+        self.make_workbook(path)
+        with pytest.raises(Exception, match="Abas não encontradas: Balanço"):
+            asyncio.run(datasheets.import_workbook_sheets(str(path), "financas.xlsx", ["Balanço"]))
@@ -0,0 +1,138 @@
+import pytest
+from app import indexing
+from app.indexing import (
+    extract_column_usage, profile_sample, rank_index_candidates, plan_indexes, estimate_index_bytes,
+    advisor_index_name
+)
+
+COLUMNS = {
+    "datasheet_vendas": ["id", "cliente_id", "valor", "status"],
+    "datasheet_clientes": ["id", "nome", "cidade"],
+}
+
+
+class TestExtractColumnUsage:
+    """Testes para o registro das colunas usadas em JOIN/WHERE pelas queries geradas"""
+
+    def test_join_and_filters_with_aliases(self):
+        sql = (
+            "SELECT c.`nome`, SUM(v.valor) AS total FROM `datasheet_vendas` v "
+            "INNER JOIN `datasheet_clientes` AS c ON v.`cliente_id` = c.`id` "
+            "WHERE c.cidade = 'São Paulo' AND v.status NOT IN ('cancelada') GROUP BY c.nome LIMIT 10"
+        )
+        usage = extract_column_usage(sql, COLUMNS)
+        assert usage == {
+            ("datasheet_vendas", "cliente_id"): {"join": 1, "filter": 0},
+            ("datasheet_clientes", "id"): {"join": 1, "filter": 0},
+            ("datasheet_clientes", "cidade"): {"join": 0, "filter": 1},
+            ("datasheet_vendas", "status"): {"join": 0, "filter": 1},
+        }
+
+    def test_unqualified_columns_resolved_only_when_unambiguous(self):
+        sql = "SELECT * FROM datasheet_vendas, datasheet_clientes WHERE cidade LIKE 'R%' AND id > 5"
+        usage = extract_column_usage(sql, COLUMNS)
+        # "id" existe nas duas tabelas: não dá para saber qual
+        assert usage == {("datasheet_clientes", "cidade"): {"join": 0, "filter": 1}}
+
+    def test_literals_and_select_list_ignored(self):
+        sql = "SELECT status, COUNT(*) FROM datasheet_vendas WHERE 'status = x' = 'y' GROUP BY status"
+        assert extract_column_usage(sql, COLUMNS) == {}
+
+
+def make_rows(count, **columns):
+    return [{name: make(i) for name, make in columns.items()} for i in range(count)]
+
+
+class TestRankIndexCandidates:
+    """Testes para a pontuação das colunas candidatas a índice"""
+
+    @pytest.fixture(autouse=True)
+    def small_tables(self, monkeypatch):
+        monkeypatch.setattr(indexing, "INDEX_ADVISOR_MIN_ROWS", 1000)
+
+    def rank(self, usage=None, indexed=None):
+        columns = {
+            "datasheet_vendas": [
+                {"name": "cliente_id", "data_type": "int", "column_type": "int(11)"},
+                {"name": "valor", "data_type": "decimal", "column_type": "decimal(8,2)"},
+                {"name": "status", "data_type": "varchar", "column_type": "varchar(10)"},
+            ],
+            "datasheet_clientes": [
+                {"name": "id", "data_type": "int", "column_type": "int(11)"},
+                {"name": "cidade", "data_type": "varchar", "column_type": "varchar(40)"},
+            ],
+        }
+        samples = {
+            "datasheet_vendas": profile_sample(make_rows(
+                500, cliente_id=lambda i: i % 100, valor=lambda i: i * 1.5, status=lambda i: ["ok", "cancelada"][i % 2]
+            ), ["cliente_id", "valor", "status"]),
+            "datasheet_clientes": profile_sample(make_rows(
+                100, id=lambda i: i, cidade=lambda i: f"cidade {i % 30}"
+            ), ["id", "cidade"]),
+        }
+        row_counts = {"datasheet_vendas": 500000, "datasheet_clientes": 2000}
+        return rank_index_candidates(columns, row_counts, samples, usage or {}, indexed or {})
+
+    def test_foreign_key_found_by_value_overlap(self):
+        candidates = {(c["table"], c["column"]): c for c in self.rank()}
+        vendas = candidates[("datasheet_vendas", "cliente_id")]
+        assert vendas["reasons"]["overlap"] == {"datasheet_clientes.id": 1.0}
+        # A chave da dimensão também é indexada; status tem poucos valores
+        assert ("datasheet_clientes", "id") in candidates
+        assert ("datasheet_vendas", "status") not in candidates
+
+    def test_query_history_adds_filter_columns(self):
+        usage = {("datasheet_clientes", "cidade"): {"join": 0, "filter": 2}}
+        candidates = self.rank(usage=usage)
+        cidade = next(c for c in candidates if c["column"] == "cidade")
+        assert cidade["score"] == 4
+        assert cidade["reasons"] == {"filter": 2}
+
+    def test_comparisons_limited_to_key_pairs_and_capped(self, monkeypatch):
+        """Só pares da mesma família com uma coluna-chave são comparados, até o teto"""
+        compared = []
+        overlap_ratio = indexing.overlap_ratio
+
+        def counting_overlap(profile, other):
+            compared.append(1)
+            return overlap_ratio(profile, other)
+
+        monkeypatch.setattr(indexing, "overlap_ratio", counting_overlap)
+        self.rank()
+        # Números: clientes.id x vendas.cliente_id e clientes.id x vendas.valor (as duas
+        # chaves, uma vez só); texto não tem coluna-chave
+        assert len(compared) == 2
+
+        compared.clear()
+        monkeypatch.setattr(indexing, "INDEX_ADVISOR_MAX_COMPARISONS", 1)
+        candidates = {(c["table"], c["column"]): c for c in self.rank()}
+        assert len(compared) == 1
+        # O teto não muda as outras razões (nome, cardinalidade)
+        assert ("datasheet_clientes", "id") in candidates
+
+    def test_already_indexed_columns_skipped(self):
+        candidates = self.rank(indexed={"datasheet_vendas": {"cliente_id"}})
+        assert ("datasheet_vendas", "cliente_id") not in {(c["table"], c["column"]) for c in candidates}
+
+
+class TestPlanIndexes:
+    """Testes para a escolha dos índices dentro do orçamento"""
+
+    def test_greedy_by_priority_within_budget(self):
+        candidates = [
+            {"column": "a", "estimated_bytes": 600},
+            {"column": "b", "estimated_bytes": 500},
+            {"column": "c", "estimated_bytes": 300},
+        ]
+        selected, skipped = plan_indexes(candidates, budget_bytes=1200, used_bytes=200)
+        assert [c["column"] for c in selected] == ["a", "c"]
+        assert [c["column"] for c in skipped] == ["b"]
+
+    def test_estimated_size_grows_with_key_width(self):
+        assert estimate_index_bytes("int", "int(11)", 1000) < estimate_index_bytes("varchar", "varchar(80)", 1000, 40.0)
+        assert estimate_index_bytes("decimal", "decimal(12,2)", 1000) == estimate_index_bytes("bigint", "bigint", 1000) - 1500
+
+    def test_long_index_names_are_truncated(self):
+        name = advisor_index_name("c" * 64)
+        assert len(name) == 64 and name.startswith("ix_auto_")
+        assert name != advisor_index_name("c" * 63 + "d")
@@ -0,0 +1,109 @@
+import datetime
+from decimal import Decimal
+import pandas as pd
+from app.inference import infer_column_types, chunk_to_rows, widen_sql_type
+
+
+def sql_types(*chunks):
+    profiles = infer_column_types(chunks)
+    return {name: profile.sql_type() for name, profile in zip(chunks[0].columns, profiles)}
+
+
+class TestInferColumnTypes:
+    """Testes para a inferência de tipos sobre o arquivo inteiro"""
+
+    def test_integer_width_grows_with_later_chunks(self):
+        """O tipo inteiro considera o maior valor de todos os chunks"""
+        first = pd.DataFrame({"qtd": [1, 2, 3]})
+        later = pd.DataFrame({"qtd": [70000, 5, None]})
+        assert sql_types(first) == {"qtd": "TINYINT"}
+        assert sql_types(first, later) == {"qtd": "INT"}
+
+    def test_numbers_stored_as_text(self):
+        """Números gravados como texto viram colunas numéricas"""
+        df = pd.DataFrame({"codigo": ["10", " 20", ""], "preco": ["1.50", "2.25", None]})
+        assert sql_types(df) == {"codigo": "TINYINT", "preco": "DECIMAL(3,2)"}
+
+    def test_float_scale_and_double_fallback(self):
+        """Decimais com poucas casas viram DECIMAL; dízimas ficam DOUBLE"""
+        df = pd.DataFrame({"valor": [1.5, 1200.25], "razao": [1 / 3, 0.5]})
+        assert sql_types(df) == {"valor": "DECIMAL(6,2)", "razao": "DOUBLE"}
+
+    def test_dates_as_strings(self):
+        """Datas em texto (ISO ou dd/mm/aaaa) viram DATE/DATETIME"""
+        df = pd.DataFrame({
+            "iso": ["2024-01-05", "2024-02-01"],
+            "br": ["05/01/2024", "31/12/2023"],
+            "hora": ["2024-01-05 10:30:00", "2024-01-06 00:00:00"],
+            "nativa": [datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 2)],
+        })
+        assert sql_types(df) == {"iso": "DATE", "br": "DATE", "hora": "DATETIME", "nativa": "DATE"}
+
+    def test_text_width_and_mixed_columns(self):
+        """Texto usa o maior tamanho visto; mistura de número e texto vira texto"""
+        first = pd.DataFrame({"nome": ["ana", "bo"], "misto": ["1", "2"]})
+        later = pd.DataFrame({"nome": ["a" * 300, None], "misto": ["x", "3"]})
+        assert sql_types(first) == {"nome": "VARCHAR(3)", "misto": "TINYINT"}
+        assert sql_types(first, later) == {"nome": "TEXT", "misto": "VARCHAR(1)"}
+
+    def test_leading_zero_codes_stay_text(self):
+        """Códigos com zero à esquerda não viram número (perderiam os zeros)"""
+        df = pd.DataFrame({"cep": ["01234", "12345"], "sku": ["007", "10"], "saldo": ["-0.5", "0"]})
+        assert sql_types(df) == {"cep": "VARCHAR(5)", "sku": "VARCHAR(3)", "saldo": "DECIMAL(2,1)"}
+        assert chunk_to_rows(df, infer_column_types([df]))[0][:2] == ("01234", "007")
+
+    def test_booleans_and_empty_columns(self):
+        df = pd.DataFrame({"ativo": [True, False, None], "vazia": [None, None, None]})
+        assert sql_types(df) == {"ativo": "BOOLEAN", "vazia": "VARCHAR(255)"}
+
+
+class TestChunkToRows:
+    """Testes para a conversão dos valores para os tipos inferidos"""
+
+    def test_converts_to_native_python_values(self):
+        df = pd.DataFrame({
+            "codigo": ["10", "nan", " 30"],
+            "data": ["05/01/2024", "", "31/12/2023"],
+            "nome": ["ana", None, "bo"],
+        })
+        rows = chunk_to_rows(df, infer_column_types([df]))
+        assert rows == [
+            (10, datetime.date(2024, 1, 5), "ana"),
+            (None, None, None),
+            (30, datetime.date(2023, 12, 31), "bo"),
+        ]
+        assert type(rows[0][0]) is int
+
+    def test_large_integers_keep_precision(self):
+        df = pd.DataFrame({"id": ["9007199254740993", None]})
+        assert chunk_to_rows(df, infer_column_types([df])) == [(9007199254740993,), (None,)]
+
+    def test_wide_decimals_keep_every_digit(self):
+        df = pd.DataFrame({"valor": ["123456789012345678.12", None, "0.50"]})
+        profiles = infer_column_types([df])
+        assert profiles[0].sql_type() == "DECIMAL(20,2)"
+        assert chunk_to_rows(df, profiles) == [(Decimal("123456789012345678.12"),), (None,), (Decimal("0.50"),)]
+
+    def test_without_profiles_only_normalizes_nulls(self):
+        df = pd.DataFrame({"valor": [1.5, float("nan")], "nome": ["NaN", "ana"]})
+        rows = chunk_to_rows(df)
+        assert rows == [(1.5, None), (None, "ana")]
+        assert type(rows[0][0]) is float
+
+
+class TestWidenSqlType:
+    """Testes para o tipo das colunas existentes em append/upsert"""
+
+    def test_text_grows_to_the_longest(self):
+        assert widen_sql_type("varchar(5)", "VARCHAR(20)") == "VARCHAR(20)"
+        assert widen_sql_type("varchar(200)", "TEXT") == "TEXT"
+        assert widen_sql_type("text", "MEDIUMTEXT") == "MEDIUMTEXT"
+        assert widen_sql_type("varchar(20)", "VARCHAR(5)") is None
+
+    def test_numbers_grow_without_losing_digits(self):
+        assert widen_sql_type("tinyint(4)", "INT") == "INT"
+        assert widen_sql_type("int(11)", "DECIMAL(4,2)") == "DECIMAL(12,2)"
+        assert widen_sql_type("tinyint(1)", "BOOLEAN") is None
+
+    def test_mixed_families_become_text(self):
+        assert widen_sql_type("int(11)", "VARCHAR(3)") == "VARCHAR(11)"
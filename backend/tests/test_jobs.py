@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from app.jobs import ImportJob, ImportJobManager
+
+
+async def fake_import(rows, job=None, fail=False):
+    """Import falso que reporta progresso a partir de uma thread, como o import real"""
+    def work():
+        job.update(estimated_rows=rows, phase="inserting")
+        for done in range(100, rows + 1, 100):
+            job.update(rows_parsed=done, rows_inserted=done)
+        if fail:
+            raise ValueError("planilha inválida")
+        return {"rows_imported": rows}
+
+    return await asyncio.get_running_loop().run_in_executor(None, work)
+
+
+class TestImportJobManager:
+    """Testes para os imports em segundo plano"""
+
+    def test_job_completes_with_result(self):
+        async def main():
+            manager = ImportJobManager(max_concurrent=1)
+            job = manager.create("dados.xlsx", owner="ana")
+            assert job.snapshot()["status"] == "queued"
+            await manager.submit(job, fake_import, 500)
+            return manager, job
+
+        manager, job = asyncio.run(main())
+        snapshot = job.snapshot()
+        assert snapshot["status"] == "completed"
+        assert snapshot["rows_inserted"] == 500
+        assert snapshot["progress"] == 1.0
+        assert snapshot["rows_per_second"] > 0
+        assert snapshot["eta_seconds"] is None
+        assert snapshot["result"] == {"rows_imported": 500}
+        assert manager.get(job.id) is job
+
+    def test_job_failure_is_recorded(self):
+        async def main():
+            manager = ImportJobManager()
+            job = manager.create("dados.xlsx")
+            await manager.submit(job, fake_import, 200, fail=True)
+            return job
+
+        snapshot = asyncio.run(main()).snapshot()
+        assert snapshot["status"] == "failed"
+        assert snapshot["error"] == "planilha inválida"
+
+    def test_concurrency_is_bounded(self):
+        """Acima do limite, os jobs esperam na fila"""
+        async def main():
+            manager = ImportJobManager(max_concurrent=1)
+            release = asyncio.Event()
+
+            async def blocking(job=None):
+                await release.wait()
+                return {}
+
+            first, second = manager.create("a.xlsx"), manager.create("b.xlsx")
+            tasks = [manager.submit(first, blocking), manager.submit(second, blocking)]
+            await asyncio.sleep(0.01)
+            statuses = (first.status, second.status)
+            release.set()
+            await asyncio.gather(*tasks)
+            return statuses, (first.status, second.status)
+
+        during, after = asyncio.run(main())
+        assert during == ("running", "queued")
+        assert after == ("completed", "completed")
+
+    def test_subscribers_are_notified(self):
+        """Ouvintes recebem aviso das atualizações feitas em outra thread"""
+        async def main():
+            manager = ImportJobManager()
+            job = manager.create("dados.xlsx")
+            event = job.subscribe()
+            event.clear()
+            await manager.submit(job, fake_import, 100)
+            await asyncio.sleep(0)
+            return event.is_set()
+
+        assert asyncio.run(main())
+
+
+class TestImportJobSnapshot:
+    def test_eta_from_insert_rate(self):
+        job = ImportJob("dados.xlsx")
+        job.update(status="running", estimated_rows=1000, phase="inserting")
+        job._insert_started -= 1.0  # Um segundo inserindo
+        job.update(rows_inserted=250)
+        snapshot = job.snapshot()
+        assert snapshot["progress"] == 0.25
+        assert 200 <= snapshot["rows_per_second"] <= 250
+        assert snapshot["eta_seconds"] == pytest.approx(750 / snapshot["rows_per_second"], rel=0.01)
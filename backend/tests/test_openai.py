@@ -0,0 +1,221 @@
+import asyncio
+import time
+import pytest
+from app import llm
+from app.controllers import openai as openai_controller
+
+CONTEXT = {"tables": {"datasheet_vendas": {"columns": ["id", "valor"], "total_rows": 2, "preview": []}}}
+SQL_RESULT = {
+    "query": "SELECT SUM(`valor`) AS total FROM `datasheet_vendas`",
+    "tables_used": ["datasheet_vendas"],
+    "error": None,
+}
+# Humanização real (o fixture pipeline a substitui por uma falsa)
+REAL_HUMANIZE = openai_controller.humanize_query_results
+# Duração simulada de cada etapa lenta
+STAGE_SECONDS = 0.2
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """generate_answer com modelo e banco falsos; registra o que foi chamado"""
+    calls = {"stored": [], "events": []}
+
+    async def fake_generate(question, database_context):
+        return dict(SQL_RESULT)
+
+    async def fake_explain(sql_query):
+        await asyncio.sleep(STAGE_SECONDS)
+        return "Soma o valor das vendas"
+
+    def fake_execute(sql_query, tables=None):
+        time.sleep(STAGE_SECONDS)  # Bloqueante, como o cursor do MySQL
+        if "falha" in calls:
+            raise RuntimeError("Unknown column")
+        return [{"total": 42}], False, False
+
+    async def fake_humanize(user_question, sql_query, results, database_context=None, on_token=None, truncated=False):
+        return "O total é 42"
+
+    monkeypatch.setattr(openai_controller, "get_database_context", lambda: (["datasheet_vendas"], CONTEXT, True))
+    monkeypatch.setattr(openai_controller, "get_cached_sql", lambda question: None)
+    monkeypatch.setattr(
+        openai_controller, "store_cached_sql",
+        lambda question, sql_result, llm_seconds: calls["stored"].append(sql_result)
+    )
+    monkeypatch.setattr(openai_controller, "generate_sql_query", fake_generate)
+    monkeypatch.setattr(openai_controller, "explain_sql_query", fake_explain)
+    monkeypatch.setattr(openai_controller, "execute_sql_query", fake_execute)
+    monkeypatch.setattr(openai_controller, "humanize_query_results", fake_humanize)
+    return calls
+
+
+async def _answer(calls, question="Total de vendas?"):
+    async def progress(event_type, data):
+        calls["events"].append(event_type)
+
+    return await openai_controller.generate_answer(question, progress_callback=progress)
+
+
+class TestConcurrentExplanation:
+    """Testes para a explicação do SQL gerada em paralelo com a execução"""
+
+    def test_explanation_overlaps_execution(self, pipeline):
+        start = time.perf_counter()
+        result = asyncio.run(_answer(pipeline))
+        elapsed = time.perf_counter() - start
+
+        assert result["success"] is True
+        assert result["sql_explanation"] == "Soma o valor das vendas"
+        # Em sequência seriam 2 etapas; em paralelo, pouco mais de uma
+        assert elapsed < STAGE_SECONDS * 1.75
+        # O cache guarda o SQL junto com a explicação
+        assert pipeline["stored"][0]["explanation"] == "Soma o valor das vendas"
+
+    def test_progress_events_order(self, pipeline):
+        asyncio.run(_answer(pipeline))
+        events = pipeline["events"]
+
+        assert events.index("sql_generated") < events.index("executing_sql") < events.index("sql_executed")
+        assert events.index("sql_generated") < events.index("sql_explained")
+        assert events.index("sql_executed") < events.index("humanizing")
+        assert events.count("sql_explained") == 1
+
+    def test_execution_error_cancels_explanation(self, pipeline):
+        pipeline["falha"] = True
+        result = asyncio.run(_answer(pipeline))
+
+        assert result["success"] is False
+        assert result["error_type"] == "execution"
+        assert result["sql_explanation"] is None
+        assert pipeline["stored"] == []
+
+
+class FakeCompletions:
+    """chat.completions assíncrono que demora STAGE_SECONDS e registra os parâmetros"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(STAGE_SECONDS)
+        message = type("Message", (), {"content": "SELECT COUNT(*) FROM `datasheet_vendas`"})()
+        return type("Response", (), {"choices": [type("Choice", (), {"message": message})()]})()
+
+
+class FakeLLMClient:
+    def __init__(self):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions()
+
+
+class TestAsyncLLMClient:
+    """Testes para as chamadas ao modelo pelo cliente assíncrono compartilhado"""
+
+    def test_concurrent_calls_do_not_block_each_other(self, monkeypatch):
+        fake = FakeLLMClient()
+        monkeypatch.setattr(openai_controller, "get_llm_client", lambda: fake)
+
+        async def run_many():
+            return await asyncio.gather(*[
+                openai_controller.generate_sql_query(f"pergunta {i}", CONTEXT) for i in range(10)
+            ])
+
+        start = time.perf_counter()
+        results = asyncio.run(run_many())
+        elapsed = time.perf_counter() - start
+
+        assert all(result["error"] is None for result in results)
+        # Cada chamada só espera a própria latência
+        assert elapsed < STAGE_SECONDS * 3
+        assert all(call["timeout"] == openai_controller.OPENAI_TIMEOUT for call in fake.chat.completions.calls)
+
+    def test_explanation_uses_its_own_timeout(self, monkeypatch):
+        fake = FakeLLMClient()
+        monkeypatch.setattr(openai_controller, "get_llm_client", lambda: fake)
+
+        asyncio.run(openai_controller.explain_sql_query(SQL_RESULT["query"]))
+
+        assert fake.chat.completions.calls[0]["timeout"] == openai_controller.OPENAI_EXPLAIN_TIMEOUT
+
+    def test_cancellation_reaches_model_call(self, monkeypatch):
+        fake = FakeLLMClient()
+        monkeypatch.setattr(openai_controller, "get_llm_client", lambda: fake)
+
+        async def cancel_midway():
+            task = asyncio.create_task(openai_controller.humanize_query_results("Total?", "SELECT 1", [{"total": 1}]))
+            await asyncio.sleep(STAGE_SECONDS / 4)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_midway())
+
+    def test_client_is_shared_until_closed(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")  # O cliente exige a chave ao ser criado
+        first = llm.get_llm_client()
+        assert llm.get_llm_client() is first
+        asyncio.run(llm.close_llm_client())
+        assert llm.get_llm_client() is not first
+        asyncio.run(llm.close_llm_client())
+
+
+class FakeStream:
+    """Resposta em streaming: um chunk por trecho, com uma pausa entre eles"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    async def __aiter__(self):
+        for token in self.tokens:
+            await asyncio.sleep(STAGE_SECONDS / len(self.tokens))
+            delta = type("Delta", (), {"content": token})()
+            yield type("Chunk", (), {"choices": [type("Choice", (), {"delta": delta})()]})()
+
+
+class FakeStreamingCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        if not kwargs.get("stream"):
+            return await super().create(**kwargs)
+        self.calls.append(kwargs)
+        return FakeStream(["O total ", "de vendas ", "é 42."])
+
+
+class TestAnswerStreaming:
+    """Testes para a resposta humanizada enviada em trechos (answer_token)"""
+
+    def test_tokens_stream_before_final_response(self, pipeline, monkeypatch):
+        fake = FakeLLMClient()
+        fake.chat.completions = FakeStreamingCompletions()
+        monkeypatch.setattr(openai_controller, "get_llm_client", lambda: fake)
+        monkeypatch.setattr(openai_controller, "humanize_query_results", REAL_HUMANIZE)
+        tokens = []
+        first_token_at = []
+        start = time.perf_counter()
+
+        async def progress(event_type, data):
+            pipeline["events"].append(event_type)
+            if event_type == "answer_token":
+                first_token_at.append(time.perf_counter() - start)
+                tokens.append(data["token"])
+
+        result = asyncio.run(openai_controller.generate_answer("Total de vendas?", progress_callback=progress))
+
+        assert tokens == ["O total ", "de vendas ", "é 42."]
+        assert result["humanized_response"] == "O total de vendas é 42."
+        assert result["prompt_tokens"]["humanize"] > 0
+        events = pipeline["events"]
+        assert events.index("humanizing") < events.index("answer_token")
+        # O primeiro trecho chega bem antes do fim da resposta
+        assert first_token_at[0] < first_token_at[-1]
+
+    def test_without_callback_answer_is_not_streamed(self, monkeypatch):
+        fake = FakeLLMClient()
+        fake.chat.completions = FakeStreamingCompletions()
+        monkeypatch.setattr(openai_controller, "get_llm_client", lambda: fake)
+
+        answer = asyncio.run(openai_controller.humanize_query_results("Total?", "SELECT 1", [{"total": 1}]))
+
+        assert answer == "SELECT COUNT(*) FROM `datasheet_vendas`"
+        assert fake.chat.completions.calls[0]["stream"] is False
@@ -0,0 +1,96 @@
+import asyncio
+from app import prompt_budget
+
+
+class TestCountTokens:
+    """Testes para a contagem de tokens"""
+
+    def test_fallback_estimates_four_chars_per_token(self, monkeypatch):
+        monkeypatch.setattr(prompt_budget, "_encoding", None)
+        monkeypatch.setattr(prompt_budget, "_encoding_loaded", True)
+        assert prompt_budget.count_tokens("a" * 10) == 3
+        assert prompt_budget.tokens_are_estimated() is True
+
+
+class TestDescribeTables:
+    """Testes para o contexto das tabelas dentro do orçamento"""
+
+    def wide_context(self, tables: int) -> dict:
+        preview = [{"descricao": "x" * 2000, "vazia": None, "id": 1}] * 2
+        return {
+            f"datasheet_t{i}": {"columns": ["id", "descricao", "vazia"], "total_rows": 10, "preview": preview}
+            for i in range(tables)
+        }
+
+    def test_long_values_are_cut_and_empty_columns_dropped(self):
+        text, info = prompt_budget.describe_tables(self.wide_context(1), max_tokens=10000)
+        assert info["preview_rows"] == 2
+        assert "x" * (prompt_budget.PROMPT_CELL_MAX_CHARS + 1) not in text
+        assert "'vazia'" not in text
+
+    def test_preview_is_reduced_before_tables_are_omitted(self):
+        full, _ = prompt_budget.describe_tables(self.wide_context(3), max_tokens=100000)
+        limit = prompt_budget.count_tokens(full) - 1
+        _, info = prompt_budget.describe_tables(self.wide_context(3), max_tokens=limit)
+        assert info["preview_rows"] == 1
+        assert info["tables_omitted"] == 0
+
+    def test_tables_beyond_budget_are_omitted(self):
+        text, info = prompt_budget.describe_tables(self.wide_context(200), max_tokens=500)
+        assert info["tokens"] <= 520
+        assert info["tables_omitted"] > 0
+        assert "datasheet_t0" in text  # As primeiras (mais relevantes) ficam
+
+
+class TestSummarizeResults:
+    """Testes para os resultados da query dentro do orçamento"""
+
+    def test_small_results_are_sent_whole(self):
+        rows = [{"categoria": "A", "total": 10}, {"categoria": "B", "total": 20}]
+        text, info = prompt_budget.summarize_results(rows)
+        assert info == {"tokens": info["tokens"], "rows_included": 2, "rows_total": 2}
+        assert text.splitlines() == ["categoria | total", "A | 10", "B | 20"]
+
+    def test_constant_and_empty_columns_are_factored_out(self):
+        rows = [{"loja": "Centro", "obs": None, "valor": i} for i in range(3)]
+        text, _ = prompt_budget.summarize_results(rows)
+        assert "Valor igual em todas as linhas: loja=Centro" in text
+        assert "Colunas sem valor: obs" in text
+        assert text.splitlines()[2] == "valor"
+
+    def test_overflow_becomes_numeric_summary(self):
+        rows = [{"id": i, "nome": f"cliente {i}", "valor": i * 2} for i in range(1000)]
+        text, info = prompt_budget.summarize_results(rows, max_tokens=400)
+        assert info["tokens"] <= 400
+        assert 0 < info["rows_included"] < 1000
+        assert "valor: mín=0, máx=1998" in text
+
+    def test_wide_results_stay_within_budget(self):
+        """Resultado largo (ex.: JOIN de muitas tabelas): cabeçalho e resumo também contam"""
+        rows = [{f"indicador_financeiro_{c}": r * (c + 1) + 0.5 for c in range(300)} for r in range(200)]
+        text, info = prompt_budget.summarize_results(rows, max_tokens=3000)
+        assert info["tokens"] <= 3000
+        assert info["rows_included"] > 0
+        lines = text.splitlines()
+        assert lines[0].startswith("Colunas omitidas por limite de tamanho do prompt: ")
+        assert lines[1].startswith("indicador_financeiro_0 | indicador_financeiro_1 |")
+
+
+class TestPromptReport:
+    """Testes para o registro dos tamanhos de prompt por pergunta"""
+
+    def test_report_collects_stages_of_current_question(self):
+        async def question():
+            report = prompt_budget.start_prompt_report()
+            prompt_budget.record_prompt("sql", [{"role": "user", "content": "a" * 40}])
+            # Etapas em tasks paralelas (explicação) registram no mesmo relatório
+            await asyncio.create_task(_record_explain())
+            return prompt_budget.prompt_report_summary(report)
+
+        async def _record_explain():
+            prompt_budget.record_prompt("explain", [{"role": "user", "content": "b" * 8}])
+
+        summary = asyncio.run(question())
+        assert set(summary) == {"sql", "explain", "total", "estimated"}
+        assert summary["total"] == summary["sql"] + summary["explain"]
+        assert prompt_budget.get_prompt_stats()["stages"]["sql"]["calls"] >= 1
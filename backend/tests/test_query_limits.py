@@ -0,0 +1,99 @@
+import pytest
+from mysql.connector import Error
+from app import query_limits
+from app.controllers import openai as openai_controller
+
+
+class TestCapLimit:
+    """Testes para o LIMIT injetado ou reduzido na query"""
+
+    def test_missing_limit_is_appended_on_new_line(self):
+        sql = "SELECT * FROM `datasheet_vendas` -- todas;"
+        assert query_limits.cap_limit(sql, 1001) == "SELECT * FROM `datasheet_vendas` -- todas\nLIMIT 1001"
+        assert query_limits.cap_limit("SELECT 1;", 10) == "SELECT 1\nLIMIT 10"
+
+    @pytest.mark.parametrize("sql, expected", [
+        ("SELECT a FROM t LIMIT 5000", "SELECT a FROM t LIMIT 1001"),
+        ("SELECT a FROM t LIMIT 20, 5000", "SELECT a FROM t LIMIT 20, 1001"),
+        ("SELECT a FROM t LIMIT 5000 OFFSET 20", "SELECT a FROM t LIMIT 1001 OFFSET 20"),
+        ("SELECT a FROM t ORDER BY a LIMIT 10", "SELECT a FROM t ORDER BY a LIMIT 10"),
+    ])
+    def test_outer_limit_is_reduced(self, sql, expected):
+        assert query_limits.cap_limit(sql, 1001) == expected
+
+    def test_subquery_limit_is_not_the_outer_limit(self):
+        sql = "SELECT * FROM (SELECT a FROM t LIMIT 5) x CROSS JOIN `datasheet_b`"
+        assert query_limits.cap_limit(sql, 100) == sql + "\nLIMIT 100"
+
+    @pytest.mark.parametrize("sql", [
+        "SELECT * FROM t -- limit results",
+        "SELECT * FROM t /* LIMIT 3 */",
+        "SELECT * FROM t # LIMIT 3",
+    ])
+    def test_limit_inside_comment_is_ignored(self, sql):
+        assert query_limits.cap_limit(sql, 100) == sql + "\nLIMIT 100"
+
+    def test_comment_between_limit_and_count(self):
+        sql = "SELECT a FROM t LIMIT /* máx */ 5000"
+        assert query_limits.cap_limit(sql, 100) == "SELECT a FROM t LIMIT /* máx */ 100"
+
+    def test_statement_timeout_prefix(self):
+        assert query_limits.with_statement_timeout("SELECT 1", 30) == \
+            "SET STATEMENT max_statement_time=30 FOR SELECT 1"
+        assert query_limits.with_statement_timeout("SELECT 1", 0) == "SELECT 1"
+
+
+class BigCursor:
+    """Cursor falso com muitas linhas, lidas só via fetchmany"""
+
+    def __init__(self, total_rows, error=None):
+        self.remaining = total_rows
+        self.error = error
+        self.statements = []
+        self.fetched = 0
+
+    def execute(self, query, params=None):
+        if self.error:
+            raise self.error
+        self.statements.append(query)
+
+    def fetchmany(self, size):
+        size = min(size, self.remaining)
+        self.remaining -= size
+        self.fetched += size
+        return [{"id": i} for i in range(size)]
+
+    def fetchall(self):
+        raise AssertionError("fetchall não deve ser usado")
+
+    def close(self):
+        pass
+
+
+class TestRunLimitedQuery:
+    """Testes para a execução com teto de linhas e de tempo"""
+
+    def test_fetch_stops_one_row_past_the_cap(self):
+        cursor = BigCursor(1_000_000)
+        rows = query_limits.run_limited_query(cursor, "SELECT * FROM a CROSS JOIN b", max_rows=1000)
+        assert len(rows) == 1001
+        assert cursor.fetched == 1001
+        assert cursor.statements[0].startswith("SET STATEMENT max_statement_time=")
+        assert cursor.statements[0].endswith("LIMIT 1001")
+
+    def test_statement_timeout_is_reported(self):
+        cursor = BigCursor(0, error=Error(msg="Query execution was interrupted", errno=1969))
+        with pytest.raises(query_limits.QueryTimeoutError):
+            query_limits.run_limited_query(cursor, "SELECT 1")
+
+    def test_execute_sql_query_flags_truncation(self, monkeypatch):
+        cursor = BigCursor(5000)
+        connection = type("Connection", (), {"cursor": lambda self, dictionary=False: cursor})()
+        monkeypatch.setattr(openai_controller, "get_db_connection", lambda: connection)
+        monkeypatch.setattr(openai_controller, "close_db_connection", lambda connection, cursor=None: None)
+
+        rows, cached, truncated = openai_controller.execute_sql_query("SELECT id FROM `datasheet_vendas`")
+
+        assert len(rows) == query_limits.QUERY_MAX_ROWS
+        assert cached is False
+        assert truncated is True
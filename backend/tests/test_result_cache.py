@@ -0,0 +1,95 @@
+import pytest
+from app import result_cache
+from app.cache import LRUCache
+from app.controllers import openai as openai_controller
+
+
+class ResultCursor:
+    """Cursor falso que conta as execuções da query e devolve as versões das tabelas"""
+
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+
+    def execute(self, query, params=None):
+        if query.startswith("SELECT scope, version"):
+            self._result = [{"scope": t, "version": self.db["versions"][t]} for t in params if t in self.db["versions"]]
+        else:
+            self.db["executions"] += 1
+            self._result = [{"categoria": "a", "total": 10}, {"categoria": "b", "total": 5}]
+
+    def fetchall(self):
+        return list(self._result)
+
+    def fetchmany(self, size):
+        batch, self._result = self._result[:size], self._result[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class ResultConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return ResultCursor(self.db)
+
+
+@pytest.fixture
+def result_db(monkeypatch):
+    db = {"executions": 0, "versions": {"datasheet_vendas": 1}}
+    monkeypatch.setattr(openai_controller, "get_db_connection", lambda: ResultConnection(db))
+    monkeypatch.setattr(openai_controller, "close_db_connection", lambda connection, cursor=None: None)
+    monkeypatch.setattr(result_cache, "_results", LRUCache(max_entries=10, ttl=60, max_bytes=1024 * 1024))
+    return db
+
+
+QUERY = "SELECT categoria, SUM(valor) AS total FROM `datasheet_vendas` GROUP BY categoria"
+
+
+class TestCanonicalizeSQL:
+    """Testes para a chave canônica das queries"""
+
+    def test_formatting_differences_share_key(self):
+        other = "select  categoria,SUM(`valor`) as total\nFROM datasheet_vendas -- por categoria\nGROUP BY `categoria`;"
+        assert result_cache.canonicalize_sql(other) == result_cache.canonicalize_sql(QUERY)
+        assert result_cache.canonicalize_sql(QUERY.replace("SUM", "AVG")) != result_cache.canonicalize_sql(QUERY)
+
+    def test_literals_are_preserved(self):
+        assert result_cache.canonicalize_sql("SELECT 1 FROM t WHERE x = 'Ana'") != \
+            result_cache.canonicalize_sql("SELECT 1 FROM t WHERE x = 'ana'")
+
+    def test_dependencies_and_nondeterministic_queries(self):
+        sql = "SELECT v.id FROM datasheet_vendas v JOIN `datasheet_clientes` c ON datasheet_vendas.id = c.id"
+        known = ["datasheet_clientes", "datasheet_vendas", "datasheet_outras"]
+        assert result_cache.referenced_tables(sql, known) == ["datasheet_vendas", "datasheet_clientes"]
+        assert result_cache.is_cacheable(QUERY)
+        assert not result_cache.is_cacheable("SELECT * FROM datasheet_vendas WHERE data > CURDATE()")
+
+
+class TestExecuteWithResultCache:
+    """Testes para o cache de resultados em execute_sql_query"""
+
+    def test_repeated_query_served_from_cache(self, result_db):
+        rows, cached, _ = openai_controller.execute_sql_query(QUERY, ["datasheet_vendas"])
+        assert cached is False
+        again, cached, _ = openai_controller.execute_sql_query(QUERY.lower().replace("from", "FROM"), ["datasheet_vendas"])
+        assert cached is True
+        assert again == rows
+        assert result_db["executions"] == 1
+
+    def test_reimported_table_invalidates_result(self, result_db):
+        openai_controller.execute_sql_query(QUERY, ["datasheet_vendas"])
+        result_db["versions"]["datasheet_vendas"] = 2
+        _, cached, _ = openai_controller.execute_sql_query(QUERY, ["datasheet_vendas"])
+        assert cached is False
+        assert result_db["executions"] == 2
+        assert result_cache.get_result_cache_stats()["stale"] >= 1
+
+    def test_query_without_known_tables_not_cached(self, result_db):
+        openai_controller.execute_sql_query(QUERY)
+        _, cached, _ = openai_controller.execute_sql_query(QUERY)
+        assert cached is False
+        assert result_db["executions"] == 2
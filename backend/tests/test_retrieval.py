@@ -0,0 +1,92 @@
+import asyncio
+from app import retrieval
+from app.controllers import openai as openai_controller
+
+
+def make_context(extra_tables: int = 20) -> dict:
+    tables = {
+        "datasheet_vendas_2024": {
+            "columns": ["id_venda", "id_cliente", "valor_total", "data_venda"],
+            "preview": [{"id_venda": 1, "id_cliente": 7, "valor_total": 10.5, "data_venda": "2024-03-01"}],
+        },
+        "datasheet_clientes": {
+            "columns": ["id_cliente", "nome", "cidade"],
+            "preview": [{"id_cliente": 7, "nome": "Ana", "cidade": "Recife"}],
+        },
+        "datasheet_estoque": {
+            "columns": ["sku", "produto", "quantidade"],
+            "preview": [{"sku": "A1", "produto": "Caneta azul", "quantidade": 3}],
+        },
+    }
+    for i in range(extra_tables):
+        tables[f"datasheet_planilha_{i}"] = {"columns": [f"campo_{i}", "observacao"], "preview": []}
+    return {"tables": tables}
+
+
+class TestTextTerms:
+    """Testes para a normalização dos termos de busca"""
+
+    def test_terms_ignore_accents_plural_and_stopwords(self):
+        assert retrieval.text_terms("Quantas vendas por Região?") == ["venda", "regiao"]
+        assert retrieval.text_terms("valor_total") == ["valor", "total"]
+
+
+class TestTableRanking:
+    """Testes para a escolha das tabelas relevantes (BM25)"""
+
+    def test_question_ranks_matching_tables_first(self):
+        context = make_context()
+        ranked = retrieval.rank_tables("Qual o valor total das vendas por cliente?", context)
+        assert ranked[0] == "datasheet_vendas_2024"
+        assert ranked[1] == "datasheet_clientes"
+
+    def test_preview_values_are_searchable(self):
+        ranked = retrieval.rank_tables("Quantas canetas temos?", make_context())
+        assert ranked[0] == "datasheet_estoque"
+
+    def test_small_schemas_send_every_table(self):
+        context = make_context(extra_tables=0)
+        assert retrieval.select_tables("vendas", context, top_k=8) == list(context["tables"])
+
+    def test_selection_is_limited_to_top_k(self):
+        selected = retrieval.select_tables("valor das vendas", make_context(), top_k=3)
+        assert len(selected) == 3
+        assert selected[0] == "datasheet_vendas_2024"
+
+    def test_index_is_reused_for_the_same_context(self):
+        context = make_context()
+        assert retrieval.get_table_index(context) is retrieval.get_table_index(context)
+        assert retrieval.get_table_index(make_context()) is not retrieval.get_table_index(context)
+
+
+class TestWidening:
+    """Testes para a ampliação quando o SQL cita tabelas fora da seleção"""
+
+    def test_unknown_tables_in_sql(self):
+        sql = "SELECT c.nome FROM `datasheet_vendas_2024` v JOIN `datasheet_clientes` c ON v.id_cliente = c.id_cliente"
+        assert retrieval.unknown_tables(sql, ["datasheet_vendas_2024"]) == ["datasheet_clientes"]
+        assert retrieval.unknown_tables(sql, ["datasheet_vendas_2024", "datasheet_clientes"]) == []
+
+    def test_generation_is_retried_with_wider_context(self, monkeypatch):
+        context = make_context()
+        prompts = []
+
+        async def fake_generate(question, database_context):
+            tables = list(database_context["tables"])
+            prompts.append(tables)
+            # O modelo "adivinha" a tabela de clientes, que não estava no prompt
+            return {
+                "query": "SELECT * FROM `datasheet_vendas_2024` JOIN `datasheet_clientes` USING (`id_cliente`)",
+                "tables_used": tables,
+                "error": None,
+            }
+
+        monkeypatch.setattr(openai_controller, "generate_sql_query", fake_generate)
+        monkeypatch.setattr(retrieval, "TABLE_RETRIEVAL_TOP_K", 1)
+
+        result, info = asyncio.run(openai_controller.generate_sql_with_retrieval("valor das vendas", context))
+
+        assert prompts[0] == ["datasheet_vendas_2024"]
+        assert "datasheet_clientes" in prompts[1]
+        assert info == {"candidates": 23, "selected": len(prompts[1]), "widened": True}
+        assert result["error"] is None
@@ -0,0 +1,149 @@
+import pytest
+from app import schema
+
+
+class FakeCursor:
+    """Cursor falso que simula um banco com uma versão de schema e tabelas"""
+
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+
+    def execute(self, query, params=None):
+        self.db["queries"].append(query.strip())
+        q = " ".join(query.split()).upper()
+        datasheets = [t for t in self.db["tables"] if t.startswith("datasheet_")]
+        if q.startswith("SELECT VERSION FROM"):
+            self._result = [{"version": self.db["version"]}]
+        elif "INFORMATION_SCHEMA.COLUMNS" in q:
+            self._result = [{"table_name": t, "column_name": c} for t in datasheets for c in ("id", "nome")]
+        elif "INFORMATION_SCHEMA.TABLES" in q:
+            self._result = [{"table_name": t, "estimated_rows": 7, "row_count": self.db["stats"].get(t)}
+                            for t in datasheets]
+        elif "JSON_OBJECT" in q:
+            self._result = [{"table_name": t, "row_json": '{"id": 1, "nome": "a"}'}
+                            for t in params if t in datasheets]
+        elif "COUNT(*) AS ROW_COUNT" in q:
+            self._result = [{"table_name": t, "row_count": 2} for t in params]
+        elif q.startswith("SELECT ROW_COUNT FROM `TABLE_STATS`"):
+            stored = self.db["stats"].get(params[0])
+            self._result = [{"row_count": stored}] if stored is not None else []
+        elif q.startswith("SELECT COUNT(*) AS TOTAL FROM"):
+            self._result = [{"total": self.db["rows"][query.split("`")[1]]}]
+        elif q.startswith("INSERT INTO `TABLE_STATS`"):
+            table, rows = params
+            if "ROW_COUNT + VALUES" in q:
+                rows += self.db["stats"].get(table, 0)
+            self.db["stats"][table] = rows
+            self._result = []
+        elif q.startswith("INSERT INTO `SCHEMA_VERSIONS`"):
+            self.db["version"] += 1
+            self._result = []
+        else:
+            self._result = []
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.db)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = {"version": 1, "tables": ["datasheet_vendas", "users"], "stats": {"datasheet_vendas": 2}, "queries": []}
+    monkeypatch.setattr(schema, "get_db_connection", lambda: FakeConnection(db))
+    schema.invalidate_context_cache()
+    yield db
+    schema.invalidate_context_cache()
+
+
+class TestDatabaseContextCache:
+    """Testes para o cache de contexto versionado"""
+
+    def test_cold_build_filters_datasheet_tables(self, fake_db):
+        """Primeira chamada monta o contexto apenas com tabelas datasheet_"""
+        tables, context, cached = schema.get_database_context()
+        assert cached is False
+        assert tables == ["datasheet_vendas"]
+        assert context["tables"]["datasheet_vendas"]["total_rows"] == 2
+        assert context["tables"]["datasheet_vendas"]["preview"] == [{"id": 1, "nome": "a"}]
+
+    def test_warm_hit_skips_introspection(self, fake_db):
+        """Com a versão inalterada, só a versão é consultada"""
+        schema.get_database_context()
+        fake_db["queries"].clear()
+        tables, _, cached = schema.get_database_context()
+        assert cached is True
+        assert tables == ["datasheet_vendas"]
+        assert not any("INFORMATION_SCHEMA" in q.upper() or "JSON_OBJECT" in q.upper()
+                       for q in fake_db["queries"])
+
+    def test_version_change_rebuilds(self, fake_db):
+        """Mudança de versão (ex.: import em outro processo) força remontagem"""
+        schema.get_database_context()
+        fake_db["version"] += 1
+        fake_db["tables"].append("datasheet_produtos")
+        tables, _, cached = schema.get_database_context()
+        assert cached is False
+        assert "datasheet_produtos" in tables
+
+    def test_bump_invalidates_local_cache(self, fake_db):
+        """bump_schema_version incrementa a versão e limpa o cache local"""
+        schema.get_database_context()
+        schema.bump_schema_version(FakeCursor(fake_db), ["datasheet_vendas"])
+        assert fake_db["version"] == 3  # escopo global + tabela
+        _, _, cached = schema.get_database_context()
+        assert cached is False
+
+
+class TestBulkIntrospection:
+    """Testes para a introspecção em lote do schema"""
+
+    def test_round_trips_do_not_grow_with_tables(self, fake_db):
+        """Colunas, contagens e previews de muitas tabelas em poucas queries"""
+        fake_db["tables"] = [f"datasheet_t{i}" for i in range(40)]
+        context = schema.build_database_context(FakeCursor(fake_db))
+        assert len(context["tables"]) == 40
+        # 1 (colunas) + 1 (contagens) + 2 lotes de preview (25 tabelas por lote)
+        assert len(fake_db["queries"]) == 4
+
+    def test_counts_prefer_stored_metadata(self, fake_db):
+        """Contagem gravada pelo import tem prioridade sobre a estimativa"""
+        fake_db["tables"].append("datasheet_novo")
+        counts = schema.fetch_row_counts(FakeCursor(fake_db), ["datasheet_vendas", "datasheet_novo"])
+        assert counts["datasheet_vendas"] == {"total_rows": 2, "source": "metadata"}
+        assert counts["datasheet_novo"] == {"total_rows": 7, "source": "estimate"}
+
+    def test_exact_counts_opt_in(self, fake_db):
+        """Modo exato usa COUNT(*) (em lote)"""
+        counts = schema.fetch_row_counts(FakeCursor(fake_db), ["datasheet_vendas"], exact=True)
+        assert counts["datasheet_vendas"]["source"] == "exact"
+
+
+class TestRowCountMetadata:
+    """Testes para a contagem de linhas gravada pelo import"""
+
+    def test_increment_adds_to_stored_count(self, fake_db):
+        schema.add_table_row_count(FakeCursor(fake_db), "datasheet_vendas", 3)
+        assert fake_db["stats"]["datasheet_vendas"] == 5
+
+    def test_missing_count_is_seeded_from_the_table(self, fake_db):
+        """Sem contagem gravada, o COUNT(*) (já com as linhas novas) vira a contagem"""
+        fake_db["rows"] = {"datasheet_antiga": 1200}
+        schema.add_table_row_count(FakeCursor(fake_db), "datasheet_antiga", 200)
+        assert fake_db["stats"]["datasheet_antiga"] == 1200
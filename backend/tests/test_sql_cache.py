@@ -0,0 +1,190 @@
+import asyncio
+import json
+import pytest
+from app import sql_cache
+from app.controllers import openai as openai_controller
+
+
+class SQLCacheCursor:
+    """Cursor falso com a tabela sql_cache e as versões das tabelas"""
+
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+
+    def execute(self, query, params=None):
+        q = " ".join(query.split()).upper()
+        rows = self.db["rows"]
+        self._result = []
+        if q.startswith("SELECT SCOPE, VERSION"):
+            self._result = [{"scope": t, "version": self.db["versions"][t]} for t in params if t in self.db["versions"]]
+        elif q.startswith("SELECT SQL_QUERY"):
+            self._result = [dict(rows[params[0]])] if params[0] in rows else []
+        elif q.startswith("INSERT INTO `SQL_CACHE`"):
+            key, question, query_sql, explanation, tables, versions, seconds = params
+            rows[key] = {
+                "sql_query": query_sql, "explanation": explanation, "tables_used": tables,
+                "table_versions": versions, "llm_seconds": seconds, "hits": 0
+            }
+        elif q.startswith("UPDATE `SQL_CACHE` SET HITS"):
+            rows[params[0]]["hits"] += 1
+        elif q.startswith("DELETE FROM `SQL_CACHE` WHERE"):
+            rows.pop(params[0], None)
+        elif q.startswith("SELECT COUNT(*)"):
+            self._result = [{"entries": len(rows)}]
+        elif q.startswith("DELETE FROM `SQL_CACHE` ORDER BY"):
+            self.db["pruned"] = True
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+    def close(self):
+        pass
+
+
+class SQLCacheConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False):
+        return SQLCacheCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def cache_db(monkeypatch):
+    db = {"rows": {}, "versions": {"datasheet_vendas": 3}}
+    monkeypatch.setattr(sql_cache, "get_db_connection", lambda: SQLCacheConnection(db))
+    monkeypatch.setattr(sql_cache, "close_db_connection", lambda connection, cursor=None: None)
+    monkeypatch.setattr(sql_cache, "_memory", sql_cache.LRUCache(max_entries=10))
+    return db
+
+
+SQL_RESULT = {
+    "query": "SELECT COUNT(*) FROM `datasheet_vendas`",
+    "explanation": "Conta as vendas",
+    "tables_used": ["datasheet_vendas"],
+    "error": None,
+}
+
+
+class TestQuestionKey:
+    """Testes para a normalização da pergunta usada como chave"""
+
+    def test_equivalent_questions_share_key(self):
+        key = sql_cache.question_key("Quantas vendas tivemos em março?")
+        assert sql_cache.question_key("  quantas  VENDAS tivemos em marco ") == key
+        assert sql_cache.question_key("Quantas vendas tivemos em abril?") != key
+
+
+class TestSQLCache:
+    """Testes para o cache pergunta -> SQL validado pela versão das tabelas"""
+
+    def test_hit_survives_restart(self, cache_db):
+        sql_cache.store_cached_sql("Total de vendas?", SQL_RESULT, 2.5)
+        # Reinício: a memória esvazia, a entrada continua no banco
+        sql_cache.clear_sql_cache_memory()
+        entry = sql_cache.get_cached_sql("total de vendas")
+        assert entry["query"] == SQL_RESULT["query"]
+        assert entry["explanation"] == "Conta as vendas"
+        assert entry["llm_seconds"] == 2.5
+        assert cache_db["rows"][sql_cache.question_key("total de vendas")]["hits"] == 1
+
+    def test_changed_table_invalidates_entry(self, cache_db):
+        sql_cache.store_cached_sql("Total de vendas?", SQL_RESULT, 2.5)
+        cache_db["versions"]["datasheet_vendas"] = 4  # Novo import na tabela
+        assert sql_cache.get_cached_sql("Total de vendas?") is None
+        assert cache_db["rows"] == {}
+
+    def test_size_bound_prunes_least_recently_used(self, cache_db, monkeypatch):
+        monkeypatch.setattr(sql_cache, "SQL_CACHE_SIZE", 1)
+        sql_cache.store_cached_sql("pergunta 1", SQL_RESULT, 1.0)
+        assert "pruned" not in cache_db
+        sql_cache.store_cached_sql("pergunta 2", SQL_RESULT, 1.0)
+        assert cache_db["pruned"] is True
+
+
+class TestGenerateAnswerCache:
+    """Testes para o uso do cache em generate_answer"""
+
+    def test_repeated_question_skips_model(self, cache_db, monkeypatch):
+        calls = []
+        context = {"tables": {"datasheet_vendas": {"columns": ["id"], "total_rows": 1, "preview": []}}}
+
+        async def fake_generate(question, database_context):
+            calls.append(question)
+            return dict(SQL_RESULT)
+
+        async def fake_explain(sql_query):
+            return "Conta as vendas"
+
+        async def fake_humanize(user_question, sql_query, results, database_context=None, on_token=None, truncated=False):
+            return "Foram 7 vendas"
+
+        monkeypatch.setattr(openai_controller, "get_database_context", lambda: (["datasheet_vendas"], context, True))
+        monkeypatch.setattr(openai_controller, "generate_sql_query", fake_generate)
+        monkeypatch.setattr(openai_controller, "explain_sql_query", fake_explain)
+        monkeypatch.setattr(openai_controller, "execute_sql_query", lambda sql, tables=None: ([{"total": 7}], False, False))
+        monkeypatch.setattr(openai_controller, "humanize_query_results", fake_humanize)
+
+        first = asyncio.run(openai_controller.generate_answer("Total de vendas?"))
+        second = asyncio.run(openai_controller.generate_answer("total de vendas"))
+
+        assert calls == ["Total de vendas?"]
+        assert first["sql_cache"]["hit"] is False
+        assert second["success"] is True
+        assert second["sql_query"] == SQL_RESULT["query"]
+        assert second["sql_explanation"] == "Conta as vendas"
+        assert second["sql_cache"] == {
+            "hit": True, "llm_seconds": 0.0, "llm_seconds_saved": first["sql_cache"]["llm_seconds"]
+        }
+
+    def test_unquoted_table_names_are_tracked_for_invalidation(self, cache_db, monkeypatch):
+        sql = "SELECT categoria, SUM(valor) FROM datasheet_vendas GROUP BY categoria"
+        calls = []
+        context = {"tables": {"datasheet_vendas": {"columns": ["categoria", "valor"], "total_rows": 1, "preview": []}}}
+
+        async def fake_create(**kwargs):
+            calls.append(kwargs)
+            message = type("Message", (), {"content": sql})()
+            return type("Response", (), {"choices": [type("Choice", (), {"message": message})()]})()
+
+        async def fake_explain(sql_query):
+            return "Soma por categoria"
+
+        async def fake_humanize(user_question, sql_query, results, database_context=None, on_token=None, truncated=False):
+            return "Resposta"
+
+        client = type("Client", (), {})()
+        client.chat = type("Chat", (), {})()
+        client.chat.completions = type("Completions", (), {"create": staticmethod(fake_create)})()
+        monkeypatch.setattr(openai_controller, "get_llm_client", lambda: client)
+        monkeypatch.setattr(openai_controller, "get_database_context", lambda: (["datasheet_vendas"], context, True))
+        monkeypatch.setattr(openai_controller, "explain_sql_query", fake_explain)
+        monkeypatch.setattr(openai_controller, "execute_sql_query", lambda sql, tables=None: ([{"total": 7}], False, False))
+        monkeypatch.setattr(openai_controller, "humanize_query_results", fake_humanize)
+
+        first = asyncio.run(openai_controller.generate_answer("Total por categoria?"))
+        assert first["tables_used"] == ["datasheet_vendas"]
+        entry = cache_db["rows"][sql_cache.question_key("Total por categoria?")]
+        assert json.loads(entry["table_versions"]) == {"datasheet_vendas": 3}
+
+        # Reimport da tabela: a entrada deixa de valer e o SQL é gerado de novo
+        cache_db["versions"]["datasheet_vendas"] = 4
+        second = asyncio.run(openai_controller.generate_answer("Total por categoria?"))
+        assert second["sql_cache"]["hit"] is False
+        assert len(calls) == 2
+
+    def test_sql_without_known_tables_is_not_cached(self, cache_db):
+        assert sql_cache.save_cached_sql(
+            SQLCacheCursor(cache_db), "k", "pergunta", {**SQL_RESULT, "tables_used": []}, 1.0
+        ) is None
+        assert cache_db["rows"] == {}
@@ -0,0 +1,59 @@
+import datetime
+from decimal import Decimal
+from app.upsert import canonical_value, row_hashes, plan_upsert
+
+
+class TestCanonicalValue:
+    """Testes para a forma estável dos valores usada no hash da linha"""
+
+    def test_import_and_database_values_match(self):
+        # Valor do arquivo x valor lido de volta da coluna tipada
+        assert canonical_value(1.5) == canonical_value(Decimal("1.50"))
+        assert canonical_value(3.0) == canonical_value(3)
+        assert canonical_value(True) == canonical_value(1)
+        assert canonical_value(datetime.datetime(2024, 1, 5, 10, 0, 0, 500)) == "2024-01-05 10:00:00"
+        assert canonical_value(None) != canonical_value("")
+
+    def test_wide_decimals_compare_exactly(self):
+        assert canonical_value(Decimal("123456789012345678.12")) == canonical_value(Decimal("123456789012345678.120"))
+        assert canonical_value(Decimal("123456789012345678.12")) != canonical_value(Decimal("123456789012345678.13"))
+
+
+class TestRowHashes:
+    """Testes para o hash do conteúdo das linhas"""
+
+    def test_independent_of_column_order(self):
+        first = row_hashes([(1, "ana")], ["id", "nome"])
+        second = row_hashes([("ana", 1)], ["nome", "id"])
+        assert first == second
+
+    def test_different_content_different_hash(self):
+        hashes = row_hashes([(1, "ana"), (1, "bo"), (1, None)], ["id", "nome"])
+        assert len(set(hashes)) == 3
+
+
+class TestPlanUpsert:
+    """Testes para a separação do chunk em inserções e atualizações"""
+
+    def test_by_key_column(self):
+        rows = [(1, "ana"), (2, "bo"), (3, "cy")]
+        hashes = row_hashes(rows, ["id", "nome"])
+        existing = {"1": hashes[0], "2": "hash-antigo"}
+        inserts, updates, unchanged = plan_upsert(rows, hashes, existing, key_position=0)
+        assert [row for row, _ in inserts] == [(3, "cy")]
+        assert [row for row, _ in updates] == [(2, "bo")]
+        assert unchanged == 1
+
+    def test_repeated_key_keeps_last_row(self):
+        rows = [(1, "ana"), (1, "ana maria"), (None, "sem chave")]
+        inserts, updates, unchanged = plan_upsert(rows, row_hashes(rows, ["id", "nome"]), {}, key_position=0)
+        assert sorted(row[1] for row, _ in inserts) == ["ana maria", "sem chave"]
+        assert updates == [] and unchanged == 1
+
+    def test_by_row_hash(self):
+        rows = [(1, "ana"), (2, "bo"), (2, "bo")]
+        hashes = row_hashes(rows, ["id", "nome"])
+        inserts, updates, unchanged = plan_upsert(rows, hashes, {hashes[0]: True})
+        assert [row for row, _ in inserts] == [(2, "bo")]
+        assert updates == []
+        assert unchanged == 2
@@ -59,19 +59,27 @@ export const getTables = async () => {
   return data
 }
 
-export const getTableData = async ({ table_name, page = 1, page_size = 50, search = '', sort_by = '', sort_order = 'asc' }) => {
+export const getTableData = async ({ table_name, page = 1, page_size = 50, search = '', sort_by = '', sort_order = 'asc', cursor = '', approximate = true }) => {
   const params = {
     page,
     page_size,
+    // Total aproximado/em cache: evita um COUNT(*) completo a cada troca de página
+    approximate,
     ...(search && { search }),
     ...(sort_by && { sort_by, sort_order }),
+    ...(cursor && { cursor }),
   }
   
   const { data } = await api.get(`/tables/${table_name}/data`, { params })
   return data
 }
 
-export const uploadExcel = async (file, table_name = null) => {
+// Parâmetros opcionais do import (sheets, mode=append|upsert|replace, key), sem os vazios
+const importParams = (params) =>
+  Object.fromEntries(Object.entries(params).filter(([, value]) => value))
+
+// sheets: '*' importa todas as abas (uma tabela por aba); null importa só a aba ativa
+export const uploadExcel = async (file, table_name = null, sheets = null, mode = null, key = null) => {
   const formData = new FormData()
   formData.append('file', file)
   if (table_name) {
@@ -82,6 +90,30 @@ export const uploadExcel = async (file, table_name = null) => {
     headers: {
       'Content-Type': 'multipart/form-data',
     },
+    params: importParams({ sheets, mode, key }),
+  })
+  return data
+}
+
+// Status de um import em segundo plano (retornado por uploadExcel como job_id)
+export const getImportJob = async (job_id) => {
+  const { data } = await api.get(`/imports/${job_id}`)
+  return data
+}
+
+// Upload de CSV, TSV ou Parquet (import em segundo plano, como uploadExcel)
+export const uploadDataFile = async (file, table_name = null, mode = null, key = null) => {
+  const formData = new FormData()
+  formData.append('file', file)
+  if (table_name) {
+    formData.append('table_name', table_name)
+  }
+  
+  const { data } = await api.post('/upload/file', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+    params: importParams({ mode, key }),
   })
   return data
 }